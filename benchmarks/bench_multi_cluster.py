@@ -0,0 +1,106 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+"""Compare the matrix-based multi_cluster against the original
+edge-by-edge implementation on the example weeks.
+
+Both start from the same partition, so the cluster sets they reach
+should be identical. Run from the repository root with
+    python -m benchmarks.bench_multi_cluster [week1 week2 ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from config.CONFIG import CONFIG
+from modes import analysis
+from modes.functions import read_raw_data
+
+WEEKS = ["week1", "week2", "week7"]
+
+
+def legacy_multi_cluster(card_data_df, G, clusters):
+    """The original multi_cluster, kept here as the benchmark baseline."""
+    changed = True
+
+    while changed:
+        changed = False
+
+        copy_df = card_data_df.copy()
+
+        adjlist = G.get_adjlist()
+        for card in copy_df.index:
+            adjlist_card = adjlist[card]
+            clus1 = copy_df.at[card, "Cluster"]
+            clusfilter = [c in clus1 for c in range(clusters)]
+            adjclus = np.zeros(clusters)
+
+            for adjcard in adjlist_card:
+                clus2 = copy_df.at[adjcard, "Cluster"]
+                for cluster in clus2:
+                    adjclus[cluster] += G.es.select(
+                        _within=(card, adjcard)
+                    )[0]["weight"] / len(clus2)
+
+            if (
+                np.sum(adjclus[clusfilter]) / np.sum(adjclus)
+                < CONFIG["cluster_percentage"]
+            ):
+                adjclus[clusfilter] = 0
+                card_data_df.at[card, "Cluster"].add(np.argmax(adjclus))
+                changed = True
+
+
+def timed(function, card_data_df, G, clusters):
+    """Run function on a copy of card_data_df's clusters and return the
+    time taken and resulting cluster sets.
+    """
+    card_data_df = card_data_df.copy()
+    card_data_df["Cluster"] = [set(c) for c in card_data_df["Cluster"]]
+    start = time.perf_counter()
+    function(card_data_df, G, clusters)
+    elapsed = time.perf_counter() - start
+    return elapsed, [
+        {int(c) for c in s} for s in card_data_df["Cluster"]
+    ]
+
+
+def main(weeks):
+    for week in weeks:
+        data_loc = f"data/aggregate/examples/{week}.csv"
+        df, vocab = read_raw_data(True, data_loc=data_loc)
+        card_data_df, incidence = analysis.create_card_df(vocab, df)
+        G = analysis.create_graph(card_data_df, incidence)
+        _, clusters = analysis.create_partition(card_data_df, G)
+
+        legacy_time, legacy = timed(
+            legacy_multi_cluster, card_data_df, G, clusters
+        )
+        new_time, new = timed(
+            analysis.multi_cluster, card_data_df, G, clusters
+        )
+        print(
+            f"{week}: {len(card_data_df)} cards, {G.ecount()} edges, "
+            f"{clusters} clusters - legacy {legacy_time:.2f} s, "
+            f"matrix {new_time * 1000:.1f} ms "
+            f"({legacy_time / new_time:.0f}x), "
+            f"identical: {legacy == new}"
+        )
+
+
+if __name__ == "__main__":
+    sys.stdout = sys.__stdout__
+    main(sys.argv[1:] or WEEKS)
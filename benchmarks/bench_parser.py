@@ -0,0 +1,84 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+"""Compare the single-pass decklist parser against the original
+two-pass create_set on the example weeks.
+
+Run from the repository root with
+    python -m benchmarks.bench_parser
+"""
+
+import glob
+import timeit
+
+import regex as re
+import pandas as pd
+
+from modes.functions import (
+    create_set,
+    decklist_line_1,
+    decklist_line_2,
+    deck_columns,
+    normalise_name,
+)
+
+EXAMPLES = "data/aggregate/examples/*.csv"
+
+
+def legacy_create_set(text):
+    """The original create_set, kept here as the benchmark baseline."""
+    text = re.sub("['`]", "'", text)
+    names = set(
+        re.findall(decklist_line_1, text, flags=re.MULTILINE)
+    ) | set(re.findall(decklist_line_2, text, flags=re.MULTILINE))
+    return {name.title().replace("'S", "'s") for name in names}
+
+
+def load_texts(pattern=EXAMPLES):
+    """Return every decklist text found in the csv files matching
+    pattern.
+    """
+    texts = []
+    for path in sorted(glob.glob(pattern)):
+        df = pd.read_csv(path).dropna()
+        texts.extend(df[deck_columns].to_numpy().ravel().tolist())
+    return texts
+
+
+def main(repeat=5):
+    texts = load_texts()
+    mismatches = sum(
+        legacy_create_set(text) != create_set(text) for text in texts
+    )
+    print(f"{len(texts)} decklists, {mismatches} mismatches")
+
+    def new():
+        normalise_name.cache_clear()
+        for text in texts:
+            create_set(text)
+
+    def legacy():
+        for text in texts:
+            legacy_create_set(text)
+
+    for name, function in (("legacy", legacy), ("single-pass", new)):
+        best = min(timeit.repeat(function, number=1, repeat=repeat))
+        print(
+            f"{name:>12}: {best * 1000:8.1f} ms "
+            f"({best / len(texts) * 1e6:6.1f} us per decklist)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,282 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+"""Time each stage of the analysis pipeline on synthetic tournaments
+of increasing size, and save the timings so runs can be compared.
+
+Run from the repository root with
+    python -m benchmarks.bench_scaling [--sizes 1000 10000 100000]
+        [--output results.json] [--compare previous.json]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import datetime
+import tempfile
+import subprocess
+from os.path import join
+
+# modes imports these where they are used; import them up front so the
+# first size's timings do not include loading them.
+import igraph  # noqa: F401
+import louvain  # noqa: F401
+
+from config.lands import BASICS
+from modes import analysis
+from modes.card_index import CardIndex
+from modes.functions import read_raw_data
+from modes.overlap import check_no_duplicates
+from modes.similarity import similar_decks
+from . import synthetic
+
+SIZES = (1000, 10000, 100000)
+# --compare flags a stage when it is both this many times and this many
+# seconds slower, so noise in millisecond stages is not flagged.
+REGRESSION = 1.2
+MIN_SLOWDOWN = 0.05
+
+
+def timed(results, size, stage, function, *args):
+    """Run function(*args), record how long it took and return its
+    result.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    seconds = time.perf_counter() - start
+    results.append({"decks": size, "stage": stage, "seconds": seconds})
+    print(f"{size:>8} decks  {stage:<20} {seconds:10.3f} s")
+    return result
+
+
+def pairwise_overlaps(df, vocab):
+    """Check every team with check_no_duplicates, one pair of decks at
+    a time.
+    """
+    basics = vocab.lookup(BASICS)
+    return [
+        check_no_duplicates(*decks, exclude=basics)
+        for decks in df[
+            ["Deck 1 List", "Deck 2 List", "Deck 3 List"]
+        ].to_numpy()
+    ]
+
+
+def indexed_overlaps(df, vocab):
+    """Check every team through an inverted card index."""
+    return CardIndex(df, vocab).shared_cards(vocab.lookup(BASICS))
+
+
+def run_size(results, size, directory, **kwargs):
+    """Generate a tournament of size decks and time each stage on it."""
+    data_loc = join(directory, f"synthetic-{size}.csv")
+    timed(
+        results,
+        size,
+        "generate",
+        lambda: synthetic.write(data_loc, decks=size, **kwargs),
+    )
+    df, vocab = timed(
+        results,
+        size,
+        "read_raw_data",
+        lambda: read_raw_data(
+            False, names=True, data_loc=data_loc, use_cache=False
+        ),
+    )
+    decks = df[["Deck 1 List", "Deck 2 List", "Deck 3 List"]]
+    card_data_df, incidence = timed(
+        results,
+        size,
+        "create_card_df",
+        analysis.create_card_df,
+        vocab,
+        decks,
+    )
+    G = timed(
+        results,
+        size,
+        "create_graph",
+        analysis.create_graph,
+        card_data_df,
+        incidence,
+    )
+    _, clusters = timed(
+        results,
+        size,
+        "create_partition",
+        analysis.create_partition,
+        card_data_df,
+        G,
+    )
+    timed(
+        results,
+        size,
+        "multi_cluster",
+        analysis.multi_cluster,
+        card_data_df,
+        G,
+        clusters,
+    )
+    timed(
+        results,
+        size,
+        "create_graphml",
+        analysis.create_graphml,
+        card_data_df,
+        G,
+        join(directory, "graph.graphml"),
+        clusters,
+        "graphml.gz",
+    )
+    timed(
+        results,
+        size,
+        "classify_decks",
+        lambda: analysis.classify_decks(
+            card_data_df,
+            clusters,
+            analysis.deck_incidence(
+                card_data_df, decks.to_numpy().flatten().tolist()
+            ),
+        ),
+    )
+    timed(
+        results,
+        size,
+        "check_no_duplicates",
+        pairwise_overlaps,
+        df,
+        vocab,
+    )
+    timed(
+        results,
+        size,
+        "card_index_overlaps",
+        indexed_overlaps,
+        df,
+        vocab,
+    )
+    timed(
+        results,
+        size,
+        "similar_decks",
+        similar_decks,
+        decks.to_numpy().ravel().tolist(),
+        len(vocab),
+    )
+
+
+def environment():
+    """Describe the machine and code the benchmark ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.strip()
+    except OSError:
+        commit = ""
+    return {
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, previous):
+    """Print how each stage's time changed since a previous results
+    file, flagging slowdowns of more than REGRESSION times and
+    MIN_SLOWDOWN seconds.
+    Returns:
+    --------
+    regressions: int number of stages flagged.
+    """
+    old = {
+        (row["decks"], row["stage"]): row["seconds"]
+        for row in previous["results"]
+    }
+    regressions = 0
+    print(f"Compared with {previous['environment'].get('commit')}:")
+    for row in results:
+        key = (row["decks"], row["stage"])
+        if key not in old or not old[key]:
+            continue
+        ratio = row["seconds"] / old[key]
+        flag = ""
+        if (
+            ratio > REGRESSION
+            and row["seconds"] - old[key] > MIN_SLOWDOWN
+        ):
+            flag = "  <- slower"
+            regressions += 1
+        print(
+            f"{row['decks']:>8} decks  {row['stage']:<20} {ratio:6.2f}x{flag}"
+        )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--archetypes", type=int, default=20)
+    parser.add_argument("--pool", type=int, default=2000)
+    parser.add_argument("--overlap", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--output", help="json file to write the timings to."
+    )
+    parser.add_argument(
+        "--compare", help="json file of a previous run to compare with."
+    )
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            run_size(
+                results,
+                size,
+                directory,
+                archetypes=args.archetypes,
+                pool=args.pool,
+                overlap=args.overlap,
+                seed=args.seed,
+            )
+    report = {
+        "environment": environment(),
+        "parameters": {
+            "archetypes": args.archetypes,
+            "pool": args.pool,
+            "overlap": args.overlap,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            if compare(results, json.load(f)):
+                sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+"""Measure how long main.py takes to start, and which modules it
+imports, by tracing the imports of each subcommand's --help with
+python -X importtime.
+
+Run from the repository root with
+    python -m benchmarks.bench_startup
+"""
+
+import sys
+import subprocess
+
+COMMANDS = (
+    ["--help"],
+    ["overlap", "--help"],
+    ["analysis", "--help"],
+    ["aggregate", "--help"],
+)
+# Libraries that --help should never need.
+HEAVY = ("numpy", "pandas", "scipy", "igraph", "louvain", "matplotlib")
+
+
+def trace_imports(args):
+    """Run main.py with args under -X importtime.
+    Returns:
+    --------
+    total: float microseconds spent importing, summed over top level
+    imports.
+
+    modules: dict of each imported module to its cumulative import
+    time in microseconds.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "main.py"] + args,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    modules = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        # Top level imports are not indented.
+        if not name.startswith("  "):
+            total += int(cumulative)
+        modules[name.strip()] = int(cumulative)
+    return total, modules
+
+
+def main(repeat=5, top=5):
+    for args in COMMANDS:
+        runs = [trace_imports(args) for _ in range(repeat)]
+        total, modules = min(runs, key=lambda run: run[0])
+        heavy = sorted(
+            {
+                name.split(".")[0]
+                for name in modules
+                if name.split(".")[0] in HEAVY
+            }
+        )
+        print(
+            f"main.py {' '.join(args):<18} {total / 1000:8.1f} ms "
+            f"importing, heavy: {', '.join(heavy) or 'none'}"
+        )
+        slowest = sorted(modules.items(), key=lambda item: -item[1])
+        for name, cumulative in slowest[:top]:
+            print(f"    {cumulative / 1000:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+"""Generate synthetic tournaments in the csv format read_raw_data
+reads, for benchmarking at sizes beyond the example data.
+
+Each deck is built around one of a number of archetypes. An archetype
+has a core of cards, a share of which (overlap) is drawn from staples
+common to every archetype; decks take most of their archetype's core,
+a few random flex cards from the pool and basic lands, then a short
+sideboard. Three decks make a team, one team per row.
+
+Run from the repository root with
+    python -m benchmarks.synthetic OUTPUT.csv [--decks N] [...]
+"""
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+BASIC_NAMES = ["Plains", "Island", "Swamp", "Mountain", "Forest"]
+DECKS_PER_TEAM = 3
+CORE_SIZE = 20
+CORE_TAKEN = 0.8
+FLEX_CARDS = 4
+SIDEBOARD_CARDS = 5
+
+
+def card_names(pool):
+    """Return pool distinct nonland card names."""
+    return [f"Synthetic Card {i:06d}" for i in range(pool)]
+
+
+def archetype_cores(rng, archetypes, pool, overlap):
+    """Draw the core cards of each archetype.
+    Parameters:
+    -----------
+    rng: numpy Generator.
+
+    archetypes: int number of archetypes.
+
+    pool: int number of nonland cards to draw from.
+
+    overlap: float from 0 to 1, the share of each core drawn from a set
+    of staples common to all archetypes rather than its own cards.
+    Returns:
+    --------
+    cores: int array of shape (archetypes, CORE_SIZE) of card indices.
+    """
+    shared = int(round(CORE_SIZE * overlap))
+    staples = rng.choice(pool, size=max(CORE_SIZE, 1), replace=False)
+    cores = np.empty((archetypes, CORE_SIZE), dtype=np.int64)
+    for archetype in range(archetypes):
+        own = rng.choice(pool, size=CORE_SIZE - shared, replace=False)
+        cores[archetype] = np.concatenate(
+            (rng.choice(staples, size=shared, replace=False), own)
+        )
+    return cores
+
+
+def decklist_text(rng, names, cards, basics):
+    """Write a decklist in the quantity-first format, with a
+    sideboard after a blank line.
+    """
+    main, side = cards[:-SIDEBOARD_CARDS], cards[-SIDEBOARD_CARDS:]
+    quantities = rng.integers(1, 5, size=len(cards))
+    lines = [f"{q} {names[c]}" for q, c in zip(quantities, main)]
+    lines += [f"{rng.integers(4, 13)} {basic}" for basic in basics]
+    lines.append("")
+    lines.append("Sideboard")
+    lines += [
+        f"{q} {names[c]}"
+        for q, c in zip(quantities[-SIDEBOARD_CARDS:], side)
+    ]
+    return "\n".join(lines)
+
+
+def generate(decks=1000, archetypes=20, pool=2000, overlap=0.3, seed=0):
+    """Generate a synthetic tournament.
+    Parameters:
+    -----------
+    decks: int number of decks, rounded up to whole teams.
+
+    archetypes: int number of archetypes decks are built around.
+
+    pool: int number of distinct nonland cards.
+
+    overlap: float from 0 to 1, the share of each archetype's core
+    taken from staples shared by all archetypes.
+
+    seed: int seed, so the same arguments give the same tournament.
+    Returns:
+    --------
+    df: pandas DataFrame with the columns of the example csv files.
+    """
+    if pool < CORE_SIZE + FLEX_CARDS + SIDEBOARD_CARDS:
+        raise ValueError(
+            f"pool must be at least {CORE_SIZE + FLEX_CARDS + SIDEBOARD_CARDS} cards."
+        )
+    rng = np.random.default_rng(seed)
+    names = card_names(pool)
+    cores = archetype_cores(rng, archetypes, pool, overlap)
+    # Archetype popularity falls off like a real metagame.
+    popularity = 1 / np.arange(1, archetypes + 1)
+    popularity /= popularity.sum()
+
+    teams = -(-decks // DECKS_PER_TEAM)
+    taken = int(round(CORE_SIZE * CORE_TAKEN))
+    data = {
+        "Timestamp": [
+            f"2019/10/{1 + team % 28:02d}" for team in range(teams)
+        ],
+        "Team Name": [f"Team {team:06d}" for team in range(teams)],
+    }
+    choice = rng.choice(
+        archetypes, size=(teams, DECKS_PER_TEAM), p=popularity
+    )
+    for slot in range(DECKS_PER_TEAM):
+        texts = []
+        for team in range(teams):
+            archetype = choice[team, slot]
+            core = rng.choice(
+                cores[archetype], size=taken, replace=False
+            )
+            extra = rng.choice(
+                pool, size=FLEX_CARDS + SIDEBOARD_CARDS, replace=False
+            )
+            cards = np.concatenate((core, extra[~np.isin(extra, core)]))
+            basics = rng.choice(BASIC_NAMES, size=2, replace=False)
+            texts.append(decklist_text(rng, names, cards, basics))
+        data[f"Deck {slot + 1} Pilot IGN + Deck Name"] = [
+            f"Pilot {team:06d}-{slot + 1} Archetype {choice[team, slot]}"
+            for team in range(teams)
+        ]
+        data[f"Deck {slot + 1} List"] = texts
+    return pd.DataFrame(data)
+
+
+def write(path, **kwargs):
+    """Generate a synthetic tournament and save it as csv at path.
+    Returns:
+    --------
+    path: the path written to.
+    See also:
+    ---------
+    generate
+    """
+    generate(**kwargs).to_csv(path, index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("output", help="csv file to write.")
+    parser.add_argument("--decks", type=int, default=1000)
+    parser.add_argument("--archetypes", type=int, default=20)
+    parser.add_argument("--pool", type=int, default=2000)
+    parser.add_argument("--overlap", type=float, default=0.3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    write(
+        args.output,
+        decks=args.decks,
+        archetypes=args.archetypes,
+        pool=args.pool,
+        overlap=args.overlap,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
 CONFIG = {
     "graphml_location": r"output/graph.graphml",
     "log_location": r"logs/{}.log",
+    "log_buffer": 1000,
+    "log_max_bytes": None,
+    "log_backup_count": 5,
     "decklist_directory": r"/data/decklists",
     "aggregate_data_loc": r"data/aggregate/week1.csv",
     "cluster_percentage": 0.4,
     "deck_percentage": 0.5,
+    "parse_workers": 1,
+    "parse_chunksize": 1000,
+    "cache_directory": None,
+    "cache_size": 256 * 2 ** 20,
+    "aggregate_state_location": r"output/season",
+    "results_location": r"output/results",
+    "model_location": r"output/model.json",
+    "store_location": r"output/store",
+    "trace_location": r"output/trace.json",
 }
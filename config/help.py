@@ -1,13 +1,59 @@
 HELP = {
-    "mode": """Whether the program runs on overlap or analysis:\n
+    "mode": """Whether the program runs on overlap, analysis, aggregate, similar, classify, metagame or store:\n
     overlap - Discover all files in the decklist_directory specified by CONFIG.py and return the cards that they share.\n
-    analysis - Cluster decklists""",
+    analysis - Cluster decklists\n
+    aggregate - Add weekly csv files to a running season and cluster the season so far\n
+    similar - Find near-duplicate decks and group them\n
+    classify - Classify new decklists with the clusters saved by the last analysis\n
+    metagame - Cluster several weeks at once and follow each archetype's share from week to week\n
+    store - Parse several weeks of csv files into one deck store that analysis and overlap can read any weeks of""",
     "all": "Check for overlap in all decks of specifed aggregate location.",
     "profile": "Run a profile and create a graph of number of clusters against resolution_parameter. The lower and upper bounds are specified after the parameter is passed. This disables the standard output.",
+    "profile-output": "With --profile, write the resolution_parameter, number of clusters, quality and largest cluster sizes of each partition to this .csv or .json file instead of showing a plot.",
+    "plot": "With --profile, save the plot to this file instead of showing it.",
     "rp": "Set the resolution_parameter used in the program to the value passed.",
     "graph": "Produce a visual for the clusters and a .graphml file in graphml_location (config).",
+    "graph-format": "Format to save the graph in with --graph: graphml (default), gzip-compressed graphml.gz, npz arrays of the edges and memberships, or parquet node and edge tables. The extension of graphml_location (config) is replaced to match.",
     "no-lands": "Remove all land cards from the decks to produce clusters of only nonland cards.",
     "label": "Ask the user for names for each cluster detected",
     "colour": "Ask the user for colours to plot each cluster's wedge in.",
     "init": "Where initial card cluster membership is stored.",
+    "output": "Write the classification of each deck, the number of decks in each cluster, the top cards of each cluster and the clusters and scores of every card to files in this format, instead of printing them and plotting the breakdown.",
+    "output-dir": "Directory to write --output files to. Overrides results_location (config).",
+    "ensemble": "Cluster with a consensus of this many seeded partitions, found in parallel, instead of a single run, and report how stable each card and cluster is across them.",
+    "seed": "Random seed of the partition, so repeated runs give the same clusters. With --ensemble, the seed of the first partition (default 0); partition i uses seed + i.",
+    "min-support": "Before clustering, remove the edges of cards in fewer than this many decks.",
+    "min-cooccurrence": "Before clustering, remove the edges between cards sharing fewer than this many decks.",
+    "min-pmi": "Before clustering, remove the edges whose pointwise mutual information, log(shared decks * decks / (decks of card 1 * decks of card 2)), is below this value. 0 removes pairs seen together less often than chance.",
+    "top-k": "Before clustering, keep only the edges of each card to the TOP_K cards it shares the most decks with (an edge stays if either card keeps it).",
+    "compare-full": "With any of --min-support, --min-cooccurrence, --min-pmi or --top-k, also cluster the graph before and after sparsifying it with the same seed and report the number of clusters, NMI and adjusted Rand index of the two partitions.",
+    "watch": "Keep checking decklist_directory (config) for duplicate cards, re-checking each file only when it changes, until interrupted.",
+    "interval": "Seconds between checks of decklist_directory with --watch (default 2).",
+    "card": "List the teams and decks in aggregate_data_loc (config) that play this card. Can be given more than once.",
+    "more-than": "List the cards in aggregate_data_loc (config) played in more than this many decks.",
+    "trace-stages": "Record the wall time, CPU time, peak memory and sizes (decks, cards, edges, clusters, multi_cluster iterations) of each stage and write them as JSON to PATH, or trace_location (config) if no PATH is given. Tracing memory slows the run down.",
+    "profile-stage": "With --trace-stages, also run this stage (for example create_partition) under cProfile and save the stats next to the trace.",
+    "workers": "Number of processes to parse decklists with, overriding parse_workers (config), and to split a --profile or --ensemble over (default one per CPU). 1 runs serially.",
+    "files": "csv files of decklists to add to the season, in order.",
+    "state": "Where the accumulated season is stored. Defaults to aggregate_state_location (config).",
+    "quiet": "Only show warnings and errors, such as shared cards, in the terminal. Everything is still written to the log file.",
+    "verbose": "Also show debug messages in the terminal.",
+    "similar-files": "csv files of decklists to compare the decks of, together. Defaults to aggregate_data_loc (config).",
+    "threshold": "Minimum Jaccard similarity (shared cards over cards in either deck, ignoring basic lands) of two decks to count as near-duplicates (default 0.8).",
+    "num-perm": "Number of hash functions in each deck's MinHash signature (default 128). More finds pairs near the threshold more reliably but takes longer.",
+    "minhash-seed": "Seed of the MinHash hash functions (default 0).",
+    "similar-output": "Write the similar pairs of decks and the decks in each group to files in this format, instead of showing the largest groups.",
+    "model": "Where to save the clusters found, for classify. Overrides model_location (config).",
+    "classify-files": "Decklist files to classify. If none are given, decklists are read from stdin, separated by lines holding only ---, and each is classified as soon as it is read.",
+    "classify-model": "Model saved by analysis or aggregate to classify with. Defaults to model_location (config).",
+    "metagame-files": "csv files of decklists, one per week, in order.",
+    "min-similarity": "Minimum similarity, from 0 to 1, of the cards of two clusters in consecutive weeks for them to be the same archetype (default 0.3). Cards are weighted by how often they are played.",
+    "metagame-output": "Write the share of each week's decks in each archetype, and the archetype each week's clusters were matched to, to files in this format, instead of showing the share table.",
+    "metagame-seed": "Random seed of every week's partition (default 0), so repeated runs give the same archetypes.",
+    "metagame-workers": "Number of weeks to cluster at once, in separate processes (default one per CPU).",
+    "store-files": "csv files of decklists, one per week, in order. Each week is named after its file, without the extension.",
+    "store-path": "Where to write the deck store. Any store already there is replaced. Defaults to store_location (config).",
+    "store": "Read the decks from the deck store at this path, built by the store mode, instead of aggregate_data_loc (config).",
+    "weeks": "Only read these weeks (csv file names without the extension) from the deck store, given by --store or store_location (config).",
+    "no-cache": "Parse the csv afresh instead of loading (and saving) parsed decklists from the cache.",
 }
@@ -12,14 +12,35 @@
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 #    GNU General Public License for more details.
 
+import os
+import logging
 import argparse
+import datetime
+import importlib
 
 from config.help import HELP
-from modes import overlap, analysis
+from modes.results import GRAPH_FORMATS, RESULT_FORMATS
 
-FUNCTION_MAP = {"overlap": overlap.main, "analysis": analysis.main}
+# Mode modules are only imported once their subcommand is picked, so
+# one mode (or --help) does not pay for the libraries of the others.
+FUNCTION_MAP = {
+    "overlap": "modes.overlap",
+    "analysis": "modes.analysis",
+    "aggregate": "modes.aggregate",
+    "similar": "modes.similarity",
+    "classify": "modes.classify",
+    "metagame": "modes.metagame",
+    "store": "modes.deckstore",
+}
 
 parser = argparse.ArgumentParser()
+verbosity = parser.add_mutually_exclusive_group()
+verbosity.add_argument(
+    "--quiet", "-q", action="store_true", help=HELP["quiet"]
+)
+verbosity.add_argument(
+    "--verbose", "-v", action="store_true", help=HELP["verbose"]
+)
 subparsers = parser.add_subparsers(
     title="mode", help=HELP["mode"], required=True, dest="mode"
 )
@@ -28,6 +49,26 @@ overlap_parser = subparsers.add_parser("overlap")
 overlap_parser.add_argument(
     "--all", "-a", action="store_true", help=HELP["all"]
 )
+overlap_parser.add_argument(
+    "--watch", action="store_true", help=HELP["watch"]
+)
+overlap_parser.add_argument(
+    "--interval", type=float, default=2.0, help=HELP["interval"]
+)
+overlap_parser.add_argument(
+    "--card", "-c", action="append", help=HELP["card"]
+)
+overlap_parser.add_argument(
+    "--more-than", type=int, help=HELP["more-than"]
+)
+overlap_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["workers"]
+)
+overlap_parser.add_argument(
+    "--no-cache", action="store_true", help=HELP["no-cache"]
+)
+overlap_parser.add_argument("--store", type=str, help=HELP["store"])
+overlap_parser.add_argument("--weeks", nargs="+", help=HELP["weeks"])
 
 analysis_parser = subparsers.add_parser("analysis")
 group = analysis_parser.add_mutually_exclusive_group()
@@ -37,9 +78,19 @@ group.add_argument(
 group.add_argument(
     "--resolution_parameter", "-r", type=float, help=HELP["rp"]
 )
+analysis_parser.add_argument(
+    "--profile-output", type=str, help=HELP["profile-output"]
+)
+analysis_parser.add_argument("--plot", type=str, help=HELP["plot"])
 analysis_parser.add_argument(
     "--graph", "-g", action="store_true", help=HELP["graph"]
 )
+analysis_parser.add_argument(
+    "--graph-format",
+    choices=GRAPH_FORMATS,
+    default="graphml",
+    help=HELP["graph-format"],
+)
 analysis_parser.add_argument(
     "--no-lands", action="store_true", help=HELP["no-lands"]
 )
@@ -52,27 +103,367 @@ analysis_parser.add_argument(
 analysis_parser.add_argument(
     "--start", "-s", type=str, help=HELP["init"]
 )
+analysis_parser.add_argument(
+    "--output", "-o", choices=RESULT_FORMATS, help=HELP["output"]
+)
+analysis_parser.add_argument(
+    "--output-dir", type=str, help=HELP["output-dir"]
+)
+analysis_parser.add_argument("--model", type=str, help=HELP["model"])
+analysis_parser.add_argument(
+    "--min-support", type=int, help=HELP["min-support"]
+)
+analysis_parser.add_argument(
+    "--min-cooccurrence", type=int, help=HELP["min-cooccurrence"]
+)
+analysis_parser.add_argument(
+    "--min-pmi", type=float, help=HELP["min-pmi"]
+)
+analysis_parser.add_argument("--top-k", type=int, help=HELP["top-k"])
+analysis_parser.add_argument(
+    "--compare-full", action="store_true", help=HELP["compare-full"]
+)
+analysis_parser.add_argument(
+    "--ensemble", "-e", type=int, help=HELP["ensemble"]
+)
+analysis_parser.add_argument("--seed", type=int, help=HELP["seed"])
+analysis_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["workers"]
+)
+analysis_parser.add_argument(
+    "--trace-stages",
+    nargs="?",
+    const="",
+    metavar="PATH",
+    help=HELP["trace-stages"],
+)
+analysis_parser.add_argument(
+    "--profile-stage", metavar="STAGE", help=HELP["profile-stage"]
+)
+analysis_parser.add_argument(
+    "--no-cache", action="store_true", help=HELP["no-cache"]
+)
+analysis_parser.add_argument("--store", type=str, help=HELP["store"])
+analysis_parser.add_argument("--weeks", nargs="+", help=HELP["weeks"])
+
+aggregate_parser = subparsers.add_parser("aggregate")
+aggregate_parser.add_argument("files", nargs="+", help=HELP["files"])
+aggregate_parser.add_argument("--state", type=str, help=HELP["state"])
+aggregate_parser.add_argument(
+    "--resolution_parameter", "-r", type=float, help=HELP["rp"]
+)
+aggregate_parser.add_argument(
+    "--graph", "-g", action="store_true", help=HELP["graph"]
+)
+aggregate_parser.add_argument(
+    "--graph-format",
+    choices=GRAPH_FORMATS,
+    default="graphml",
+    help=HELP["graph-format"],
+)
+aggregate_parser.add_argument(
+    "--no-lands", action="store_true", help=HELP["no-lands"]
+)
+aggregate_parser.add_argument(
+    "--label", action="store_true", help=HELP["label"]
+)
+aggregate_parser.add_argument(
+    "--colour", action="store_true", help=HELP["colour"]
+)
+aggregate_parser.add_argument(
+    "--output", "-o", choices=RESULT_FORMATS, help=HELP["output"]
+)
+aggregate_parser.add_argument(
+    "--output-dir", type=str, help=HELP["output-dir"]
+)
+aggregate_parser.add_argument("--model", type=str, help=HELP["model"])
+aggregate_parser.add_argument(
+    "--min-support", type=int, help=HELP["min-support"]
+)
+aggregate_parser.add_argument(
+    "--min-cooccurrence", type=int, help=HELP["min-cooccurrence"]
+)
+aggregate_parser.add_argument(
+    "--min-pmi", type=float, help=HELP["min-pmi"]
+)
+aggregate_parser.add_argument("--top-k", type=int, help=HELP["top-k"])
+aggregate_parser.add_argument(
+    "--compare-full", action="store_true", help=HELP["compare-full"]
+)
+aggregate_parser.add_argument(
+    "--ensemble", "-e", type=int, help=HELP["ensemble"]
+)
+aggregate_parser.add_argument("--seed", type=int, help=HELP["seed"])
+aggregate_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["workers"]
+)
+aggregate_parser.add_argument(
+    "--trace-stages",
+    nargs="?",
+    const="",
+    metavar="PATH",
+    help=HELP["trace-stages"],
+)
+aggregate_parser.add_argument(
+    "--profile-stage", metavar="STAGE", help=HELP["profile-stage"]
+)
+aggregate_parser.add_argument(
+    "--no-cache", action="store_true", help=HELP["no-cache"]
+)
+
+similar_parser = subparsers.add_parser("similar")
+similar_parser.add_argument(
+    "files", nargs="*", help=HELP["similar-files"]
+)
+similar_parser.add_argument(
+    "--threshold", "-t", type=float, help=HELP["threshold"]
+)
+similar_parser.add_argument(
+    "--num-perm", type=int, help=HELP["num-perm"]
+)
+similar_parser.add_argument(
+    "--no-lands", action="store_true", help=HELP["no-lands"]
+)
+similar_parser.add_argument(
+    "--output",
+    "-o",
+    choices=RESULT_FORMATS,
+    help=HELP["similar-output"],
+)
+similar_parser.add_argument(
+    "--output-dir", type=str, help=HELP["output-dir"]
+)
+similar_parser.add_argument(
+    "--seed", type=int, help=HELP["minhash-seed"]
+)
+similar_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["workers"]
+)
+similar_parser.add_argument(
+    "--trace-stages",
+    nargs="?",
+    const="",
+    metavar="PATH",
+    help=HELP["trace-stages"],
+)
+similar_parser.add_argument(
+    "--profile-stage", metavar="STAGE", help=HELP["profile-stage"]
+)
+similar_parser.add_argument(
+    "--no-cache", action="store_true", help=HELP["no-cache"]
+)
 
-args = parser.parse_args()
-ARG_MAP = {
-    "overlap": {"all": getattr(args, "all", None)},
-    "analysis": {
-        "profile": getattr(args, "profile", None),
-        "resolution_parameter": getattr(
-            args, "resolution_parameter", None
+classify_parser = subparsers.add_parser("classify")
+classify_parser.add_argument(
+    "files", nargs="*", help=HELP["classify-files"]
+)
+classify_parser.add_argument(
+    "--model", type=str, help=HELP["classify-model"]
+)
+
+metagame_parser = subparsers.add_parser("metagame")
+metagame_parser.add_argument(
+    "files", nargs="+", help=HELP["metagame-files"]
+)
+metagame_parser.add_argument(
+    "--resolution_parameter", "-r", type=float, help=HELP["rp"]
+)
+metagame_parser.add_argument(
+    "--no-lands", action="store_true", help=HELP["no-lands"]
+)
+metagame_parser.add_argument(
+    "--min-similarity", type=float, help=HELP["min-similarity"]
+)
+metagame_parser.add_argument(
+    "--output",
+    "-o",
+    choices=RESULT_FORMATS,
+    help=HELP["metagame-output"],
+)
+metagame_parser.add_argument(
+    "--output-dir", type=str, help=HELP["output-dir"]
+)
+metagame_parser.add_argument(
+    "--seed", type=int, help=HELP["metagame-seed"]
+)
+metagame_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["metagame-workers"]
+)
+metagame_parser.add_argument(
+    "--trace-stages",
+    nargs="?",
+    const="",
+    metavar="PATH",
+    help=HELP["trace-stages"],
+)
+metagame_parser.add_argument(
+    "--profile-stage", metavar="STAGE", help=HELP["profile-stage"]
+)
+metagame_parser.add_argument(
+    "--no-cache", action="store_true", help=HELP["no-cache"]
+)
+
+store_parser = subparsers.add_parser("store")
+store_parser.add_argument("files", nargs="+", help=HELP["store-files"])
+store_parser.add_argument("--store", type=str, help=HELP["store-path"])
+store_parser.add_argument(
+    "--workers", "-w", type=int, help=HELP["workers"]
+)
+store_parser.add_argument(
+    "--trace-stages",
+    nargs="?",
+    const="",
+    metavar="PATH",
+    help=HELP["trace-stages"],
+)
+store_parser.add_argument(
+    "--profile-stage", metavar="STAGE", help=HELP["profile-stage"]
+)
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    if (
+        getattr(args, "profile_stage", None)
+        and getattr(args, "trace_stages", None) is None
+    ):
+        parser.error("--profile-stage needs --trace-stages")
+    ARG_MAP = {
+        "overlap": {
+            "all": getattr(args, "all", None),
+            "watch": getattr(args, "watch", None),
+            "interval": getattr(args, "interval", None),
+            "card": getattr(args, "card", None),
+            "more_than": getattr(args, "more_than", None),
+            "workers": getattr(args, "workers", None),
+            "no_cache": getattr(args, "no_cache", None),
+            "store": getattr(args, "store", None),
+            "weeks": getattr(args, "weeks", None),
+        },
+        "analysis": {
+            "profile": getattr(args, "profile", None),
+            "profile_output": getattr(args, "profile_output", None),
+            "plot": getattr(args, "plot", None),
+            "resolution_parameter": getattr(
+                args, "resolution_parameter", None
+            ),
+            "graph": getattr(args, "graph", None),
+            "graph_format": getattr(args, "graph_format", None),
+            "no_lands": getattr(args, "no_lands", None),
+            "label": getattr(args, "label", None),
+            "colour": getattr(args, "colour", None),
+            "init": getattr(args, "start", None),
+            "output": getattr(args, "output", None),
+            "output_dir": getattr(args, "output_dir", None),
+            "model": getattr(args, "model", None),
+            "min_support": getattr(args, "min_support", None),
+            "min_cooccurrence": getattr(args, "min_cooccurrence", None),
+            "min_pmi": getattr(args, "min_pmi", None),
+            "top_k": getattr(args, "top_k", None),
+            "compare_full": getattr(args, "compare_full", None),
+            "ensemble": getattr(args, "ensemble", None),
+            "seed": getattr(args, "seed", None),
+            "workers": getattr(args, "workers", None),
+            "no_cache": getattr(args, "no_cache", None),
+            "store": getattr(args, "store", None),
+            "weeks": getattr(args, "weeks", None),
+        },
+        "aggregate": {
+            "files": getattr(args, "files", None),
+            "state": getattr(args, "state", None),
+            "resolution_parameter": getattr(
+                args, "resolution_parameter", None
+            ),
+            "graph": getattr(args, "graph", None),
+            "graph_format": getattr(args, "graph_format", None),
+            "no_lands": getattr(args, "no_lands", None),
+            "label": getattr(args, "label", None),
+            "colour": getattr(args, "colour", None),
+            "output": getattr(args, "output", None),
+            "output_dir": getattr(args, "output_dir", None),
+            "model": getattr(args, "model", None),
+            "min_support": getattr(args, "min_support", None),
+            "min_cooccurrence": getattr(args, "min_cooccurrence", None),
+            "min_pmi": getattr(args, "min_pmi", None),
+            "top_k": getattr(args, "top_k", None),
+            "compare_full": getattr(args, "compare_full", None),
+            "ensemble": getattr(args, "ensemble", None),
+            "seed": getattr(args, "seed", None),
+            "workers": getattr(args, "workers", None),
+            "no_cache": getattr(args, "no_cache", None),
+        },
+        "similar": {
+            "files": getattr(args, "files", None),
+            "threshold": getattr(args, "threshold", None),
+            "num_perm": getattr(args, "num_perm", None),
+            "no_lands": getattr(args, "no_lands", None),
+            "output": getattr(args, "output", None),
+            "output_dir": getattr(args, "output_dir", None),
+            "seed": getattr(args, "seed", None),
+            "workers": getattr(args, "workers", None),
+            "no_cache": getattr(args, "no_cache", None),
+        },
+        "classify": {
+            "files": getattr(args, "files", None),
+            "model": getattr(args, "model", None),
+        },
+        "metagame": {
+            "files": getattr(args, "files", None),
+            "resolution_parameter": getattr(
+                args, "resolution_parameter", None
+            ),
+            "no_lands": getattr(args, "no_lands", None),
+            "min_similarity": getattr(args, "min_similarity", None),
+            "output": getattr(args, "output", None),
+            "output_dir": getattr(args, "output_dir", None),
+            "seed": getattr(args, "seed", None),
+            "workers": getattr(args, "workers", None),
+            "no_cache": getattr(args, "no_cache", None),
+        },
+        "store": {
+            "files": getattr(args, "files", None),
+            "store": getattr(args, "store", None),
+            "workers": getattr(args, "workers", None),
+        },
+    }
+    from config.CONFIG import CONFIG
+    from modes.log import setup_logging
+
+    if args.quiet:
+        level = logging.WARNING
+    elif args.verbose:
+        level = logging.DEBUG
+    else:
+        level = logging.INFO
+    setup_logging(
+        CONFIG["log_location"].format(
+            datetime.date.today().strftime("%b-%d-%Y")
         ),
-        "graph": getattr(args, "graph", None),
-        "no_lands": getattr(args, "no_lands", None),
-        "label": getattr(args, "label", None),
-        "colour": getattr(args, "colour", None),
-        "init": getattr(args, "start", None),
-    },
-}
-print(
-    """
+        level,
+        buffer=CONFIG.get("log_buffer", 1000),
+        max_bytes=CONFIG.get("log_max_bytes"),
+        backup_count=CONFIG.get("log_backup_count", 5),
+    )
+    logger = logging.getLogger("main")
+    trace_path = getattr(args, "trace_stages", None)
+    if trace_path is not None:
+        from modes import trace
+
+        trace_path = trace_path or CONFIG.get(
+            "trace_location", "output/trace.json"
+        )
+        profile_stage = getattr(args, "profile_stage", None)
+        trace.start(
+            profile_stage,
+            f"{os.path.splitext(trace_path)[0]}-{profile_stage}.prof",
+        )
+    logger.info("""
     decklist_analyser  Copyright (C) 2019 John Blundell/Jlobblet
     This program comes with ABSOLUTELY NO WARRANTY; license is included
     as LICENSE.
-    """
-)
-FUNCTION_MAP[args.mode](**ARG_MAP[args.mode])
+    """)
+    importlib.import_module(FUNCTION_MAP[args.mode]).main(
+        **ARG_MAP[args.mode]
+    )
+    if trace_path is not None:
+        trace.write(trace_path)
+        logger.info(f"Wrote stage trace to {trace_path}")
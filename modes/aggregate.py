@@ -0,0 +1,285 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import logging
+
+import numpy as np
+import scipy.sparse as sp
+
+from config.CONFIG import CONFIG
+from . import cache, trace
+from .analysis import analysis, card_df_from_counts, sparsify_card_graph
+from .columnar import object_column, read_columns, write_columns
+from .cooccurrence import (
+    cooccurrence_matrix,
+    graph_from_cooccurrence,
+    incidence_matrix,
+    reorder_cooccurrence,
+)
+from .functions import deck_columns, read_raw_data
+from .results import check_format
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+STATE_VERSION = 1
+
+
+def empty_state(no_lands):
+    """Create the accumulated co-occurrence state of an empty season.
+    Parameters:
+    -----------
+    no_lands: bool whether lands are excluded from the decklists.
+    Returns:
+    --------
+    state: dict containing
+        "vocab": Vocabulary of every card seen so far.
+        "counts": array of the number of decks each card is in.
+        "cooccurrence": upper triangular scipy.sparse csr_matrix of the
+        number of decks each pair of cards shares, in vocab order.
+        "decks": int number of decks ingested.
+        "ingested": list of dicts describing each ingested file.
+        "no_lands": no_lands.
+    """
+    return {
+        "vocab": Vocabulary(),
+        "counts": np.zeros(0, dtype=np.int64),
+        "cooccurrence": sp.csr_matrix((0, 0), dtype=np.int64),
+        "decks": 0,
+        "ingested": [],
+        "no_lands": bool(no_lands),
+    }
+
+
+def load_state(path, no_lands):
+    """Load the state saved by save_state, or create an empty one if
+    there is nothing at path.
+    Raises:
+    -------
+    ValueError: the state at path was built with a different no_lands
+    setting or an incompatible version.
+    See also:
+    ---------
+    empty_state
+    """
+    if not os.path.isdir(path):
+        return empty_state(no_lands)
+    arrays, meta = read_columns(path, mmap=False)
+    if meta["version"] != STATE_VERSION:
+        raise ValueError(
+            f"State at {path} has version {meta['version']}, expected {STATE_VERSION}."
+        )
+    if meta["no_lands"] != bool(no_lands):
+        raise ValueError(
+            f"State at {path} was built with no_lands={meta['no_lands']} - pass the same --no-lands setting or use a different --state."
+        )
+    n_cards = len(meta["vocab"])
+    return {
+        "vocab": Vocabulary(meta["vocab"]),
+        "counts": arrays["counts"],
+        "cooccurrence": sp.csr_matrix(
+            (arrays["data"], arrays["indices"], arrays["indptr"]),
+            shape=(n_cards, n_cards),
+        ),
+        "decks": meta["decks"],
+        "ingested": meta["ingested"],
+        "no_lands": meta["no_lands"],
+    }
+
+
+def save_state(path, state):
+    """Save a state created by empty_state or load_state to path."""
+    cooccurrence = state["cooccurrence"]
+    arrays = {
+        "counts": state["counts"],
+        "indptr": cooccurrence.indptr,
+        "indices": cooccurrence.indices,
+        "data": cooccurrence.data,
+    }
+    meta = {
+        "version": STATE_VERSION,
+        "vocab": state["vocab"].names,
+        "decks": state["decks"],
+        "ingested": state["ingested"],
+        "no_lands": state["no_lands"],
+    }
+    write_columns(path, arrays, meta)
+
+
+def _resize(matrix, n_cards):
+    """Grow a square csr_matrix to n_cards x n_cards."""
+    matrix = sp.csr_matrix(matrix)
+    indptr = np.concatenate(
+        (
+            matrix.indptr,
+            np.full(
+                n_cards - matrix.shape[0],
+                matrix.indptr[-1],
+                dtype=matrix.indptr.dtype,
+            ),
+        )
+    )
+    return sp.csr_matrix(
+        (matrix.data, matrix.indices, indptr), shape=(n_cards, n_cards)
+    )
+
+
+def ingest(state, data_loc, workers=None, use_cache=True, names=False):
+    """Add the decks in a csv file to the state.
+
+    Only the new decks are parsed and multiplied out, and their counts
+    are added to those already accumulated, so the cost of an update
+    depends on the size of the new file rather than the whole season.
+    Parameters:
+    -----------
+    state: dict as created by empty_state or load_state. It is updated
+    in place.
+
+    data_loc: string or filepath of the csv file to add.
+
+    workers: None or int number of processes to parse decklists with.
+
+    use_cache: bool whether to use the parse cache.
+
+    names: bool whether to keep the "Team Name" column in df.
+    Returns:
+    --------
+    df: None if data_loc has already been ingested, otherwise a pandas
+    DataFrame of its decklists with card ids from state["vocab"].
+    See also:
+    ---------
+    read_raw_data
+    """
+    digest = cache.file_digest(data_loc)
+    if any(entry["digest"] == digest for entry in state["ingested"]):
+        return None
+
+    df, vocab = read_raw_data(
+        state["no_lands"],
+        names=names,
+        data_loc=data_loc,
+        workers=workers,
+        use_cache=use_cache,
+    )
+    vocab_map = np.array(
+        [state["vocab"].intern(name) for name in vocab.names],
+        dtype=np.int32,
+    )
+    for col_name in deck_columns:
+        df[col_name] = object_column(
+            [np.sort(vocab_map[deck]) for deck in df[col_name]]
+        )
+
+    n_cards = len(state["vocab"])
+    incidence = incidence_matrix(
+        df[deck_columns].values.flatten().tolist(), n_cards
+    )
+    counts = np.zeros(n_cards, dtype=np.int64)
+    counts[: len(state["counts"])] = state["counts"]
+    state["counts"] = counts + np.asarray(incidence.sum(axis=0)).ravel()
+    state["cooccurrence"] = _resize(
+        state["cooccurrence"], n_cards
+    ) + cooccurrence_matrix(incidence)
+    state["decks"] += incidence.shape[0]
+    state["ingested"].append(
+        {
+            "file": os.path.abspath(data_loc),
+            "digest": digest,
+            "decks": incidence.shape[0],
+        }
+    )
+    return df
+
+
+def state_graph(state):
+    """Create a card_data_df and graph from the accumulated state.
+    Returns:
+    --------
+    card_data_df: pandas DataFrame containing as columns Card, Id and
+    Count, in the same order create_card_df would produce for the whole
+    season.
+
+    G: igraph Graph as create_graph would produce for the whole season.
+    """
+    card_data_df = card_df_from_counts(
+        state["vocab"].names, state["counts"]
+    )
+    cooccurrence = reorder_cooccurrence(
+        state["cooccurrence"], card_data_df["Id"].to_numpy()
+    )
+    G = graph_from_cooccurrence(
+        cooccurrence, card_data_df["Card"].tolist()
+    )
+    return card_data_df, G
+
+
+def main(**kwargs):
+    """Add each csv file to the accumulated season state, save it, and
+    cluster the updated graph, classifying the decks of the last new
+    file.
+    See also:
+    ---------
+    ingest
+
+    state_graph
+
+    analysis
+    """
+    if kwargs.get("output"):
+        check_format(kwargs["output"])
+    if kwargs["graph"] and kwargs.get("graph_format") == "parquet":
+        check_format("parquet")
+    path = kwargs["state"] or CONFIG.get(
+        "aggregate_state_location", "output/season"
+    )
+    state = load_state(path, kwargs["no_lands"])
+    df = None
+    for data_loc in kwargs["files"]:
+        with trace.stage("ingest") as counts:
+            new_df = ingest(
+                state,
+                data_loc,
+                workers=kwargs["workers"],
+                use_cache=not kwargs["no_cache"],
+                names=bool(kwargs.get("output")),
+            )
+            counts["decks"] = (
+                0 if new_df is None else new_df[deck_columns].size
+            )
+            counts["cards"] = len(state["vocab"])
+        if new_df is None:
+            logger.info(
+                f"{data_loc} has already been ingested, skipping."
+            )
+        else:
+            logger.info(
+                f"Ingested {len(new_df)} teams from {data_loc}."
+            )
+            df = new_df
+    save_state(path, state)
+    logger.info(
+        f"Season: {state['decks']} decks from {len(state['ingested'])} files, {len(state['vocab'])} cards."
+    )
+    if df is None:
+        return
+
+    with trace.stage("state_graph") as counts:
+        card_data_df, G = state_graph(state)
+        counts["cards"] = G.vcount()
+        counts["edges"] = G.ecount()
+    if kwargs["resolution_parameter"] is None:
+        kwargs["resolution_parameter"] = 1
+    G = sparsify_card_graph(card_data_df, G, state["decks"], **kwargs)
+    analysis(df, card_data_df, G, init=None, **kwargs)
@@ -12,64 +12,135 @@
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 #    GNU General Public License for more details.
 
-import sys
-import datetime
+import os
+import logging
 
 import numpy as np
 import pandas as pd
-import igraph as ig
-import louvain as lv
-import matplotlib.pyplot as plt
-import matplotlib._color_data as mcd
+import scipy.sparse as sp
 
 from config.CONFIG import CONFIG
+from . import trace
+from .artifacts import load_graph, save_graph
+from .cooccurrence import (
+    cooccurrence_matrix,
+    graph_from_cooccurrence,
+    incidence_matrix,
+    weight_matrix,
+)
+from .deckstore import read_store
 from .functions import (
-    Logger,
-    filter_sets,
+    deck_columns,
     get_terminal_size,
     read_raw_data,
 )
-
-columns, rows = get_terminal_size()
-sys.stdout = Logger(
-    CONFIG["log_location"].format(
-        datetime.date.today().strftime("%b-%d-%Y")
-    )
+from .ensemble import (
+    check_ensemble_size,
+    coassignment_matrix,
+    consensus_membership,
+    ensemble_memberships,
+    stability_scores,
+)
+from .model import ArchetypeModel, select_clusters
+from .results import (
+    SCORES,
+    breakdown_table,
+    card_table,
+    check_format,
+    deck_table,
+    graph_paths,
+    top_cards_table,
+    write_results,
+    write_table,
+)
+from .sparsify import (
+    MODES as SPARSIFY_MODES,
+    compare_partitions,
+    sparsify_graph,
 )
+from .sweep import plot_profile, resolution_sweep, write_profile
 
+logger = logging.getLogger(__name__)
 
-def create_card_df(all_cards, df, init=None):
-    """Take the set of all cards and all decklists and create a
-    DataFrame containing as columns Card, Number of Decks in and which
-    decks those are.
+
+def create_card_df(vocab, df, init=None):
+    """Take the vocabulary of all cards and all decklists and create a
+    DataFrame containing as columns Card, card id and Number of Decks
+    in, along with the matching deck x card incidence matrix.
     Parameters:
     -----------
-    all_cards: set containing string for each card name detected for a
-    give data set.
+    vocab: Vocabulary containing each card name detected for a given
+    data set.
 
-    df: pandas DataFrame containing all decklists.
+    df: pandas DataFrame containing all decklists as arrays of card
+    ids.
 
     init: None or string or whether to specify an initial cluster
     membership for each card - if string, path
     Returns:
     --------
     card_data_df: pandas DataFrame as described above.
+
+    incidence: scipy.sparse csr_matrix with one row per deck, in the
+    order of df[deck_columns].values.flatten(), and one column per row of
+    card_data_df.
+    See also:
+    ---------
+    incidence_matrix
     """
-    card_data_df = pd.DataFrame(
-        list(all_cards), columns=["Card"]
-    ).sort_values(by="Card")
-    card_data_df.set_index("Card", inplace=True)
-    card_data_df["Count"] = 0
-    card_data_df["Decks"] = [set() for _ in range(len(card_data_df))]
+    decks = df[deck_columns].values.flatten().tolist()
+    incidence = incidence_matrix(decks, len(vocab))
+    card_data_df = card_df_from_counts(
+        vocab.names, np.asarray(incidence.sum(axis=0)).ravel()
+    )
+    card_data_df = merge_init(card_data_df, init)
+    incidence = incidence[:, card_data_df["Id"].to_numpy()].tocsr()
+    return card_data_df, incidence
 
-    decks = df.values.flatten().tolist()
 
-    for i, deck in enumerate(decks):
-        for card in deck:
-            card_data_df.at[card, "Decks"].add(i)
+def card_df_from_counts(names, counts):
+    """Create a card_data_df from card names and the number of decks
+    each card is in.
+    Parameters:
+    -----------
+    names: list of card names, in card id order.
 
-    card_data_df["Count"] = card_data_df["Decks"].apply(len)
+    counts: array of the number of decks each card is in, in card id
+    order.
+    Returns:
+    --------
+    card_data_df: pandas DataFrame containing as columns Card, Id and
+    Count, sorted by descending Count and then by Card.
+    """
+    card_data_df = pd.DataFrame(
+        {
+            "Card": names,
+            "Id": np.arange(len(names)),
+            "Count": counts,
+        }
+    )
+    card_data_df.sort_values(
+        by=["Count", "Card"], inplace=True, ascending=[False, True]
+    )
+    card_data_df.reset_index(drop=True, inplace=True)
+    return card_data_df
 
+
+def merge_init(card_data_df, init=None):
+    """Add the initial cluster membership of each card to card_data_df
+    as an "init" column, keeping the order of its rows.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    init: None or string or filepath to a csv file with columns Card and
+    init. Cards missing from it are put in a new cluster of their own.
+    If None, card_data_df is returned unchanged.
+    Returns:
+    --------
+    card_data_df: pandas DataFrame as described above.
+    """
     if init:
         card_data_df = card_data_df.merge(
             right=pd.read_csv(init), how="left", on="Card"
@@ -78,21 +149,110 @@ def create_card_df(all_cards, df, init=None):
             card_data_df["init"].max() + 1, inplace=True
         )
         card_data_df["init"] = card_data_df["init"].astype(int)
+    return card_data_df
 
-    card_data_df.sort_values(
-        by=["Count", "Card"], inplace=True, ascending=[False, True]
+
+def load_card_graph(data_loc, **kwargs):
+    """Load the card_data_df and graph for data_loc from the cache, or
+    build them from the decklists and cache them if they are missing.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file to analyse.
+
+    no_lands: bool whether to exclude lands from the decklists.
+
+    init: None or string or filepath to initial cluster membership.
+
+    workers: None or int number of processes to parse decklists with.
+
+    no_cache: bool whether to bypass the cache entirely.
+
+    store, weeks: None, or the path of a DeckStore and the names of the
+    weeks to read from it, instead of data_loc. If either is given the
+    graph is not cached.
+    Returns:
+    --------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    decks: None if the graph was loaded from the cache, otherwise the
+    (df, vocab) pair returned by read_raw_data.
+    See also:
+    ---------
+    load_graph
+
+    save_graph
+    """
+    use_cache = not kwargs["no_cache"]
+    from_store = (
+        kwargs.get("store") is not None
+        or kwargs.get("weeks") is not None
     )
-    card_data_df.reset_index(inplace=True)
-    return card_data_df
+    if use_cache and not from_store:
+        with trace.stage("load_graph") as counts:
+            graph = load_graph(data_loc, kwargs["no_lands"])
+            counts["hit"] = graph is not None
+        if graph is not None:
+            card_data_df, G = graph
+            return merge_init(card_data_df, kwargs["init"]), G, None
+
+    df, vocab = traced_read_raw_data(
+        kwargs["no_lands"],
+        kwargs.get("store"),
+        kwargs.get("weeks"),
+        names=bool(kwargs.get("output")),
+        data_loc=data_loc,
+        workers=kwargs["workers"],
+        use_cache=use_cache,
+    )
+    with trace.stage("create_card_df") as counts:
+        card_data_df, incidence = create_card_df(vocab, df)
+        counts["decks"], counts["cards"] = incidence.shape
+    with trace.stage("create_graph") as counts:
+        G = create_graph(card_data_df, incidence)
+        counts["cards"] = G.vcount()
+        counts["edges"] = G.ecount()
+    if use_cache and not from_store:
+        with trace.stage("save_graph"):
+            save_graph(data_loc, kwargs["no_lands"], card_data_df, G)
+    return merge_init(card_data_df, kwargs["init"]), G, (df, vocab)
+
+
+def traced_read_raw_data(no_lands, store=None, weeks=None, **kwargs):
+    """Run read_raw_data, or read_store if a store or weeks are given,
+    as the read_raw_data trace stage, counting the decks and cards read.
+    See also:
+    ---------
+    read_raw_data
+
+    read_store
+    """
+    with trace.stage("read_raw_data") as counts:
+        if store is None and weeks is None:
+            df, vocab = read_raw_data(no_lands, **kwargs)
+        else:
+            df, vocab = read_store(
+                no_lands, kwargs.get("names", False), store, weeks
+            )
+        counts["decks"] = int(
+            df.columns.isin(deck_columns).sum() * len(df)
+        )
+        counts["cards"] = len(vocab)
+    return df, vocab
 
 
-def create_graph(card_data_df):
-    """Take a DataFrame containing card name and deck membership and
-    create from it an igraph Graph.
+def create_graph(card_data_df, incidence):
+    """Take a DataFrame containing card names and the matching deck
+    membership and create from it an igraph Graph.
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as columns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
+
+    incidence: scipy.sparse deck x card matrix with columns in the order
+    of card_data_df.
     Returns:
     --------
     G: igraph Graph containing each card and an edge between each card
@@ -100,68 +260,119 @@ def create_graph(card_data_df):
     See also:
     ---------
     create_card_df: function that creates card_data_df.
+
+    cooccurrence_matrix: function that counts the shared decks.
     """
-    G = ig.Graph()
-    G.add_vertices(len(card_data_df.index))
-    for card1 in range(len(card_data_df.index) - 1):
-        for card2 in range(card1 + 1, len(card_data_df.index)):
-            union = (
-                card_data_df.at[card1, "Decks"]
-                & card_data_df.at[card2, "Decks"]
-            )
-            if union:
-                G.add_edge(card1, card2, weight=len(union))
-    G.vs["label"] = card_data_df["Card"].tolist()
-    G.vs["name"] = G.vs["label"]
-    G.simplify(multiple=True, loops=True, combine_edges=sum)
+    cooccurrence = cooccurrence_matrix(incidence)
+    G = graph_from_cooccurrence(
+        cooccurrence, card_data_df["Card"].tolist()
+    )
     return G
 
 
-def plot_number_clusters(card_data_df, G, resolution_range):
+def sparsify_card_graph(card_data_df, G, n_decks=None, **kwargs):
+    """Remove edges from G with the sparsification modes set in kwargs,
+    logging how many edges each mode removed.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    n_decks: None or int number of decks G was built from, needed by
+    min_pmi.
+
+    min_support, min_cooccurrence, min_pmi, top_k: None or the value of
+    each mode, as taken by sparsify.
+
+    compare_full: bool whether to also cluster G before and after with
+    resolution_parameter and seed, and log how much the partitions
+    differ.
+    Returns:
+    --------
+    G: igraph Graph with the edges kept, or G itself if no mode is set.
+    See also:
+    ---------
+    sparsify_graph
+
+    compare_partitions
+    """
+    options = {mode: kwargs.get(mode) for mode in SPARSIFY_MODES}
+    if all(value is None for value in options.values()):
+        return G
+    with trace.stage("sparsify") as counts:
+        sparse, report = sparsify_graph(
+            card_data_df, G, n_decks, **options
+        )
+        counts["edges_before"] = G.ecount()
+        counts["edges"] = sparse.ecount()
+    logger.info(f"Sparsified graph from {G.ecount()} edges:")
+    for row in report:
+        logger.info(
+            f"    {row['mode']} {row['value']}: removed {row['edges_removed']}, {row['edges_left']} left"
+        )
+    if kwargs.get("compare_full"):
+        comparison = compare_partitions(
+            card_data_df,
+            G,
+            sparse,
+            kwargs.get("resolution_parameter") or 1,
+            kwargs.get("seed") or 0,
+        )
+        logger.info(
+            f"Clusters full/sparsified: {comparison['clusters_full']}/{comparison['clusters_sparse']}, NMI {comparison['nmi']:.3f}, adjusted Rand {comparison['adjusted_rand']:.3f}"
+        )
+    return sparse
+
+
+def plot_number_clusters(
+    card_data_df, G, resolution_range, workers=None, filepath=None
+):
     """Take a card_data_df and the graph that represents it as well as
     a range of resolution parameters, and plot a graph showing how the
     number of clusters changes with resolution parameter.
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     G: igraph Graph representation of card_data_df.
 
     resolution_range: tuple of two values to vary resolution_parameter
     between.
+
+    workers: None or int number of processes to profile with.
+
+    filepath: None or string or filepath to save the plot to instead of
+    showing it.
+    Returns:
+    --------
+    profile: pandas DataFrame as returned by resolution_sweep.
     See also:
     ---------
     create_card_df: function that creates card_data_df.
 
     create_graph: function that creates G.
+
+    resolution_sweep: function that runs the profile.
     """
-    optimiser = lv.Optimiser()
-    profile = optimiser.resolution_profile(
-        G,
-        lv.RBERVertexPartition,
-        resolution_range=resolution_range,
-        node_sizes=card_data_df["Count"].tolist(),
-    )
-    x = np.linspace(
-        resolution_range[0], resolution_range[1], len(profile)
+    profile = resolution_sweep(
+        card_data_df, G, resolution_range, workers
     )
-    y = np.array([len(partition) for partition in profile])
-    plt.plot(x, y)
-    plt.xlabel("resolution_parameter")
-    plt.ylabel("Number of clusters")
-    plt.show()
+    plot_profile(profile, filepath)
+    return profile
 
 
 def create_partition(
-    card_data_df, G, resolution_parameter=1, init=None
+    card_data_df, G, resolution_parameter=1, init=None, seed=None
 ):
     """Take a card_data_df and the graph that represents it and create
     clusters based on lv.RBERVertexPartition.
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     G: igraph Graph representation of card_data_df.
 
@@ -171,6 +382,9 @@ def create_partition(
 
     init: None or string or  whether to specify an initial cluster
     membership for each card - if string, path
+
+    seed: None or int random seed, so the same graph always gives the
+    same partition.
     Returns:
     --------
     partition: the partition created by lv.find_partition.
@@ -190,6 +404,9 @@ def create_partition(
     else:
         initial_membership = None
 
+    import louvain as lv
+
+    options = {} if seed is None else {"seed": seed}
     partition = lv.find_partition(
         G,
         lv.RBERVertexPartition,
@@ -197,8 +414,27 @@ def create_partition(
         resolution_parameter=resolution_parameter,
         node_sizes=card_data_df["Count"].tolist(),
         initial_membership=initial_membership,
+        **options,
     )
 
+    return partition, assign_clusters(card_data_df, G, partition)
+
+
+def assign_clusters(card_data_df, G, partition):
+    """Set the Cluster, Hub Score and Authority Score columns of
+    card_data_df from a partition of G.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    partition: louvain partition or igraph VertexClustering of G.
+    Returns:
+    --------
+    clusters: the number of clusters in partition.
+    """
     clusters = 0
     card_data_df["Cluster"] = [set() for _ in card_data_df.index]
     card_data_df["Hub Score"] = G.hub_score("weight")
@@ -209,20 +445,136 @@ def create_partition(
             card_data_df.at[card, "Cluster"].add(clusters)
         clusters += 1
 
-    return partition, clusters
+    return clusters
+
+
+def create_ensemble_partition(
+    card_data_df,
+    G,
+    resolution_parameter=1,
+    init=None,
+    runs=8,
+    workers=None,
+    seed=0,
+):
+    """Cluster card_data_df with a consensus of runs seeded partitions,
+    found in parallel, rather than a single run of create_partition.
+
+    Besides the columns create_partition sets, a Stability column holds
+    how consistently each card was grouped with the rest of its
+    consensus cluster, from 0 (never) to 1 (every run).
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as colu.mns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    resolution_parameter: float to pass to the RBERVertexPartition.
+
+    init: None or string whether to start each run from the init column
+    of card_data_df.
+
+    runs: int number of seeded partitions to find.
+
+    workers: None or int number of processes to find them with.
+
+    seed: int seed of the first run.
+    Returns:
+    --------
+    partition: igraph VertexClustering of the consensus partition.
+
+    clusters: the number of clusters detected.
+
+    cluster_stability: float array of the stability of each cluster.
+    Raises:
+    -------
+    ValueError: there are more cards than MAX_ENSEMBLE_CARDS.
+    See also:
+    ---------
+    create_partition
+
+    ensemble_memberships
+
+    consensus_membership
+
+    stability_scores
+    """
+    check_ensemble_size(len(card_data_df))
+    memberships = ensemble_memberships(
+        card_data_df, G, resolution_parameter, runs, init, workers, seed
+    )
+    coassignment = coassignment_matrix(memberships)
+    membership = consensus_membership(coassignment)
+    card_stability, cluster_stability = stability_scores(
+        coassignment, membership
+    )
+    import igraph as ig
+
+    partition = ig.VertexClustering(G, membership.tolist())
+    clusters = assign_clusters(card_data_df, G, partition)
+    card_data_df["Stability"] = card_stability
+    return partition, clusters, cluster_stability
+
+
+def membership_matrix(card_data_df, clusters):
+    """Convert the Cluster column of card_data_df into a card x cluster
+    membership matrix.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame with a Cluster column holding the set
+    of clusters each card belongs to.
+
+    clusters: int number of clusters detected.
+    Returns:
+    --------
+    membership: bool numpy array of shape (len(card_data_df), clusters)
+    which is True wherever a card is in a cluster.
+    """
+    cluster_sets = card_data_df["Cluster"].tolist()
+    lengths = [len(cluster_set) for cluster_set in cluster_sets]
+    membership = np.zeros((len(cluster_sets), clusters), dtype=bool)
+    membership[
+        np.repeat(np.arange(len(cluster_sets)), lengths),
+        [int(c) for cluster_set in cluster_sets for c in cluster_set],
+    ] = True
+    return membership
+
+
+def _below_threshold(adjclus, membership, threshold):
+    """Return whether each card's weight to its own clusters is below
+    threshold as a fraction of its total weight.
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        interior = np.where(membership, adjclus, 0).sum(axis=1)
+        return interior / adjclus.sum(axis=1) < threshold
 
 
 def multi_cluster(card_data_df, G, clusters):
     """Take cards that have a high exterior weight and put them into
     additional clusters.
+
+    Each pass visits the cards in order. A card whose clusters hold
+    less than CONFIG["cluster_percentage"] of its weighted connections
+    joins the other cluster it is most connected to, where a neighbour
+    in several clusters counts towards each equally. Passes repeat
+    until nothing changes.
+
+    The weight of every card to every cluster is found at the start of
+    each pass with one sparse matrix product, and is then updated for
+    the neighbours of each card that changes, so later cards in the
+    pass see earlier changes.
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     G: igraph Graph representation of card_data_df.
 
     clusters: int number of clusters detected.
+    Returns:
+    --------
+    passes: int number of passes made over the cards.
     See also:
     ---------
     create_card_df: function that creates card_data_df.
@@ -232,62 +584,250 @@ def multi_cluster(card_data_df, G, clusters):
     CONFIG["cluster_percentage"]: percentage of weighted connections for
     each node that must be a member of its clusters set.
     """
-    changed = True
+    threshold = CONFIG["cluster_percentage"]
+    weights = weight_matrix(G)
+    membership = membership_matrix(card_data_df, clusters)
 
+    passes = 0
+    changed = True
     while changed:
         changed = False
+        passes += 1
+
+        shares = membership / np.maximum(
+            membership.sum(axis=1, keepdims=True), 1
+        )
+        adjclus = weights @ shares
+        below = _below_threshold(adjclus, membership, threshold)
+
+        card = -1
+        while True:
+            remaining = np.flatnonzero(below[card + 1 :])
+            if not len(remaining):
+                break
+            card += 1 + remaining[0]
+
+            exterior = np.where(membership[card], 0, adjclus[card])
+            membership[card, np.argmax(exterior)] = True
+            old_share = shares[card].copy()
+            shares[card] = membership[card] / membership[card].sum()
+
+            start, end = weights.indptr[card], weights.indptr[card + 1]
+            neighbours = weights.indices[start:end]
+            adjclus[neighbours] += np.outer(
+                weights.data[start:end], shares[card] - old_share
+            )
+            below[neighbours] = _below_threshold(
+                adjclus[neighbours], membership[neighbours], threshold
+            )
+            changed = True
+
+    for card, cluster_set in enumerate(card_data_df["Cluster"]):
+        cluster_set.update(
+            int(c) for c in np.flatnonzero(membership[card])
+        )
+    return passes
 
-        copy_df = card_data_df.copy()
-
-        adjlist = G.get_adjlist()
-        for card in copy_df.index:
-            adjlist_card = adjlist[card]
-            clus1 = copy_df.at[card, "Cluster"]
-            clusfilter = [c in clus1 for c in range(clusters)]
-            adjclus = np.zeros(clusters)
-            # adjclus[clusfilter] = len(adjlist_card)
-
-            for adjcard in adjlist_card:
-                clus2 = copy_df.at[adjcard, "Cluster"]
-                for cluster in clus2:
-                    adjclus[cluster] += G.es.select(
-                        _within=(card, adjcard)
-                    )[0]["weight"] / len(clus2)
-
-            if (
-                np.sum(adjclus[clusfilter]) / np.sum(adjclus)
-                < CONFIG["cluster_percentage"]
-            ):
-                adjclus[clusfilter] = 0
-                card_data_df.at[card, "Cluster"].add(np.argmax(adjclus))
-                changed = True
-    # return card_data_df
-
-
-def create_graphml(card_data_df, G, filepath):
-    """Save the graph to a given location.
+
+def interior_edges(edges, membership):
+    """Flag the edges between cards that share a cluster.
     Parameters:
     -----------
-    card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    edges: int array of shape (n_edges, 2) of vertex indices.
+
+    membership: bool array of shape (vertices, clusters) as returned by
+    membership_matrix.
+    Returns:
+    --------
+    interior: bool array with one value per edge.
+    """
+    membership = sp.csr_matrix(membership, dtype=np.int8)
+    shared = membership[edges[:, 0]].multiply(membership[edges[:, 1]])
+    return np.asarray(shared.sum(axis=1)).ravel() > 0
+
+
+def create_graphml(
+    card_data_df,
+    G,
+    filepath,
+    clusters=None,
+    graph_format="graphml",
+    primary=None,
+):
+    """Save the graph, with the clusters of each card and whether each
+    edge is interior to a cluster, in graph_format.
+
+    graphml and graphml.gz hold the whole graph, with the vertex
+    attributes cluster (int) and clusters (;-separated string) and the
+    edge attribute interior (0 or 1). npz holds arrays of the edges,
+    weights, interior flags, card names and counts, and the membership
+    as CSR indptr and indices arrays. parquet writes a nodes table
+    (Vertex, Card, Count, Cluster, Clusters) and an edges table
+    (Source, Target, Weight, Interior).
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to, and the Cluster set
+    of each card, in vertex order.
 
     G: igraph Graph representation of card_data_df.
 
-    filepath: string or filepath object to save the graph to.
+    filepath: string or filepath object to save the graph to. Its
+    extension is replaced to match graph_format.
+
+    clusters: None or int number of clusters, found from card_data_df
+    if None.
+
+    graph_format: one of GRAPH_FORMATS.
+
+    primary: None or list of the cluster each card was first assigned
+    to, before multi_cluster. Defaults to each card's lowest cluster,
+    or -1 if it has none.
+    Returns:
+    --------
+    paths: list of the files written.
     See also:
     ---------
     create_card_df: function that creates card_data_df.
 
     create_graph: function that creates G.
+
+    graph_paths
     """
-    for edge in G.es:
-        src_clus = card_data_df.at[edge.source, "Cluster"]
-        tar_clus = card_data_df.at[edge.target, "Cluster"]
-        if src_clus & tar_clus:
-            edge["interior"] = 1
+    cluster_sets = card_data_df["Cluster"].tolist()
+    if clusters is None:
+        clusters = (
+            max((max(c) for c in cluster_sets if c), default=-1) + 1
+        )
+    membership = membership_matrix(card_data_df, clusters)
+    if primary is None:
+        primary = [min(c, default=-1) for c in cluster_sets]
+    edges = np.array(G.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    interior = interior_edges(edges, membership)
+
+    paths = graph_paths(filepath, graph_format)
+    os.makedirs(
+        os.path.dirname(os.path.abspath(paths[0])), exist_ok=True
+    )
+    if graph_format in ("graphml", "graphml.gz"):
+        G.vs["cluster"] = [int(c) for c in primary]
+        G.vs["clusters"] = [
+            ";".join(str(c) for c in sorted(cluster_set))
+            for cluster_set in cluster_sets
+        ]
+        G.es["interior"] = interior.astype(int).tolist()
+        if graph_format == "graphml":
+            G.write_graphml(paths[0])
         else:
-            edge["interior"] = 0
-    G.save(filepath)
+            # zlib's default level: most of the size reduction of level
+            # 9, in well under half the time on large graphs.
+            G.write_graphmlz(paths[0], compresslevel=6)
+    elif graph_format == "npz":
+        csr = sp.csr_matrix(membership)
+        np.savez_compressed(
+            paths[0],
+            edges=edges.astype(np.int32),
+            weight=np.asarray(G.es["weight"]),
+            interior=interior,
+            cards=card_data_df["Card"].to_numpy(dtype=str),
+            count=card_data_df["Count"].to_numpy(),
+            cluster=np.asarray(primary, dtype=np.int32),
+            membership_indptr=csr.indptr,
+            membership_indices=csr.indices,
+        )
+    else:
+        nodes = pd.DataFrame(
+            {
+                "Vertex": np.arange(len(card_data_df)),
+                "Card": card_data_df["Card"].to_numpy(),
+                "Count": card_data_df["Count"].to_numpy(),
+                "Cluster": np.asarray(primary, dtype=np.int64),
+                "Clusters": [sorted(c) for c in cluster_sets],
+            }
+        )
+        edge_table = pd.DataFrame(
+            {
+                "Source": edges[:, 0],
+                "Target": edges[:, 1],
+                "Weight": np.asarray(G.es["weight"]),
+                "Interior": interior,
+            }
+        )
+        write_table(nodes, paths[0], "parquet")
+        write_table(edge_table, paths[1], "parquet")
+    return paths
+
+
+def deck_incidence(card_data_df, decks):
+    """Build the deck x card incidence matrix of a list of decks, with
+    columns in the order of card_data_df.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame with an Id column giving the card id
+    of each card.
+
+    decks: sequence of arrays containing the card ids in each deck.
+    Cards missing from card_data_df are left out.
+    Returns:
+    --------
+    incidence: scipy.sparse csr_matrix of shape
+    (len(decks), len(card_data_df)).
+    See also:
+    ---------
+    incidence_matrix
+    """
+    ids = card_data_df["Id"].to_numpy()
+    n_cards = max(
+        [int(ids.max()) + 1 if len(ids) else 0]
+        + [int(deck.max()) + 1 for deck in decks if len(deck)]
+    )
+    return incidence_matrix(decks, n_cards)[:, ids].tocsr()
+
+
+def classify_decks(card_data_df, clusters, incidence):
+    """Group every deck into its dominant clusters at once.
+
+    Each deck's hits in each cluster come from a single product of the
+    deck x card incidence matrix and the card x cluster membership
+    matrix. Clusters are then taken in descending order of hits, ties
+    going to the lowest cluster, until they account for
+    CONFIG["deck_percentage"] of the deck's hits.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame with a Cluster column holding the set
+    of clusters each card belongs to.
+
+    clusters: int number of clusters detected.
+
+    incidence: scipy.sparse deck x card matrix with columns in the
+    order of card_data_df, as created by deck_incidence.
+    Returns:
+    --------
+    decks: list containing, for each deck, the set of clusters that
+    contain a given percentage of its cards.
+
+    breakdown: list containing the number of decks in each cluster.
+    See also:
+    ---------
+    classify_decklist
+
+    select_clusters
+
+    CONFIG["deck_percentage"]: percentage of deck that has to be
+    accounted for.
+    """
+    membership = membership_matrix(card_data_df, clusters)
+    selected = select_clusters(
+        np.asarray(incidence @ membership.astype(float)),
+        CONFIG["deck_percentage"],
+    )
+
+    decks = [
+        {int(cluster) for cluster in np.flatnonzero(row)}
+        for row in selected
+    ]
+    breakdown = selected.sum(axis=0).tolist()
+    return decks, breakdown
 
 
 def classify_decklist(card_data_df, clusters, decklist):
@@ -295,37 +835,48 @@ def classify_decklist(card_data_df, clusters, decklist):
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     clusters: int number of clusters detected.
 
-    decklist: set containing string names of cards.
+    decklist: array containing the card ids of each card in the deck.
     Returns:
     --------
     decks: set containing clusters that contain a given percentage of
     members of decklist.
     See also:
     ---------
-    create_card_df: function that creates card_data_df.
+    classify_decks: function that classifies many decks at once.
 
     CONFIG["deck_percentage"]: percentage of deck that has to be
     accounted for.
     """
-    hits = np.zeros(clusters)
-    copy_df = card_data_df.copy().set_index("Card")
-    for card in decklist:
-        card_clusters = copy_df.at[card, "Cluster"]
-        for cluster in card_clusters:
-            hits[cluster] += 1
-    hits /= sum(hits)
-    decks = set()
-    deck_percentage = 0
-    while deck_percentage < CONFIG["deck_percentage"]:
-        cat = hits.argmax()
-        decks.add(cat)
-        deck_percentage += hits[cat]
-        hits[cat] = 0
-    return decks
+    incidence = deck_incidence(card_data_df, [np.asarray(decklist)])
+    decks, _ = classify_decks(card_data_df, clusters, incidence)
+    return decks[0]
+
+
+def save_model(card_data_df, clusters, names=None, **kwargs):
+    """Save the clusters of each card as an ArchetypeModel, to the model
+    path in kwargs or CONFIG["model_location"], so new decks can be
+    classified without running analysis again.
+    See also:
+    ---------
+    ArchetypeModel
+
+    classify_decks
+    """
+    path = kwargs.get("model") or CONFIG.get(
+        "model_location", "output/model.json"
+    )
+    ArchetypeModel(
+        card_data_df["Card"].tolist(),
+        membership_matrix(card_data_df, clusters),
+        names,
+        CONFIG["deck_percentage"],
+        bool(kwargs.get("no_lands")),
+    ).save(path)
+    logger.info(f"Wrote model to {path}")
 
 
 def analysis(df, card_data_df, G, **kwargs):
@@ -335,7 +886,7 @@ def analysis(df, card_data_df, G, **kwargs):
     df: pandas DataFrame containing all decklists.
 
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     G: igraph Graph representation of card_data_df.
 
@@ -345,6 +896,9 @@ def analysis(df, card_data_df, G, **kwargs):
     graph: bool whether to show the graph and create a graphml (True) or
     not.
 
+    graph_format: None or one of GRAPH_FORMATS to save the graph in,
+    defaulting to graphml.
+
     no_lands: bool whether to exclude all lands (as provided by
     config.lands.LANDS) from the decklists.
 
@@ -356,72 +910,145 @@ def analysis(df, card_data_df, G, **kwargs):
 
     colour: bool whether to ask user to manually assign each cluster
     a colour to be plotted with.
+
+    ensemble: None or int number of seeded partitions to build a
+    consensus from with create_ensemble_partition instead of a single
+    create_partition run.
+
+    workers: None or int number of processes to run the ensemble with.
+
+    seed: None or int random seed of the partition, or of the first
+    ensemble run.
+
+    output: None or string format (json, csv or parquet) to write the
+    deck classification, breakdown and top cards of each cluster in,
+    instead of printing them and plotting the breakdown.
+
+    output_dir: None or string or filepath of the directory to write
+    output to, defaulting to CONFIG["results_location"].
+
+    model: None or string or filepath to save the clusters to for
+    classify, defaulting to CONFIG["model_location"].
     See also:
     ---------
     create_partition
 
+    create_ensemble_partition
+
     create_graphml
 
     multi_cluster
 
-    classify_decklist
+    classify_decks
     """
-    partition, clusters = create_partition(
-        card_data_df, G, kwargs["resolution_parameter"], kwargs["init"]
-    )
+    with trace.stage("create_partition") as counts:
+        if kwargs.get("ensemble"):
+            partition, clusters, stability = create_ensemble_partition(
+                card_data_df,
+                G,
+                kwargs["resolution_parameter"],
+                kwargs["init"],
+                kwargs["ensemble"],
+                kwargs.get("workers"),
+                kwargs.get("seed") or 0,
+            )
+            counts["runs"] = kwargs["ensemble"]
+        else:
+            partition, clusters = create_partition(
+                card_data_df,
+                G,
+                kwargs["resolution_parameter"],
+                kwargs["init"],
+                seed=kwargs.get("seed"),
+            )
+            stability = None
+        counts["clusters"] = clusters
     if kwargs["graph"]:
+        import igraph as ig
+
         ig.plot(partition, bbox=(4000, 2000))
-        G.vs["cluster"] = [
-            item
-            for sublist in card_data_df["Cluster"].tolist()
-            for item in sublist
+        primary = [
+            min(cluster_set, default=-1)
+            for cluster_set in card_data_df["Cluster"]
         ]
-        create_graphml(card_data_df, G, CONFIG["graphml_location"])
-    multi_cluster(card_data_df, G, clusters)
-
-    decks = [
-        classify_decklist(card_data_df, clusters, deck)
-        for deck in df.to_numpy().flatten()
-    ]
-    breakdown = [
-        len([y for y in decks if x in y]) for x in range(clusters)
-    ]
+    with trace.stage("multi_cluster") as counts:
+        counts["iterations"] = multi_cluster(card_data_df, G, clusters)
+        counts["memberships"] = int(
+            card_data_df["Cluster"].map(len).sum()
+        )
+    if kwargs["graph"]:
+        with trace.stage("export_graph") as counts:
+            paths = create_graphml(
+                card_data_df,
+                G,
+                CONFIG["graphml_location"],
+                clusters,
+                kwargs.get("graph_format") or "graphml",
+                primary,
+            )
+            counts["edges"] = G.ecount()
+        for path in paths:
+            logger.info(f"Wrote graph to {path}")
+
+    with trace.stage("classify_decks") as counts:
+        decks, breakdown = classify_decks(
+            card_data_df,
+            clusters,
+            deck_incidence(
+                card_data_df,
+                df[deck_columns].to_numpy().flatten().tolist(),
+            ),
+        )
+        counts["decks"] = len(decks)
+    if kwargs.get("output"):
+        paths = write_results(
+            kwargs.get("output_dir")
+            or CONFIG.get("results_location", "output/results"),
+            kwargs["output"],
+            {
+                "decks": deck_table(df, decks),
+                "breakdown": breakdown_table(
+                    breakdown, stability=stability
+                ),
+                "top_cards": top_cards_table(card_data_df),
+                "cards": card_table(card_data_df),
+            },
+        )
+        for path in paths:
+            logger.info(f"Wrote {path}")
+        save_model(card_data_df, clusters, **kwargs)
+        return
+    import matplotlib.pyplot as plt
+    import matplotlib._color_data as mcd
+
+    columns, _ = get_terminal_size()
     names = []
     colours = []
     with pd.option_context("display.max_rows", None):
-        print({x: breakdown[x] for x in range(len(breakdown))})
-        print("=" * columns)
-        print(f"Full df:\n{card_data_df}")
-        print("=" * columns)
-        print("Cluster overview:")
+        logger.info({x: breakdown[x] for x in range(len(breakdown))})
+        logger.info("=" * columns)
+        logger.info("Cluster overview:")
+        # The top cards of every cluster, found in one pass over the
+        # exploded memberships rather than a scan of every card for
+        # every cluster.
+        top_cards = {
+            key: group.tolist()
+            for key, group in top_cards_table(card_data_df).groupby(
+                ["Cluster", "By"], sort=False
+            )["Card"]
+        }
         for cluster in range(clusters):
-            print(f"Cluster {cluster}")
-            authorities = (
-                filter_sets(card_data_df, {cluster}, "Cluster")
-                .sort_values(by="Authority Score", ascending=False)[
-                    "Card"
-                ]
-                .head()
-                .reset_index(drop=True)
-            )
-            hubs = (
-                filter_sets(card_data_df, {cluster}, "Cluster")
-                .sort_values(by="Hub Score", ascending=False)["Card"]
-                .head()
-                .reset_index(drop=True)
-            )
-            top_count = (
-                filter_sets(card_data_df, {cluster}, "Cluster")
-                .sort_values(by="Count", ascending=False)["Card"]
-                .head()
-                .reset_index(drop=True)
-            )
-            print(
+            if stability is None:
+                logger.info(f"Cluster {cluster}")
+            else:
+                logger.info(
+                    f"Cluster {cluster} (stability {stability[cluster]:.2f})"
+                )
+            logger.info(
                 pd.DataFrame(
                     {
-                        "Count": top_count,
-                        "Authority": authorities,
-                        "Hubs": hubs,
+                        by: top_cards.get((cluster, by), [])
+                        for by in SCORES
                     }
                 )
             )
@@ -438,9 +1065,10 @@ def analysis(df, card_data_df, G, **kwargs):
                     if colour in mcd.XKCD_COLORS:
                         valid = True
                     else:
-                        print(f"Colour {colour} not found.")
+                        logger.warning(f"Colour {colour} not found.")
                 colours.append(colour)
-            print("=" * columns)
+            logger.info("=" * columns)
+    save_model(card_data_df, clusters, names, **kwargs)
     fig, ax = plt.subplots(
         figsize=(6, 3), subplot_kw={"aspect": "equal"}
     )
@@ -480,7 +1108,7 @@ def analysis(df, card_data_df, G, **kwargs):
             try:
                 p.set_color(colours[i])
             except ValueError:
-                print(
+                logger.warning(
                     f"Colour {colours[i]} not found, using {p.get_ec()}"
                 )
 
@@ -488,18 +1116,31 @@ def analysis(df, card_data_df, G, **kwargs):
     plt.show()
 
 
-def meta_analysis(card_data_df, G, profile):
-    """Wrapper for plot_number_clusters.
+def meta_analysis(
+    card_data_df, G, profile, workers=None, output=None, plot=None
+):
+    """Wrapper for resolution_sweep and plot_number_clusters.
+
+    With neither output nor plot the plot is shown in a window. With
+    output the profile table is written and nothing is shown, so the
+    sweep can run headless; pass plot as well to also save the plot.
     Parameters:
     -----------
     card_data_df: pandas DataFrame containing as colu.mns card name and
-    the decks that each card belongs to as a set.
+    the number of decks that each card belongs to.
 
     G: igraph Graph representation of card_data_df.
 
     profile: tuple of floats containing lower and upper bounds
     respectively to run the optimisation profiler over, to determine
     number of clusters against resolution_parameter.
+
+    workers: None or int number of processes to split the range over.
+
+    output: None or string or filepath of a .csv or .json file to write
+    the profile table to.
+
+    plot: None or string or filepath to save the plot to.
     Raises:
     -------
     ValueError - if the first profile value is greater or equal to the
@@ -507,39 +1148,84 @@ def meta_analysis(card_data_df, G, profile):
     See also:
     ---------
     plot_number_clusters
+
+    write_profile
     """
     if profile[0] >= profile[1]:
         raise ValueError(
             f"The first profile value must be smaller than the second.\nPassed values: {profile[0]}, {profile[1]}"
         )
-    plot_number_clusters(card_data_df, G, (profile[0], profile[1]))
+    if output is None:
+        plot_number_clusters(
+            card_data_df, G, (profile[0], profile[1]), workers, plot
+        )
+        return
+    sweep = resolution_sweep(
+        card_data_df, G, (profile[0], profile[1]), workers
+    )
+    write_profile(sweep, output)
+    if plot is not None:
+        plot_profile(sweep, plot)
 
 
 def main(**kwargs):
     """Run the functions provided in order to produce summary of data.
     See also:
     ---------
-    read_raw_data
+    load_card_graph
 
-    create_card_df
-
-    create_graph
+    read_raw_data
 
     meta_analysis
 
     analysis
     """
-    df = read_raw_data(kwargs["no_lands"])
-    all_cards = set()
-    for _, row in df.iterrows():
-        for deck in row:
-            all_cards = all_cards | deck
-
-    card_data_df = create_card_df(all_cards, df, kwargs["init"])
-    G = create_graph(card_data_df)
+    if kwargs.get("output"):
+        check_format(kwargs["output"])
+    if kwargs["graph"] and kwargs.get("graph_format") == "parquet":
+        check_format("parquet")
+    data_loc = CONFIG["aggregate_data_loc"]
+    card_data_df, G, decks = load_card_graph(data_loc, **kwargs)
+    if kwargs.get("min_pmi") is not None and decks is None:
+        decks = traced_read_raw_data(
+            kwargs["no_lands"],
+            kwargs.get("store"),
+            kwargs.get("weeks"),
+            names=bool(kwargs.get("output")),
+            data_loc=data_loc,
+            workers=kwargs["workers"],
+            use_cache=not kwargs["no_cache"],
+        )
+    G = sparsify_card_graph(
+        card_data_df,
+        G,
+        None if decks is None else decks[0][deck_columns].size,
+        **kwargs,
+    )
     if kwargs["profile"]:
-        meta_analysis(card_data_df, G, kwargs["profile"])
+        meta_analysis(
+            card_data_df,
+            G,
+            kwargs["profile"],
+            kwargs["workers"],
+            kwargs["profile_output"],
+            kwargs["plot"],
+        )
     else:
         if kwargs["resolution_parameter"] is None:
             kwargs["resolution_parameter"] = 1
+        if decks is None:
+            decks = traced_read_raw_data(
+                kwargs["no_lands"],
+                kwargs.get("store"),
+                kwargs.get("weeks"),
+                names=bool(kwargs.get("output")),
+                data_loc=data_loc,
+                workers=kwargs["workers"],
+                use_cache=not kwargs["no_cache"],
+            )
+        df, vocab = decks
+        card_data_df["Id"] = [
+            vocab.ids[card] for card in card_data_df["Card"]
+        ]
         analysis(df, card_data_df, G, **kwargs)
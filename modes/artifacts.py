@@ -0,0 +1,113 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+
+from . import cache
+from .cooccurrence import graph_from_edges
+from .functions import parse_cache_key
+
+GRAPH_VERSION = 1
+
+
+def graph_key(data_loc, no_lands):
+    """Return the cache key of the co-occurrence graph built from
+    data_loc, which changes whenever the parsed decklists or
+    GRAPH_VERSION do.
+    """
+    return hashlib.sha256(
+        "\0".join(
+            (
+                parse_cache_key(data_loc, no_lands),
+                "graph",
+                str(GRAPH_VERSION),
+            )
+        ).encode()
+    ).hexdigest()
+
+
+def save_graph(data_loc, no_lands, card_data_df, G):
+    """Save the co-occurrence graph of data_loc to the cache.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file the graph was built
+    from.
+
+    no_lands: bool whether lands were excluded from the decklists.
+
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+    Returns:
+    --------
+    stored: bool whether the graph could be written.
+    See also:
+    ---------
+    load_graph
+    """
+    edges = np.array(G.get_edgelist(), dtype=np.int32).reshape(-1, 2)
+    arrays = {
+        "edges": edges,
+        "weights": np.array(G.es["weight"] if len(edges) else []),
+        "counts": card_data_df["Count"].to_numpy(dtype=np.int64),
+    }
+    meta = {
+        "version": GRAPH_VERSION,
+        "cards": card_data_df["Card"].tolist(),
+    }
+    return cache.store_entry(
+        data_loc, graph_key(data_loc, no_lands), arrays, meta, "graph"
+    )
+
+
+def load_graph(data_loc, no_lands):
+    """Load the co-occurrence graph of data_loc saved by save_graph.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file the graph was built
+    from.
+
+    no_lands: bool whether lands were excluded from the decklists.
+    Returns:
+    --------
+    None if no graph is saved for the current contents of data_loc,
+    otherwise
+
+    card_data_df: pandas DataFrame containing as columns Card and Count,
+    in vertex order.
+
+    G: igraph Graph as created by create_graph.
+    See also:
+    ---------
+    save_graph
+    """
+    entry = cache.load_entry(
+        data_loc, graph_key(data_loc, no_lands), "graph"
+    )
+    if entry is None:
+        return None
+    arrays, meta = entry
+    if meta.get("version") != GRAPH_VERSION:
+        return None
+    card_data_df = pd.DataFrame(
+        {"Card": meta["cards"], "Count": np.array(arrays["counts"])}
+    )
+    G = graph_from_edges(
+        arrays["edges"], arrays["weights"], meta["cards"]
+    )
+    return card_data_df, G
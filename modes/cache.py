@@ -0,0 +1,236 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import shutil
+import hashlib
+from os.path import join
+
+from config.CONFIG import CONFIG
+from .columnar import (
+    columns_to_frame,
+    frame_to_columns,
+    read_columns,
+    write_columns,
+)
+
+
+def cache_directory(data_loc):
+    """Return the directory parsed decklists for data_loc are cached in:
+    CONFIG["cache_directory"] if set, otherwise a .decklist_cache
+    directory next to data_loc.
+    """
+    directory = CONFIG.get("cache_directory")
+    if directory:
+        return directory
+    return join(
+        os.path.dirname(os.path.abspath(data_loc)), ".decklist_cache"
+    )
+
+
+def file_digest(path, block_size=1 << 20):
+    """Return the hex sha256 digest of the contents of a file."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(data_loc, *parts):
+    """Create a key identifying the parsed form of data_loc.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file being parsed.
+
+    *parts: anything else the parsed output depends on, such as the
+    parser version and options. Each is converted with str.
+    Returns:
+    --------
+    key: hex string that changes whenever the contents of data_loc or
+    any of parts change.
+    """
+    digest = hashlib.sha256(file_digest(data_loc).encode())
+    for part in parts:
+        digest.update(b"\0" + str(part).encode())
+    return digest.hexdigest()
+
+
+def entry_path(data_loc, key, kind=None):
+    """Return the directory the cache entry for data_loc and key is
+    stored in. kind, if given, is added to the name to tell apart
+    entries of different kinds made from the same csv.
+    """
+    stem = os.path.splitext(os.path.basename(data_loc))[0]
+    if kind:
+        stem = f"{stem}-{kind}"
+    return join(cache_directory(data_loc), f"{stem}-{key[:32]}")
+
+
+def load_entry(data_loc, key, kind=None):
+    """Memory-map the arrays of a cache entry.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file the entry was made
+    from.
+
+    key: string as returned by cache_key.
+
+    kind: None or string kind of entry, as passed to store_entry.
+    Returns:
+    --------
+    None if there is no usable cache entry, otherwise
+
+    arrays: dict of string names to read-only numpy.memmap arrays.
+
+    meta: dict as passed to store_entry.
+    """
+    path = entry_path(data_loc, key, kind)
+    try:
+        arrays, meta = read_columns(path)
+        if meta.get("key") != key:
+            return None
+        os.utime(path)
+    except (OSError, ValueError):
+        return None
+    return arrays, meta
+
+
+def store_entry(data_loc, key, arrays, meta, kind=None, max_size=None):
+    """Write a cache entry, then evict the least recently used entries
+    until the cache fits in max_size.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file the entry was made
+    from.
+
+    key: string as returned by cache_key.
+
+    arrays: dict of string names to numpy arrays.
+
+    meta: dict of anything json can serialise.
+
+    kind: None or string kind of entry.
+
+    max_size: None or int maximum size of the cache directory in bytes.
+    If None, CONFIG["cache_size"] is used.
+    Returns:
+    --------
+    stored: bool whether the entry could be written.
+    See also:
+    ---------
+    evict
+    """
+    if max_size is None:
+        max_size = CONFIG.get("cache_size", 256 * 2**20)
+    meta = dict(meta, key=key, source=os.path.abspath(data_loc))
+    path = entry_path(data_loc, key, kind)
+    try:
+        write_columns(path, arrays, meta)
+    except OSError:
+        return False
+    evict(cache_directory(data_loc), max_size, keep=path)
+    return True
+
+
+def load(data_loc, key):
+    """Load cached decklists for data_loc, memory-mapping the card ids.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file that was parsed.
+
+    key: string as returned by cache_key.
+    Returns:
+    --------
+    None if there is no usable cache entry, otherwise
+
+    df: pandas DataFrame as returned by read_raw_data.
+
+    vocab: Vocabulary the card ids in df were taken from.
+    See also:
+    ---------
+    store
+    """
+    entry = load_entry(data_loc, key)
+    if entry is None:
+        return None
+    try:
+        return columns_to_frame(*entry)
+    except (KeyError, ValueError):
+        return None
+
+
+def store(data_loc, key, df, vocab, max_size=None):
+    """Cache parsed decklists for data_loc.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file that was parsed.
+
+    key: string as returned by cache_key.
+
+    df: pandas DataFrame as returned by read_raw_data.
+
+    vocab: Vocabulary the card ids in df were taken from.
+
+    max_size: None or int maximum size of the cache directory in bytes.
+    If None, CONFIG["cache_size"] is used.
+    Returns:
+    --------
+    stored: bool whether the entry could be written.
+    See also:
+    ---------
+    load
+
+    store_entry
+    """
+    arrays, meta = frame_to_columns(df, vocab)
+    return store_entry(data_loc, key, arrays, meta, max_size=max_size)
+
+
+def entry_size(path):
+    """Return the total size in bytes of the files in a cache entry."""
+    return sum(
+        os.path.getsize(join(path, _file)) for _file in os.listdir(path)
+    )
+
+
+def evict(directory, max_size, keep=None):
+    """Delete the least recently used entries in a cache directory
+    until its total size is at most max_size bytes.
+    Parameters:
+    -----------
+    directory: string or filepath of the cache directory.
+
+    max_size: int maximum total size in bytes.
+
+    keep: None or string path of an entry never to delete, such as the
+    one just written.
+    """
+    try:
+        entries = [
+            join(directory, entry)
+            for entry in os.listdir(directory)
+            if os.path.isdir(join(directory, entry))
+        ]
+        sizes = {entry: entry_size(entry) for entry in entries}
+    except OSError:
+        return
+    total = sum(sizes.values())
+    for entry in sorted(entries, key=os.path.getmtime):
+        if total <= max_size:
+            break
+        if keep is not None and os.path.samefile(entry, keep):
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
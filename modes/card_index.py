@@ -0,0 +1,265 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+
+import numpy as np
+
+from . import cache
+from .functions import deck_columns, normalise_name
+from .vocabulary import Vocabulary
+
+
+class CardIndex(object):
+    """Inverted index from each card to the decks that play it.
+
+    The postings of every card are kept CSR-style: the decks playing
+    card id c are decks[indptr[c] : indptr[c + 1]], in ascending order,
+    where deck d is slot d % slots of row d // slots of the DataFrame.
+    Parameters:
+    -----------
+    df: pandas DataFrame as returned by read_raw_data, with deck columns
+    holding arrays of card ids and optionally a Team Name column.
+
+    vocab: Vocabulary the card ids in df were taken from.
+    """
+
+    def __init__(self, df, vocab):
+        """Instantiate the class."""
+        self.vocab = vocab
+        self.columns = [
+            col for col in deck_columns if col in df.columns
+        ]
+        self.slots = len(self.columns)
+        if "Team Name" in df.columns:
+            self.teams = df["Team Name"].tolist()
+        else:
+            self.teams = [str(row) for row in range(len(df))]
+
+        lists = df[self.columns].to_numpy().ravel().tolist()
+        lengths = np.fromiter(
+            (len(deck) for deck in lists),
+            dtype=np.int64,
+            count=len(lists),
+        )
+        if lists:
+            cards = np.concatenate(lists).astype(np.int64)
+        else:
+            cards = np.zeros(0, dtype=np.int64)
+        decks = np.repeat(np.arange(len(lists)), lengths)
+        # A stable sort by card keeps each card's decks in ascending
+        # order, which puts decks of the same team next to each other.
+        order = np.argsort(cards, kind="stable")
+        self.cards = cards[order]
+        self.decks = decks[order]
+        self.counts = np.bincount(self.cards, minlength=len(vocab))
+        self.indptr = np.zeros(len(self.counts) + 1, dtype=np.int64)
+        np.cumsum(self.counts, out=self.indptr[1:])
+
+    def __len__(self):
+        """Return the number of cards indexed."""
+        return len(self.counts)
+
+    def card_id(self, name):
+        """Return the id of a card name, as written in a decklist, or
+        None if no deck plays it.
+        """
+        card = self.vocab.ids.get(name)
+        if card is None:
+            card = self.vocab.ids.get(normalise_name(name))
+        return card
+
+    def decks_with(self, name):
+        """Find every deck that plays a card.
+        Parameters:
+        -----------
+        name: string card name.
+        Returns:
+        --------
+        decks: list of (team name, deck column) tuples, in the order of
+        the DataFrame. Empty if no deck plays the card.
+        """
+        card = self.card_id(name)
+        if card is None or card >= len(self.counts):
+            return []
+        return [
+            (
+                self.teams[deck // self.slots],
+                self.columns[deck % self.slots],
+            )
+            for deck in self.decks[
+                self.indptr[card] : self.indptr[card + 1]
+            ]
+        ]
+
+    def cards_in_more_than(self, n):
+        """Find the cards played in more than n decks.
+        Returns:
+        --------
+        cards: list of (card name, number of decks) tuples, most played
+        first, then by name.
+        """
+        ids = np.flatnonzero(self.counts > n)
+        return sorted(
+            zip(self.vocab.decode(ids), self.counts[ids].tolist()),
+            key=lambda item: (-item[1], item[0]),
+        )
+
+    def shared_cards(self, exclude=None):
+        """Find every card that is in more than one deck of the same
+        team, with a single pass over the postings.
+        Parameters:
+        -----------
+        exclude: None or array of card ids that may be shared freely,
+        such as the ids of BASICS.
+        Returns:
+        --------
+        duplicates: dict of row number to a dict in the form returned
+        by check_no_duplicates, for each row with any shared cards, in
+        row order.
+        See also:
+        ---------
+        check_no_duplicates
+        """
+        cards, decks = self.cards, self.decks
+        if exclude is not None and len(exclude):
+            keep = ~np.isin(cards, exclude)
+            cards, decks = cards[keep], decks[keep]
+        rows = decks // self.slots
+
+        pairs = []
+        # A card is at most once per deck, so it can only be shared
+        # with the next slots - 1 postings of the same card and row.
+        for offset in range(1, self.slots):
+            same = (cards[offset:] == cards[:-offset]) & (
+                rows[offset:] == rows[:-offset]
+            )
+            first = np.flatnonzero(same)
+            pairs.append(
+                np.column_stack(
+                    (
+                        rows[first],
+                        decks[first] % self.slots,
+                        decks[first + offset] % self.slots,
+                        cards[first],
+                    )
+                )
+            )
+        if not pairs:
+            return {}
+        pairs = np.concatenate(pairs)
+        pairs = pairs[np.lexsort(pairs.T[::-1])]
+
+        duplicates = {}
+        for row, slot1, slot2, card in pairs.tolist():
+            shared = duplicates.setdefault(row, {}).setdefault(
+                f"{slot1}, {slot2}", []
+            )
+            shared.append(card)
+        return {
+            row: {
+                key: np.array(value, dtype=self.cards.dtype)
+                for key, value in overlap.items()
+            }
+            for row, overlap in duplicates.items()
+        }
+
+
+class FileIndex(object):
+    """Incrementally updated inverted index from each card to the
+    decklist files that play it.
+
+    Each file's parsed cards are kept alongside its size, modification
+    time and content digest, so a file is only re-parsed when its
+    contents change, and only that file's postings are touched.
+    Parameters:
+    -----------
+    parse: function taking a file path and returning the set of card
+    names in it.
+
+    exclude: iterable of card names that may be shared freely, such as
+    BASICS. They are left out of the index.
+    """
+
+    def __init__(self, parse, exclude=()):
+        """Instantiate the class."""
+        self.parse = parse
+        self.exclude = frozenset(exclude)
+        self.vocab = Vocabulary()
+        self.files = {}
+        self.stamps = {}
+        self.postings = {}
+
+    def __len__(self):
+        """Return the number of files indexed."""
+        return len(self.files)
+
+    def _stamp(self, path):
+        """Return the size and modification time of a file."""
+        stat = os.stat(path)
+        return stat.st_size, stat.st_mtime_ns
+
+    def update(self, path):
+        """Index a file, re-parsing it only if its size or modification
+        time changed and its contents did too.
+        Returns:
+        --------
+        changed: bool whether the cards in the file changed.
+        """
+        stamp = self._stamp(path)
+        old = self.stamps.get(path)
+        if old is not None and old[:2] == stamp:
+            return False
+        digest = cache.file_digest(path)
+        if old is not None and old[2] == digest:
+            self.stamps[path] = stamp + (digest,)
+            return False
+
+        # Stamp only once parsed, so a file that fails is retried.
+        cards = {
+            self.vocab.intern(name)
+            for name in self.parse(path)
+            if name not in self.exclude
+        }
+        self.stamps[path] = stamp + (digest,)
+        previous = self.files.get(path, set())
+        for card in previous - cards:
+            self.postings[card].discard(path)
+        for card in cards - previous:
+            self.postings.setdefault(card, set()).add(path)
+        self.files[path] = cards
+        return old is None or cards != previous
+
+    def remove(self, path):
+        """Drop a file from the index."""
+        for card in self.files.pop(path, ()):
+            self.postings[card].discard(path)
+        self.stamps.pop(path, None)
+
+    def overlaps_of(self, path):
+        """Find the cards a file shares with each other indexed file,
+        looking only at the postings of that file's cards.
+        Returns:
+        --------
+        overlaps: dict of other file path to the set of card names both
+        files play, for each file sharing at least one card.
+        """
+        overlaps = {}
+        for card in self.files.get(path, ()):
+            for other in self.postings[card]:
+                if other != path:
+                    overlaps.setdefault(other, set()).add(
+                        self.vocab.names[card]
+                    )
+        return overlaps
@@ -0,0 +1,96 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import sys
+import json
+import time
+import logging
+
+from config.CONFIG import CONFIG
+from .log import console_to
+from .model import load_model
+
+logger = logging.getLogger(__name__)
+
+# A line holding only this separates decklists read from a stream.
+SEPARATOR = "---"
+
+
+def read_decklists(stream):
+    """Yield each decklist in a stream as soon as it is complete.
+
+    Decklists are separated by lines holding only SEPARATOR, and the
+    last one ends with the stream. Blank decklists are skipped.
+    """
+    lines = []
+    for line in stream:
+        if line.strip() == SEPARATOR:
+            if "".join(lines).strip():
+                yield "".join(lines)
+            lines = []
+        else:
+            lines.append(line)
+    if "".join(lines).strip():
+        yield "".join(lines)
+
+
+def classify_stream(model, decklists, output=sys.stdout):
+    """Classify each of decklists with model, writing one JSON object
+    per line to output as each deck is classified.
+    Parameters:
+    -----------
+    model: ArchetypeModel to classify with.
+
+    decklists: iterable of (deck, text) pairs, where deck names the
+    decklist in the output.
+
+    output: file to write to.
+    See also:
+    ---------
+    ArchetypeModel.classify_text
+    """
+    for deck, text in decklists:
+        start = time.perf_counter()
+        result = model.classify_text(text)
+        logger.debug(
+            f"Classified {deck} in {1000 * (time.perf_counter() - start):.2f} ms"
+        )
+        output.write(json.dumps({"deck": deck, **result}) + "\n")
+        output.flush()
+
+
+def main(**kwargs):
+    """Load the model saved by analysis once, then classify each
+    decklist file given, or each decklist read from stdin.
+    See also:
+    ---------
+    load_model
+
+    classify_stream
+    """
+    # stdout carries the JSON lines, so log to stderr from here on.
+    console_to(sys.stderr)
+    path = kwargs["model"] or CONFIG.get(
+        "model_location", "output/model.json"
+    )
+    model = load_model(path)
+    logger.info(f"Loaded {len(model)} clusters from {path}")
+    if kwargs["files"]:
+        decklists = []
+        for filepath in kwargs["files"]:
+            with open(filepath) as f:
+                decklists.append((filepath, f.read()))
+    else:
+        decklists = enumerate(read_decklists(sys.stdin))
+    classify_stream(model, decklists)
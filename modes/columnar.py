@@ -0,0 +1,201 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import json
+import shutil
+import tempfile
+from os.path import join
+
+import numpy as np
+import pandas as pd
+
+from .vocabulary import Vocabulary
+
+META_FILE = "meta.json"
+
+
+def object_column(values):
+    """Pack a list of arrays into a 1D object array without pandas or
+    numpy trying to broadcast them into two dimensions.
+    """
+    column = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        column[i] = value
+    return column
+
+
+def write_columns(path, arrays, meta):
+    """Save a set of named arrays and a JSON-serialisable dict as a
+    directory with one .npy file per array.
+
+    The directory is written under a temporary name and renamed into
+    place, so a reader never sees a partially written store.
+    Parameters:
+    -----------
+    path: string or filepath of the directory to create. Any existing
+    directory at this location is replaced.
+
+    arrays: dict of string names to numpy arrays.
+
+    meta: dict of anything json can serialise.
+    See also:
+    ---------
+    read_columns
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(dir=parent, prefix=".tmp-")
+    try:
+        for name, array in arrays.items():
+            np.save(
+                join(tmp, f"{name}.npy"), np.ascontiguousarray(array)
+            )
+        with open(join(tmp, META_FILE), "w") as f:
+            json.dump(meta, f)
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def read_columns(path, mmap=True):
+    """Load a directory written by write_columns.
+    Parameters:
+    -----------
+    path: string or filepath of the directory to read.
+
+    mmap: bool whether to memory-map the arrays read-only (True) or
+    read them fully into memory (False).
+    Returns:
+    --------
+    arrays: dict of string names to numpy arrays (numpy.memmap if mmap
+    is True).
+
+    meta: dict as passed to write_columns.
+    Raises:
+    -------
+    OSError: the directory or one of its files could not be read.
+
+    ValueError: one of the files is not a valid .npy or JSON file.
+    """
+    with open(join(path, META_FILE)) as f:
+        meta = json.load(f)
+    arrays = {
+        _file[: -len(".npy")]: np.load(
+            join(path, _file), mmap_mode="r" if mmap else None
+        )
+        for _file in os.listdir(path)
+        if _file.endswith(".npy")
+    }
+    return arrays, meta
+
+
+def ragged_to_columns(values):
+    """Flatten a sequence of 1D arrays into CSR-style indptr and values
+    arrays.
+    Parameters:
+    -----------
+    values: sequence of 1D numpy arrays of the same dtype.
+    Returns:
+    --------
+    indptr: int64 array such that values[i] is
+    flat[indptr[i] : indptr[i + 1]].
+
+    flat: the concatenation of values.
+    """
+    indptr = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum([len(v) for v in values], out=indptr[1:])
+    if len(values):
+        flat = np.concatenate(values)
+    else:
+        flat = np.zeros(0)
+    return indptr, flat
+
+
+def columns_to_ragged(indptr, flat):
+    """Split a flat array back into a list of views, one per row.
+    See also:
+    ---------
+    ragged_to_columns
+    """
+    return np.split(flat, np.asarray(indptr[1:-1]))
+
+
+def frame_to_columns(df, vocab):
+    """Convert a DataFrame of decklists, as returned by read_raw_data,
+    and its Vocabulary into arrays and metadata for write_columns.
+
+    Columns holding arrays of card ids are stored as CSR-style indptr
+    and values arrays; any other column is stored as a list of strings
+    in the metadata.
+    Parameters:
+    -----------
+    df: pandas DataFrame of decklists.
+
+    vocab: Vocabulary the card ids in df were taken from.
+    Returns:
+    --------
+    arrays: dict of string names to numpy arrays.
+
+    meta: dict describing the columns, rows and vocabulary.
+    See also:
+    ---------
+    columns_to_frame
+    """
+    arrays = {}
+    meta = {"rows": len(df), "columns": [], "vocab": vocab.names}
+    for i, col_name in enumerate(df.columns):
+        values = df[col_name].tolist()
+        if values and isinstance(values[0], np.ndarray):
+            indptr, flat = ragged_to_columns(values)
+            arrays[f"{i}.indptr"] = indptr
+            arrays[f"{i}.values"] = flat
+            meta["columns"].append({"name": col_name, "kind": "ragged"})
+        else:
+            meta["columns"].append(
+                {
+                    "name": col_name,
+                    "kind": "text",
+                    "values": [str(value) for value in values],
+                }
+            )
+    return arrays, meta
+
+
+def columns_to_frame(arrays, meta):
+    """Rebuild the DataFrame and Vocabulary saved by frame_to_columns.
+
+    Arrays of card ids are views into arrays, so if those are
+    memory-mapped nothing is read from disk until it is used.
+    See also:
+    ---------
+    frame_to_columns
+    """
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        if column["kind"] == "ragged":
+            data[column["name"]] = object_column(
+                columns_to_ragged(
+                    arrays[f"{i}.indptr"], arrays[f"{i}.values"]
+                )
+            )
+        else:
+            data[column["name"]] = column["values"]
+    df = pd.DataFrame(
+        data, columns=[column["name"] for column in meta["columns"]]
+    )
+    return df, Vocabulary(meta["vocab"])
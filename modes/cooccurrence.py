@@ -0,0 +1,162 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import numpy as np
+import scipy.sparse as sp
+
+
+def incidence_matrix(decks, n_cards):
+    """Build the deck x card incidence matrix for a list of decks.
+    Parameters:
+    -----------
+    decks: sequence of arrays, each containing the unique card ids in
+    one deck.
+
+    n_cards: int number of cards (columns) in the matrix, normally the
+    length of the Vocabulary the ids come from.
+    Returns:
+    --------
+    incidence: scipy.sparse csr_matrix of shape (len(decks), n_cards)
+    with a 1 wherever a deck contains a card.
+    See also:
+    ---------
+    read_raw_data: function that creates the decks.
+    """
+    lengths = np.fromiter((len(d) for d in decks), dtype=np.int64)
+    indptr = np.zeros(len(decks) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=indptr[1:])
+    if len(decks):
+        indices = np.concatenate(decks).astype(np.int32, copy=False)
+    else:
+        indices = np.zeros(0, dtype=np.int32)
+    return sp.csr_matrix(
+        (np.ones(len(indices), dtype=np.int32), indices, indptr),
+        shape=(len(decks), n_cards),
+    )
+
+
+def cooccurrence_matrix(incidence):
+    """Count how many decks each pair of cards appear in together.
+    Parameters:
+    -----------
+    incidence: scipy.sparse matrix of shape (n_decks, n_cards) as
+    created by incidence_matrix.
+    Returns:
+    --------
+    cooccurrence: scipy.sparse csr_matrix of shape (n_cards, n_cards)
+    holding, strictly above the diagonal, the number of decks each pair
+    of cards shares. Pairs sharing no decks are not stored.
+    See also:
+    ---------
+    incidence_matrix
+    """
+    incidence = sp.csr_matrix(incidence, dtype=np.int64)
+    product = (incidence.T @ incidence).tocsr()
+    cooccurrence = sp.triu(product, k=1, format="csr")
+    cooccurrence.eliminate_zeros()
+    cooccurrence.sort_indices()
+    return cooccurrence
+
+
+def reorder_cooccurrence(cooccurrence, order):
+    """Permute the cards of an upper triangular co-occurrence matrix.
+    Parameters:
+    -----------
+    cooccurrence: scipy.sparse matrix as created by
+    cooccurrence_matrix.
+
+    order: array of card indices, such that card order[i] of
+    cooccurrence becomes card i of the result.
+    Returns:
+    --------
+    cooccurrence: scipy.sparse csr_matrix holding the same counts above
+    the diagonal, in the new card order.
+    """
+    symmetric = sp.csr_matrix(cooccurrence)
+    symmetric = (symmetric + symmetric.T).tocsr()
+    symmetric = symmetric[order][:, order]
+    reordered = sp.triu(symmetric, k=1, format="csr")
+    reordered.sort_indices()
+    return reordered
+
+
+def weight_matrix(G):
+    """Return the symmetric weighted adjacency matrix of a graph.
+    Parameters:
+    -----------
+    G: igraph Graph with a "weight" edge attribute and no multiple
+    edges.
+    Returns:
+    --------
+    weights: scipy.sparse csr_matrix of shape (n_vertices, n_vertices)
+    with the weight of each edge in both directions.
+    """
+    n = G.vcount()
+    edges = np.array(G.get_edgelist(), dtype=np.int64).reshape(-1, 2)
+    weights = np.array(
+        G.es["weight"] if len(edges) else [], dtype=float
+    )
+    upper = sp.csr_matrix(
+        (weights, (edges[:, 0], edges[:, 1])), shape=(n, n)
+    )
+    return (upper + upper.T).tocsr()
+
+
+def graph_from_cooccurrence(cooccurrence, names):
+    """Create an igraph Graph from a co-occurrence matrix.
+    Parameters:
+    -----------
+    cooccurrence: scipy.sparse matrix as created by
+    cooccurrence_matrix.
+
+    names: list of strings to name each vertex with, in matrix order.
+    Returns:
+    --------
+    G: igraph Graph with one vertex per card and an edge between each
+    pair of cards weighted by the number of decks they are in together,
+    if nonzero. Edges are ordered by source then target vertex.
+    See also:
+    ---------
+    cooccurrence_matrix
+
+    graph_from_edges
+    """
+    coo = sp.csr_matrix(cooccurrence).tocoo()
+    return graph_from_edges(
+        np.column_stack((coo.row, coo.col)), coo.data, names
+    )
+
+
+def graph_from_edges(edges, weights, names):
+    """Create an igraph Graph from arrays of edges and their weights.
+    Parameters:
+    -----------
+    edges: array of shape (n_edges, 2) of vertex indices.
+
+    weights: array of length n_edges of edge weights.
+
+    names: list of strings to name each vertex with.
+    Returns:
+    --------
+    G: igraph Graph with one vertex per name and the given edges, in
+    order.
+    """
+    import igraph as ig
+
+    G = ig.Graph(n=len(names))
+    G.add_edges(np.asarray(edges).tolist())
+    G.es["weight"] = np.asarray(weights).tolist()
+    G.vs["label"] = list(names)
+    G.vs["name"] = G.vs["label"]
+    return G
@@ -0,0 +1,581 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import logging
+import multiprocessing
+from os.path import basename, splitext
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from config.CONFIG import CONFIG
+from config.lands import LANDS
+from . import trace
+from .columnar import (
+    columns_to_ragged,
+    object_column,
+    read_columns,
+    write_columns,
+)
+from .functions import (
+    deck_columns,
+    deck_quantities,
+    parse_decks,
+    pilot_columns,
+)
+from .vocabulary import CARD_ID_DTYPE, Vocabulary
+
+logger = logging.getLogger(__name__)
+
+STORE_VERSION = 1
+
+
+def store_location(path=None):
+    """Return path, or CONFIG["store_location"] if it is None."""
+    return path or CONFIG.get("store_location", "output/store")
+
+
+def week_name(data_loc):
+    """Name a week after its csv file, without the extension."""
+    return splitext(basename(data_loc))[0]
+
+
+def _encode(values, table):
+    """Give each string in values a code, adding new strings to table,
+    a dict of string to code.
+    """
+    return np.fromiter(
+        (table.setdefault(value, len(table)) for value in values),
+        dtype=np.int32,
+        count=len(values),
+    )
+
+
+def read_week(
+    data_loc, vocab, teams, pilots, pool=None, workers=1, chunksize=1000
+):
+    """Parse the decklists and details of one csv file into the columns
+    of a DeckStore.
+
+    Rows are kept exactly when read_raw_data keeps them, so the decks of
+    a week are the same whether read from the csv or the store. Lands
+    are always kept, with their quantities.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file.
+
+    vocab: Vocabulary to intern card names in.
+
+    teams, pilots: dicts of team and pilot names to their codes, added
+    to as new names are seen.
+
+    pool: None or multiprocessing.Pool to parse decklists in.
+
+    workers: int number of chunks to parse each csv chunk in.
+
+    chunksize: int number of csv rows to read at a time.
+    Returns:
+    --------
+    week: dict of arrays: lengths, cards, quantities and pilot for each
+    deck (cards sorted by id within each deck, quantities aligned with
+    them), and team and timestamp for each entry (csv row).
+    Raises:
+    -------
+    ValueError: the Team Name column or a decklist column could not be
+    found in the csv.
+    See also:
+    ---------
+    deck_quantities
+    """
+    parts = {
+        name: []
+        for name in (
+            "cards",
+            "quantities",
+            "pilot",
+            "team",
+            "timestamp",
+        )
+    }
+    lengths = []
+    for chunk in pd.read_csv(data_loc, chunksize=chunksize):
+        for col_name in ["Team Name"] + deck_columns:
+            if col_name not in chunk.columns:
+                raise ValueError(
+                    f"Column {col_name} could not be found in csv - check headers are named appropriately."
+                )
+        chunk = chunk.dropna()
+        texts = chunk[deck_columns].to_numpy().ravel().tolist()
+        for deck in parse_decks(
+            texts, False, pool, workers, deck_quantities
+        ):
+            ids = np.fromiter(
+                (vocab.intern(card) for card in deck),
+                dtype=CARD_ID_DTYPE,
+                count=len(deck),
+            )
+            order = np.argsort(ids)
+            lengths.append(len(ids))
+            parts["cards"].append(ids[order])
+            parts["quantities"].append(
+                np.fromiter(deck.values(), np.int32, len(deck))[order]
+            )
+        parts["team"].append(
+            _encode(chunk["Team Name"].astype(str).tolist(), teams)
+        )
+        parts["pilot"].append(
+            _encode(
+                chunk.reindex(columns=pilot_columns)
+                .fillna("")
+                .astype(str)
+                .to_numpy()
+                .ravel()
+                .tolist(),
+                pilots,
+            )
+        )
+        if "Timestamp" in chunk.columns:
+            timestamps = pd.to_datetime(
+                chunk["Timestamp"], errors="coerce"
+            )
+        else:
+            timestamps = pd.Series(pd.NaT, index=chunk.index)
+        parts["timestamp"].append(
+            timestamps.to_numpy(dtype="datetime64[ns]").view(np.int64)
+        )
+
+    week = {"lengths": np.asarray(lengths, dtype=np.int64)}
+    for name, values in parts.items():
+        dtype = np.int64 if name == "timestamp" else np.int32
+        week[name] = (
+            np.concatenate(values) if values else np.zeros(0, dtype)
+        ).astype(dtype, copy=False)
+    return week
+
+
+def build_store(path, files, workers=None, chunksize=None):
+    """Parse csv files of decklists, one per week, into a DeckStore.
+    Parameters:
+    -----------
+    path: string or filepath of the directory to write the store to.
+    Any existing store there is replaced.
+
+    files: list of strings or filepaths of csv files, in week order.
+    Each week is named after its file.
+
+    workers: None or int number of processes to parse decklists with.
+    If None, CONFIG["parse_workers"] is used. Values of 1 or less, or a
+    failure to start the process pool, parse serially.
+
+    chunksize: None or int number of csv rows to read at a time. If
+    None, CONFIG["parse_chunksize"] is used.
+    Returns:
+    --------
+    store: DeckStore opened on the new store.
+    Raises:
+    -------
+    ValueError: two files have the same week name, or a csv is missing
+    a required column.
+    See also:
+    ---------
+    read_week
+    """
+    weeks = [week_name(data_loc) for data_loc in files]
+    repeated = sorted({week for week in weeks if weeks.count(week) > 1})
+    if repeated:
+        raise ValueError(
+            f"More than one file is named {', '.join(repeated)} - week names must be unique."
+        )
+    if workers is None:
+        workers = CONFIG.get("parse_workers", 1)
+    if chunksize is None:
+        chunksize = CONFIG.get("parse_chunksize", 1000)
+
+    pool = None
+    if workers > 1:
+        try:
+            pool = multiprocessing.Pool(workers)
+        except (OSError, ImportError, NotImplementedError):
+            pool = None
+
+    vocab = Vocabulary()
+    teams = {}
+    pilots = {}
+    parsed = []
+    try:
+        for data_loc in files:
+            parsed.append(
+                read_week(
+                    data_loc,
+                    vocab,
+                    teams,
+                    pilots,
+                    pool,
+                    workers,
+                    chunksize,
+                )
+            )
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    indptr = np.zeros(
+        sum(len(week["lengths"]) for week in parsed) + 1, dtype=np.int64
+    )
+    if parsed:
+        np.cumsum(
+            np.concatenate([week["lengths"] for week in parsed]),
+            out=indptr[1:],
+        )
+    week_indptr = np.zeros(len(parsed) + 1, dtype=np.int64)
+    np.cumsum(
+        [len(week["team"]) for week in parsed], out=week_indptr[1:]
+    )
+    arrays = {"indptr": indptr, "week_indptr": week_indptr}
+    for name in ("cards", "quantities", "pilot", "team", "timestamp"):
+        arrays[name] = (
+            np.concatenate([week[name] for week in parsed])
+            if parsed
+            else np.zeros(0, dtype=np.int32)
+        )
+    meta = {
+        "version": STORE_VERSION,
+        "weeks": weeks,
+        "sources": [os.path.abspath(data_loc) for data_loc in files],
+        "vocab": vocab.names,
+        "teams": list(teams),
+        "pilots": list(pilots),
+        "decks_per_entry": len(deck_columns),
+    }
+    write_columns(path, arrays, meta)
+    return DeckStore(path)
+
+
+class DeckStore(object):
+    """Decklists of several weeks kept on disk in columns, and
+    memory-mapped read-only when opened.
+
+    The card ids of every deck are stored CSR-style: one flat array of
+    card ids, sorted within each deck, with a parallel array of their
+    quantities, and an indptr array of where each deck starts. Each
+    entry (csv row) has a team and timestamp, each deck a pilot, and
+    team and pilot names are stored once, as codes. Decks are in week
+    order, so the decks of a run of weeks are a single slice: opening a
+    store reads only its metadata, and a query pages in only the weeks
+    it selects.
+
+    A DeckStore pickles as its path, so worker processes map the same
+    files rather than receiving a copy of the data.
+    Parameters:
+    -----------
+    path: string or filepath of a store written by build_store.
+    Raises:
+    -------
+    OSError: the store could not be read.
+
+    ValueError: the store was written by an incompatible version.
+    """
+
+    def __init__(self, path):
+        """Instantiate the class."""
+        self.path = path
+        self.arrays, meta = read_columns(path)
+        if meta.get("version") != STORE_VERSION:
+            raise ValueError(
+                f"{path} is a version {meta.get('version')} deck store, expected version {STORE_VERSION}. Run the store mode again to rebuild it."
+            )
+        self.weeks = meta["weeks"]
+        self.sources = meta["sources"]
+        self.vocab = Vocabulary(meta["vocab"])
+        self.teams = meta["teams"]
+        self.pilots = meta["pilots"]
+        self.per_entry = meta["decks_per_entry"]
+
+    def __reduce__(self):
+        """Pickle the store as its path."""
+        return (DeckStore, (self.path,))
+
+    def __len__(self):
+        """Return the number of decks."""
+        return len(self.arrays["indptr"]) - 1
+
+    def entry_ranges(self, weeks=None):
+        """Return the (start, stop) entries of the selected weeks, with
+        consecutive weeks merged into one range.
+        Parameters:
+        -----------
+        weeks: None for every week, or an iterable of week names.
+        Raises:
+        -------
+        ValueError: a week is not in the store.
+        """
+        week_indptr = self.arrays["week_indptr"]
+        if weeks is None:
+            return [(int(week_indptr[0]), int(week_indptr[-1]))]
+        unknown = [week for week in weeks if week not in self.weeks]
+        if unknown:
+            raise ValueError(
+                f"Weeks {', '.join(unknown)} are not in the store at {self.path}, which has {', '.join(self.weeks)}."
+            )
+        ranges = []
+        for week in sorted({self.weeks.index(week) for week in weeks}):
+            start, stop = int(week_indptr[week]), int(
+                week_indptr[week + 1]
+            )
+            if ranges and ranges[-1][1] == start:
+                ranges[-1] = (ranges[-1][0], stop)
+            else:
+                ranges.append((start, stop))
+        return ranges
+
+    def lands(self):
+        """Return a bool array, True for each card id that is a land."""
+        return np.fromiter(
+            (name in LANDS for name in self.vocab.names),
+            dtype=bool,
+            count=len(self.vocab),
+        )
+
+    def decks(self, weeks=None, no_lands=False):
+        """Read the decks of the selected weeks.
+
+        Card ids are renumbered to a Vocabulary of only the cards in the
+        selected decks. If that is every card, and no lands are removed,
+        cards and quantities are slices of the memory-mapped arrays.
+        Parameters:
+        -----------
+        weeks: None for every week, or an iterable of week names.
+
+        no_lands: bool whether to exclude lands.
+        Returns:
+        --------
+        indptr: int64 array such that the cards of deck i are
+        cards[indptr[i] : indptr[i + 1]].
+
+        cards: array of card ids, sorted within each deck.
+
+        quantities: int array of the number of copies of each card.
+
+        vocab: Vocabulary of the card ids.
+        """
+        indptr = self.arrays["indptr"]
+        parts = []
+        offset = 0
+        for start, stop in self.entry_ranges(weeks):
+            first, last = start * self.per_entry, stop * self.per_entry
+            low, high = indptr[first], indptr[last]
+            parts.append(
+                (
+                    indptr[first + bool(parts) : last + 1]
+                    - low
+                    + offset,
+                    self.arrays["cards"][low:high],
+                    self.arrays["quantities"][low:high],
+                )
+            )
+            offset += high - low
+        if len(parts) == 1:
+            deck_indptr, cards, quantities = parts[0]
+        else:
+            deck_indptr, cards, quantities = (
+                np.concatenate(arrays) for arrays in zip(*parts)
+            )
+
+        if no_lands:
+            keep = ~self.lands()[cards]
+            if not keep.all():
+                deck_indptr = np.concatenate(([0], np.cumsum(keep)))[
+                    deck_indptr
+                ]
+                cards = cards[keep]
+                quantities = quantities[keep]
+        used = np.zeros(len(self.vocab), dtype=bool)
+        used[cards] = True
+        if used.all():
+            return deck_indptr, cards, quantities, self.vocab
+        renumber = (np.cumsum(used) - 1).astype(CARD_ID_DTYPE)
+        vocab = Vocabulary(self.vocab.decode(np.flatnonzero(used)))
+        return deck_indptr, renumber[cards], quantities, vocab
+
+    def incidence(self, weeks=None, no_lands=False, quantities=False):
+        """Build the deck x card incidence matrix of the selected weeks.
+        Parameters:
+        -----------
+        weeks: None for every week, or an iterable of week names.
+
+        no_lands: bool whether to exclude lands.
+
+        quantities: bool whether to hold the number of copies of each
+        card (True) or 1 (False).
+        Returns:
+        --------
+        incidence: scipy.sparse csr_matrix of shape (decks, len(vocab)).
+
+        vocab: Vocabulary of its columns.
+        See also:
+        ---------
+        incidence_matrix
+        """
+        indptr, cards, counts, vocab = self.decks(weeks, no_lands)
+        data = (
+            np.asarray(counts, dtype=np.int32)
+            if quantities
+            else np.ones(len(cards), dtype=np.int32)
+        )
+        return (
+            sp.csr_matrix(
+                (data, cards, indptr),
+                shape=(len(indptr) - 1, len(vocab)),
+            ),
+            vocab,
+        )
+
+    def frame(self, weeks=None, no_lands=False, names=False):
+        """Read the selected weeks in the form read_raw_data returns.
+        Parameters:
+        -----------
+        weeks: None for every week, or an iterable of week names.
+
+        no_lands: bool whether to exclude lands.
+
+        names: bool whether to include the "Team Name" column. When more
+        than one week is selected, each team name is prefixed with its
+        week, as the same team may enter every week.
+        Returns:
+        --------
+        df: pandas DataFrame with a column of card id arrays per deck of
+        each entry, as returned by read_raw_data.
+
+        vocab: Vocabulary mapping the card ids in df to card names.
+        See also:
+        ---------
+        read_raw_data
+        """
+        indptr, cards, _, vocab = self.decks(weeks, no_lands)
+        decks = columns_to_ragged(indptr, cards)
+        df = pd.DataFrame(
+            {
+                col_name: object_column(decks[i :: self.per_entry])
+                for i, col_name in enumerate(deck_columns)
+            },
+            columns=deck_columns,
+        )
+        if names:
+            entries = self.entries(weeks)
+            teams = np.asarray(self.teams, dtype=object)[
+                self.arrays["team"][entries]
+            ]
+            selected = self.weeks if weeks is None else set(weeks)
+            if len(selected) > 1:
+                teams = [
+                    f"{week}: {team}"
+                    for week, team in zip(
+                        self.entry_weeks(entries), teams
+                    )
+                ]
+            df.insert(0, "Team Name", teams)
+        return df, vocab
+
+    def entries(self, weeks=None):
+        """Return the index of every entry of the selected weeks."""
+        return np.concatenate(
+            [
+                np.arange(start, stop, dtype=np.int64)
+                for start, stop in self.entry_ranges(weeks)
+            ]
+        )
+
+    def entry_weeks(self, entries):
+        """Return the week name of each entry in entries."""
+        weeks = (
+            np.searchsorted(
+                self.arrays["week_indptr"], entries, side="right"
+            )
+            - 1
+        )
+        return np.asarray(self.weeks, dtype=object)[weeks]
+
+    def metadata(self, weeks=None):
+        """Tabulate the details of each deck of the selected weeks.
+        Returns:
+        --------
+        table: pandas DataFrame with a row per deck, in the order of
+        decks, with columns Week, Team Name, Timestamp, Deck (its
+        number within the entry), Pilot (the csv's pilot and deck name
+        column) and Cards (the number of different cards in it).
+        """
+        entries = self.entries(weeks)
+        decks = (
+            entries[:, None] * self.per_entry
+            + np.arange(self.per_entry)
+        ).ravel()
+        indptr = self.arrays["indptr"]
+        return pd.DataFrame(
+            {
+                "Week": np.repeat(
+                    self.entry_weeks(entries), self.per_entry
+                ),
+                "Team Name": np.repeat(
+                    np.asarray(self.teams, dtype=object)[
+                        self.arrays["team"][entries]
+                    ],
+                    self.per_entry,
+                ),
+                "Timestamp": np.repeat(
+                    np.asarray(self.arrays["timestamp"][entries]).view(
+                        "datetime64[ns]"
+                    ),
+                    self.per_entry,
+                ),
+                "Deck": np.tile(
+                    np.arange(1, self.per_entry + 1), len(entries)
+                ),
+                "Pilot": np.asarray(self.pilots, dtype=object)[
+                    self.arrays["pilot"][decks]
+                ],
+                "Cards": indptr[decks + 1] - indptr[decks],
+            }
+        )
+
+
+def read_store(no_lands, names=False, store=None, weeks=None):
+    """Read decks from the DeckStore at store (or
+    CONFIG["store_location"]) in the form read_raw_data returns.
+    See also:
+    ---------
+    DeckStore.frame
+    """
+    return DeckStore(store_location(store)).frame(
+        weeks, no_lands, names
+    )
+
+
+def main(**kwargs):
+    """Parse csv files into a DeckStore and summarise it."""
+    path = store_location(kwargs["store"])
+    with trace.stage("build_store") as counts:
+        store = build_store(path, kwargs["files"], kwargs["workers"])
+        counts["decks"] = len(store)
+        counts["cards"] = len(store.vocab)
+    metadata = store.metadata()
+    logger.info(
+        f"Wrote {len(store)} decks of {len(store.vocab)} cards to {path}"
+    )
+    for week, decks in (
+        metadata.groupby("Week", sort=False).size().items()
+    ):
+        logger.info(f"    {week}: {decks} decks")
@@ -0,0 +1,242 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import multiprocessing
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.cluster.hierarchy import fcluster, linkage
+from scipy.spatial.distance import squareform
+
+CONSENSUS_THRESHOLD = 0.5
+# The consensus keeps a dense cards x cards co-assignment matrix, its
+# distance matrix and their condensed form in memory: about 24 bytes
+# per pair of cards, so 2.4 GB at this many cards.
+MAX_ENSEMBLE_CARDS = 10000
+
+_graph = None
+_options = None
+
+
+def _init_worker(G, options):
+    """Keep the graph and find_partition options in each worker
+    process, so they are sent once per worker rather than once per run.
+    """
+    global _graph, _options
+    _graph = G
+    _options = options
+
+
+def _run(seed):
+    """Find one partition of the graph given to _init_worker with the
+    random seed seed and return its membership.
+    """
+    import louvain as lv
+
+    partition = lv.find_partition(
+        _graph, lv.RBERVertexPartition, seed=seed, **_options
+    )
+    return partition.membership
+
+
+def ensemble_memberships(
+    card_data_df,
+    G,
+    resolution_parameter=1,
+    runs=8,
+    init=None,
+    workers=None,
+    seed=0,
+):
+    """Find runs partitions of G with different random seeds, in
+    parallel.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    resolution_parameter: float to pass to the RBERVertexPartition.
+
+    runs: int number of partitions to find.
+
+    init: None or string whether to start each run from the init column
+    of card_data_df.
+
+    workers: None or int number of processes to run with. If None, one
+    per CPU is used. Values of 1 or less, or a failure to start the
+    process pool, run serially.
+
+    seed: int seed of the first run. Run i uses seed + i, so the same
+    seed always gives the same ensemble.
+    Returns:
+    --------
+    memberships: int array of shape (runs, number of cards) holding the
+    cluster of each card in each run.
+    See also:
+    ---------
+    create_partition: the single run this repeats.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    options = {
+        "weights": "weight",
+        "resolution_parameter": resolution_parameter,
+        "node_sizes": card_data_df["Count"].tolist(),
+        "initial_membership": (
+            card_data_df["init"].tolist() if init else None
+        ),
+    }
+    seeds = [seed + i for i in range(runs)]
+
+    pool = None
+    if workers > 1 and runs > 1:
+        try:
+            pool = multiprocessing.Pool(
+                min(workers, runs),
+                initializer=_init_worker,
+                initargs=(G, options),
+            )
+        except (OSError, ImportError, NotImplementedError):
+            pool = None
+
+    if pool is None:
+        _init_worker(G, options)
+        results = [_run(s) for s in seeds]
+    else:
+        try:
+            results = pool.map(_run, seeds)
+        finally:
+            pool.close()
+            pool.join()
+    return np.array(results, dtype=np.int32).reshape(runs, -1)
+
+
+def check_ensemble_size(n_cards, max_cards=MAX_ENSEMBLE_CARDS):
+    """Check a consensus of n_cards cards fits in memory before any
+    partition is found.
+    Raises:
+    -------
+    ValueError: n_cards is more than max_cards.
+    """
+    if n_cards > max_cards:
+        raise ValueError(
+            f"--ensemble builds dense {n_cards} x {n_cards} matrices, which needs about {24 * n_cards ** 2 / 2 ** 30:.1f} GB; it supports at most {max_cards} cards. Use --no-lands, fewer weeks, or a single run without --ensemble."
+        )
+
+
+def coassignment_matrix(memberships):
+    """Count how often each pair of cards is put in the same cluster.
+
+    The result is dense, so memory grows with the square of the number
+    of cards; see MAX_ENSEMBLE_CARDS.
+    Parameters:
+    -----------
+    memberships: int array of shape (runs, number of cards) as returned
+    by ensemble_memberships.
+    Returns:
+    --------
+    coassignment: float array of shape (number of cards, number of
+    cards) holding the fraction of runs in which each pair of cards
+    share a cluster. The diagonal is 1.
+    """
+    runs, n_cards = memberships.shape
+    # Stack the one-hot membership matrices of every run side by side,
+    # so a single product sums the co-assignments of all of them.
+    offsets = np.concatenate(
+        ([0], np.cumsum(memberships.max(axis=1) + 1)[:-1])
+    )
+    onehot = sp.csr_matrix(
+        (
+            np.ones(runs * n_cards),
+            (
+                np.tile(np.arange(n_cards), runs),
+                (memberships + offsets[:, np.newaxis]).ravel(),
+            ),
+        ),
+        shape=(n_cards, int(memberships.max(axis=1).sum()) + runs),
+    )
+    return (onehot @ onehot.T).toarray() / runs
+
+
+def consensus_membership(coassignment, threshold=CONSENSUS_THRESHOLD):
+    """Build a consensus partition from a co-assignment matrix.
+
+    Cards are merged by average linkage, so two groups are joined only
+    while their cards share a cluster in at least threshold of the
+    runs on average. Unlike joining every pair above threshold, one
+    card that sits between two clusters cannot chain them together.
+    Clusters are numbered from largest to smallest, as louvain numbers
+    its own. The linkage works on the condensed distance matrix, a
+    further n_cards * (n_cards - 1) / 2 floats; see MAX_ENSEMBLE_CARDS.
+    Parameters:
+    -----------
+    coassignment: array as returned by coassignment_matrix.
+
+    threshold: float fraction of runs from which groups are joined.
+    Returns:
+    --------
+    membership: int array of the consensus cluster of each card.
+    """
+    if len(coassignment) < 2:
+        return np.zeros(len(coassignment), dtype=np.int64)
+    distance = 1 - coassignment
+    np.fill_diagonal(distance, 0)
+    labels = (
+        fcluster(
+            linkage(squareform(distance, checks=False), "average"),
+            1 - threshold,
+            criterion="distance",
+        )
+        - 1
+    )
+    sizes = np.bincount(labels)
+    # A stable sort keeps equal sized clusters in the order fcluster
+    # numbered them, so the result is deterministic.
+    order = np.argsort(-sizes, kind="stable")
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    return rank[labels]
+
+
+def stability_scores(coassignment, membership):
+    """Score how consistently the consensus clusters were found.
+    Parameters:
+    -----------
+    coassignment: array as returned by coassignment_matrix.
+
+    membership: int array as returned by consensus_membership.
+    Returns:
+    --------
+    card_stability: float array of, for each card, the mean fraction of
+    runs it shared a cluster with each other card of its consensus
+    cluster. Cards alone in their cluster score 1.
+
+    cluster_stability: float array of, for each consensus cluster, the
+    mean of card_stability over its cards.
+    """
+    same = membership[:, np.newaxis] == membership[np.newaxis, :]
+    sizes = np.bincount(membership)
+    others = sizes[membership] - 1
+    within = np.where(same, coassignment, 0).sum(axis=1) - np.diag(
+        coassignment
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        card_stability = np.where(others > 0, within / others, 1.0)
+    cluster_stability = (
+        np.bincount(membership, weights=card_stability) / sizes
+    )
+    return card_stability, cluster_stability
@@ -12,46 +12,48 @@
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 #    GNU General Public License for more details.
 
-import sys
 import os
+import inspect
+import hashlib
+import multiprocessing
+from collections import namedtuple
+from functools import lru_cache
 from os.path import join
 
-import regex as re
+import re
+import numpy as np
 import pandas as pd
 
 from config.CONFIG import CONFIG
+from config import lands
 from config.lands import LANDS
+from . import cache
+from .columnar import object_column
+from .vocabulary import Vocabulary
 
 decklist_directory = CONFIG["decklist_directory"]
 decklist_line_1 = r"^([\w '\-,/]*[^\s(\n]) x\d+"
 decklist_line_2 = r"^\d+x?[^\S\n\r]+([\w '\-,/]*[^\s(\n])"
+deck_columns = ["Deck 1 List", "Deck 2 List", "Deck 3 List"]
+pilot_columns = [
+    "Deck 1 Pilot IGN + Deck Name",
+    "Deck 2 Pilot IGN + Deck Name",
+    "Deck 3 Pilot IGN + Deck Name",
+]
+decklist_pattern = re.compile(
+    r"^(?:(\d+)x?[^\S\n\r]+([\w '\-,/]*[^\s(\n])"
+    r"|([\w '\-,/]*[^\s(\n]) x(\d+)"
+    r"|[^\S\n]*(?:[Ss]ideboard:?[^\S\n]*)?$)",
+    flags=re.MULTILINE,
+)
 
+PARSER_VERSION = 1
+MAINBOARD = "main"
+SIDEBOARD = "side"
 
-class Logger(object):
-    """Object that writes to both sys.stdout and a file.
-    Parameters:
-    -----------
-    filepath: location of log file to write to.
-    """
-
-    def __init__(self, filepath):
-        """Instantiate the class."""
-        self.terminal = sys.stdout
-        self.log = open(filepath, "a+")
-
-    def __del__(self):
-        """Ensure the file is closed on deletion."""
-        self.log.close()
-
-    def write(self, message):
-        """Write a message to both the terminal and file."""
-        self.terminal.write(message)
-        self.log.write(message)
-
-    def flush(self):
-        """Flush the terminal and file."""
-        self.terminal.flush()
-        self.log.flush()
+DecklistRecord = namedtuple(
+    "DecklistRecord", ["card", "quantity", "zone"]
+)
 
 
 def get_terminal_size(fallback=(72, 24)):
@@ -79,6 +81,50 @@ def get_terminal_size(fallback=(72, 24)):
     return columns, rows
 
 
+@lru_cache(maxsize=None)
+def normalise_name(name):
+    """Convert a card name as written in a decklist to title case, as
+    used by LANDS and the rest of the program.
+    """
+    return name.title().replace("'S", "'s")
+
+
+def parse_decklist(text):
+    """Take a multiline string and return a record for each card line
+    detected, reading the text once with a single compiled pattern.
+
+    Lines may be of the form "4 Card Name (SET) 123", "4x Card Name" or
+    "Card Name x4". The first blank line after any cards, or a line
+    reading "Sideboard", marks the start of the sideboard.
+    Parameters:
+    -----------
+    text: str - text to analyse to find card names in.
+    Returns:
+    --------
+    records: list of DecklistRecord (card, quantity, zone) tuples in the
+    order they appear, where zone is MAINBOARD or SIDEBOARD.
+    """
+    records = []
+    zone = MAINBOARD
+    matches = decklist_pattern.findall(text.replace("`", "'"))
+    for quantity, name, name_last, quantity_last in matches:
+        if name:
+            records.append(
+                DecklistRecord(
+                    normalise_name(name), int(quantity), zone
+                )
+            )
+        elif name_last:
+            records.append(
+                DecklistRecord(
+                    normalise_name(name_last), int(quantity_last), zone
+                )
+            )
+        elif records:
+            zone = SIDEBOARD
+    return records
+
+
 def create_set(text, no_lands=False):
     """Take a multiline string and return a set of card names detected.
 
@@ -89,18 +135,71 @@ def create_set(text, no_lands=False):
     no_lands: bool whether to eliminate all lands (True) or not.
     Returns:
     --------
-    names: set - unordered set of detected names.
+    names: set - unordered set of detected names, from both the
+    mainboard and sideboard.
+    See also:
+    ---------
+    parse_decklist
     """
-    text = re.sub("['`]", "'", text)
-    names = set(
-        re.findall(decklist_line_1, text, flags=re.MULTILINE)
-    ) | set(re.findall(decklist_line_2, text, flags=re.MULTILINE))
-    names = {name.title().replace("'S", "'s") for name in names}
+    names = {record.card for record in parse_decklist(text)}
     if no_lands:
-        names -= names & LANDS
+        names -= LANDS
     return names
 
 
+def deck_quantities(text, no_lands=False):
+    """Take a multiline string and return the number of copies of each
+    card detected.
+    Parameters:
+    -----------
+    text: str - text to analyse to find card names in.
+
+    no_lands: bool whether to eliminate all lands (True) or not.
+    Returns:
+    --------
+    quantities: dict of card name to the total number of copies in the
+    mainboard and sideboard.
+    See also:
+    ---------
+    parse_decklist
+    """
+    quantities = {}
+    for record in parse_decklist(text):
+        if no_lands and record.card in LANDS:
+            continue
+        quantities[record.card] = (
+            quantities.get(record.card, 0) + record.quantity
+        )
+    return quantities
+
+
+def parser_fingerprint():
+    """Return a hex digest identifying the current decklist parser, so
+    that cached parses are discarded whenever it changes.
+    """
+    digest = hashlib.sha256(str(PARSER_VERSION).encode())
+    digest.update(decklist_pattern.pattern.encode())
+    for function in (normalise_name, parse_decklist, create_set):
+        digest.update(inspect.getsource(function).encode())
+    return digest.hexdigest()
+
+
+def parse_cache_key(data_loc, no_lands, names=False):
+    """Return the cache key of the decklists read_raw_data parses from
+    data_loc with the given options.
+    See also:
+    ---------
+    cache.cache_key
+    """
+    return cache.cache_key(
+        data_loc,
+        parser_fingerprint(),
+        cache.file_digest(lands.__file__),
+        no_lands,
+        names,
+    )
+
+
 def create_set_from_file(dir):
     """Wrapper for create_set that takes a file path to read and run
     create_set on.
@@ -140,45 +239,154 @@ def filter_sets(df, filter, field, whitelist=True):
     return df[mask]
 
 
+def _parse_decks(texts, no_lands, parse=create_set):
+    """Run parse on each of a list of decklist texts."""
+    return [parse(text, no_lands) for text in texts]
+
+
+def parse_decks(
+    texts, no_lands=False, pool=None, workers=1, parse=create_set
+):
+    """Run create_set, or parse, on a list of decklist texts, splitting
+    the work into one chunk per worker if a process pool is provided.
+    Parameters:
+    -----------
+    texts: list of strings containing decklists.
+
+    no_lands: bool whether to eliminate all lands (True) or not.
+
+    pool: None or multiprocessing.Pool to parse the chunks in. If None,
+    the texts are parsed serially.
+
+    workers: int number of chunks to split texts into when pool is not
+    None.
+
+    parse: function taking a decklist text and no_lands, such as
+    create_set or deck_quantities. It must be defined at module level
+    to be sent to the pool.
+    Returns:
+    --------
+    sets: list of the result of parse for each text (sets of card names
+    for create_set), in the same order as texts.
+    See also:
+    ---------
+    create_set
+    """
+    if pool is None or workers <= 1 or len(texts) <= 1:
+        return _parse_decks(texts, no_lands, parse)
+    size = -(-len(texts) // workers)
+    chunks = [texts[i : i + size] for i in range(0, len(texts), size)]
+    results = pool.starmap(
+        _parse_decks, [(chunk, no_lands, parse) for chunk in chunks]
+    )
+    return [names for chunk in results for names in chunk]
+
+
 def read_raw_data(
-    no_lands, names=False, data_loc=CONFIG["aggregate_data_loc"]
+    no_lands,
+    names=False,
+    data_loc=CONFIG["aggregate_data_loc"],
+    workers=None,
+    chunksize=None,
+    use_cache=True,
 ):
     """Collect data from a csv file to locate decklists in and return
     DataFrame of decklists.
+
+    The csv is read chunksize rows at a time and each chunk's decklists
+    are parsed, in parallel if workers is greater than 1, before the
+    next chunk is read, so the raw text of the whole file is never held
+    in memory at once.
     Parameters:
     -----------
     no_lands: bool whether to exclude lands (True) or not (False).
 
+    names: bool whether to include the "Team Name" column (True) or not.
+
     data_loc: string or filepath - location of the csv file to open.
+
+    workers: None or int number of processes to parse decklists with.
+    If None, CONFIG["parse_workers"] is used. Values of 1 or less, or a
+    failure to start the process pool, parse serially.
+
+    chunksize: None or int number of csv rows to read at a time. If
+    None, CONFIG["parse_chunksize"] is used.
+
+    use_cache: bool whether to load the decklists from, and save them
+    to, the parse cache (True) or always parse the csv (False). Cache
+    entries are keyed by the contents of data_loc, the parser and
+    config/lands.py, so a change to any of them parses afresh.
     Returns:
     --------
-    pandas DataFrame containing three columns ["Deck 1 List",
-    "Deck 2 List", "Deck 3 List"], each of which contains a set
-    detailing each card in that decklist as detected by create_set.
+    df: pandas DataFrame containing three columns ["Deck 1 List",
+    "Deck 2 List", "Deck 3 List"], each of which contains a sorted
+    numpy array of the card ids in that decklist as detected by
+    create_set.
+
+    vocab: Vocabulary mapping the card ids in df to card names.
     Raises:
     -------
     ValueError: one of the column names could not be found in the
     DataFrame
     See also:
     ---------
-    create_set
+    parse_decks
+
+    cache.load
+
+    Vocabulary
     """
     if names:
-        cols = [
-            "Team Name",
-            "Deck 1 List",
-            "Deck 2 List",
-            "Deck 3 List",
-        ]
+        cols = ["Team Name"] + deck_columns
+    else:
+        cols = deck_columns
+    if workers is None:
+        workers = CONFIG.get("parse_workers", 1)
+    if chunksize is None:
+        chunksize = CONFIG.get("parse_chunksize", 1000)
+
+    if use_cache:
+        key = parse_cache_key(data_loc, no_lands, names)
+        cached = cache.load(data_loc, key)
+        if cached is not None:
+            return cached
+
+    pool = None
+    if workers > 1:
+        try:
+            pool = multiprocessing.Pool(workers)
+        except (OSError, ImportError, NotImplementedError):
+            pool = None
+
+    vocab = Vocabulary()
+    chunks = []
+    try:
+        for chunk in pd.read_csv(data_loc, chunksize=chunksize):
+            for col_name in cols:
+                if col_name not in chunk.columns:
+                    raise ValueError(
+                        f"Column {col_name} could not be found in csv - check headers are named appropriately."
+                    )
+            chunk = chunk.dropna().loc[:, cols]
+            texts = chunk[deck_columns].to_numpy().ravel().tolist()
+            decks = [
+                vocab.encode(sorted(deck))
+                for deck in parse_decks(texts, no_lands, pool, workers)
+            ]
+            for i, col_name in enumerate(deck_columns):
+                chunk[col_name] = object_column(
+                    decks[i :: len(deck_columns)]
+                )
+            chunks.append(chunk)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    if chunks:
+        df = pd.concat(chunks, ignore_index=True)
     else:
-        cols = ["Deck 1 List", "Deck 2 List", "Deck 3 List"]
-    df = pd.read_csv(data_loc)
-    for col_name in cols:
-        if col_name not in df.columns:
-            raise ValueError(f"Column {col_name} could not be found in csv - check headers are named appropriately.")
-    df = df.dropna().reset_index().loc[:, cols]
-    df[["Deck 1 List", "Deck 2 List", "Deck 3 List"]] = df[
-        ["Deck 1 List", "Deck 2 List", "Deck 3 List"]
-    ].applymap(lambda x: create_set(x, no_lands))
-
-    return df
+        df = pd.DataFrame(columns=cols)
+    if use_cache:
+        cache.store(data_loc, key, df, vocab)
+    return df, vocab
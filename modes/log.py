@@ -0,0 +1,120 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import sys
+import gzip
+import shutil
+import logging
+import logging.handlers
+
+FILE_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+CONSOLE_FORMAT = "%(message)s"
+
+
+def _gzip_namer(name):
+    """Name rotated log files with a .gz suffix."""
+    return f"{name}.gz"
+
+
+def _gzip_rotator(source, dest):
+    """Compress a rotated log file into dest and remove the original."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def setup_logging(
+    filepath=None,
+    level=logging.INFO,
+    buffer=1000,
+    max_bytes=None,
+    backup_count=5,
+):
+    """Send log records from the program to the terminal and a file.
+
+    Records go to stdout as plain messages at level and above. Every
+    record at DEBUG and above goes to filepath with a timestamp and
+    level, through a buffer that is written out every buffer records,
+    on any ERROR, and at exit.
+    Parameters:
+    -----------
+    filepath: None or string or filepath of the log file to append to.
+    If None, nothing is logged to a file.
+
+    level: int logging level to show in the terminal, such as
+    logging.WARNING for a quiet run.
+
+    buffer: int number of records to hold before writing to the file.
+
+    max_bytes: None or int size in bytes at which the log file is
+    rotated. Rotated files are gzip compressed, and the newest
+    backup_count are kept. If None, the file is never rotated.
+
+    backup_count: int number of rotated files to keep.
+    Returns:
+    --------
+    logger: the root logger.
+    """
+    root = logging.getLogger()
+    root.setLevel(logging.DEBUG)
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+        handler.close()
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setLevel(level)
+    console.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+    root.addHandler(console)
+
+    if filepath is not None:
+        os.makedirs(
+            os.path.dirname(os.path.abspath(filepath)), exist_ok=True
+        )
+        if max_bytes:
+            target = logging.handlers.RotatingFileHandler(
+                filepath,
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                delay=True,
+            )
+            target.namer = _gzip_namer
+            target.rotator = _gzip_rotator
+        else:
+            target = logging.FileHandler(filepath, delay=True)
+        target.setFormatter(logging.Formatter(FILE_FORMAT))
+        root.addHandler(
+            logging.handlers.MemoryHandler(
+                buffer, flushLevel=logging.ERROR, target=target
+            )
+        )
+    # Libraries such as matplotlib log their own DEBUG records, which
+    # are of no use here.
+    for name in ("matplotlib", "PIL"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+    return root
+
+
+def console_to(stream):
+    """Send the terminal log records set up by setup_logging to another
+    stream, such as sys.stderr for a mode whose stdout is data.
+    Parameters:
+    -----------
+    stream: file-like object to write the records to.
+    """
+    for handler in logging.getLogger().handlers:
+        # FileHandler subclasses StreamHandler; only the console is
+        # a plain StreamHandler.
+        if type(handler) is logging.StreamHandler:
+            handler.setStream(stream)
@@ -0,0 +1,394 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import logging
+import multiprocessing
+from os.path import basename, splitext
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.optimize import linear_sum_assignment
+
+from config.CONFIG import CONFIG
+from . import trace
+from .analysis import (
+    classify_decks,
+    create_card_df,
+    create_graph,
+    create_partition,
+    membership_matrix,
+    multi_cluster,
+)
+from .functions import read_raw_data
+from .results import check_format, write_results
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+# Clusters of consecutive weeks with less than this similarity are not
+# matched, even if the assignment pairs them, so the later one starts a
+# new archetype.
+MIN_SIMILARITY = 0.3
+ARCHETYPE_CARDS = 3
+
+
+def cluster_week(data_loc, **kwargs):
+    """Cluster the decks of one csv file and classify them.
+    Parameters:
+    -----------
+    data_loc: string or filepath of the csv file.
+
+    no_lands: bool whether to exclude lands.
+
+    resolution_parameter: float to pass to create_partition.
+
+    seed: None or int random seed of the partition.
+
+    use_cache: bool whether to use the parse cache.
+    Returns:
+    --------
+    week: dict of cards (list of card names), counts (array of the
+    number of decks each card is in), membership (bool array of cards
+    by clusters), breakdown (list of the number of decks in each
+    cluster) and decks (int number of decks).
+    See also:
+    ---------
+    create_partition
+
+    multi_cluster
+
+    classify_decks
+    """
+    df, vocab = read_raw_data(
+        kwargs["no_lands"],
+        data_loc=data_loc,
+        workers=1,
+        use_cache=kwargs["use_cache"],
+    )
+    card_data_df, incidence = create_card_df(vocab, df)
+    G = create_graph(card_data_df, incidence)
+    _, clusters = create_partition(
+        card_data_df,
+        G,
+        kwargs["resolution_parameter"],
+        seed=kwargs["seed"],
+    )
+    multi_cluster(card_data_df, G, clusters)
+    _, breakdown = classify_decks(card_data_df, clusters, incidence)
+    return {
+        "cards": card_data_df["Card"].tolist(),
+        "counts": card_data_df["Count"].to_numpy(),
+        "membership": membership_matrix(card_data_df, clusters),
+        "breakdown": breakdown,
+        "decks": incidence.shape[0],
+    }
+
+
+def _cluster_week(args):
+    """Unpack the arguments of cluster_week for Pool.map."""
+    data_loc, kwargs = args
+    return cluster_week(data_loc, **kwargs)
+
+
+def cluster_weeks(files, workers=None, **kwargs):
+    """Run cluster_week on each file, one file per process.
+    Parameters:
+    -----------
+    files: list of strings or filepaths of csv files.
+
+    workers: None or int number of processes. If None, one per CPU is
+    used, and never more than one per file. Values of 1 or less, or a
+    failure to start the process pool, run serially.
+
+    kwargs: passed to cluster_week.
+    Returns:
+    --------
+    weeks: list of dicts as returned by cluster_week, in the order of
+    files.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(files))
+    tasks = [(data_loc, kwargs) for data_loc in files]
+
+    pool = None
+    if workers > 1:
+        try:
+            pool = multiprocessing.Pool(workers)
+        except (OSError, ImportError, NotImplementedError):
+            pool = None
+    if pool is None:
+        return [_cluster_week(task) for task in tasks]
+    try:
+        return pool.map(_cluster_week, tasks, chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def shared_membership(weeks):
+    """Put the card x cluster membership of every week on one
+    Vocabulary of card names, weighting each card by the share of the
+    week's decks playing it.
+    Returns:
+    --------
+    memberships: list of scipy.sparse csr_matrix of shape
+    (len(vocab), clusters in the week), one per week.
+
+    vocab: Vocabulary of every card in any week.
+    """
+    vocab = Vocabulary()
+    ids = [vocab.encode(week["cards"]) for week in weeks]
+    memberships = []
+    for week, week_ids in zip(weeks, ids):
+        membership = sp.coo_matrix(week["membership"])
+        share = np.asarray(week["counts"], dtype=float) / max(
+            week["decks"], 1
+        )
+        memberships.append(
+            sp.csr_matrix(
+                (
+                    share[membership.row],
+                    (week_ids[membership.row], membership.col),
+                ),
+                shape=(len(vocab), membership.shape[1]),
+            )
+        )
+    return memberships, vocab
+
+
+def cluster_similarity(before, after):
+    """Compute the overlap of the cards of every pair of clusters of two
+    weeks, as the cosine similarity of their weighted memberships.
+
+    Weighting each card by how often it is played lets the staples of
+    an archetype decide the match rather than the many fringe cards
+    that every card is put in some cluster with.
+    Parameters:
+    -----------
+    before, after: scipy.sparse card x cluster membership matrices on
+    the same Vocabulary, as returned by shared_membership.
+    Returns:
+    --------
+    similarity: float array of shape (clusters before, clusters after),
+    from 0 for no cards in common to 1.
+    """
+    norms_before = np.sqrt(
+        np.asarray(before.multiply(before).sum(axis=0)).ravel()
+    )
+    norms_after = np.sqrt(
+        np.asarray(after.multiply(after).sum(axis=0)).ravel()
+    )
+    shared = (before.T @ after).toarray()
+    return shared / np.maximum(
+        norms_before[:, None] * norms_after[None, :], 1e-12
+    )
+
+
+def align_clusters(memberships, min_similarity=MIN_SIMILARITY):
+    """Give the clusters of every week an archetype, matching each
+    week's clusters to the previous week's by optimal assignment on the
+    similarity of their cards.
+    Parameters:
+    -----------
+    memberships: list of weighted card x cluster membership matrices on
+    one Vocabulary, in week order, as returned by shared_membership.
+
+    min_similarity: float minimum similarity of a match. A cluster with
+    no match of at least this similarity starts a new archetype.
+    Returns:
+    --------
+    archetypes: list of an int array per week giving the archetype of
+    each of its clusters. Archetypes are numbered in order of first
+    appearance.
+
+    similarity: list of a float array per week giving the similarity of
+    each cluster to the cluster of the previous week it was matched to,
+    or nan if it was not matched.
+    See also:
+    ---------
+    cluster_similarity
+
+    scipy.optimize.linear_sum_assignment
+    """
+    archetypes = []
+    similarities = []
+    next_archetype = 0
+    for week, membership in enumerate(memberships):
+        clusters = membership.shape[1]
+        archetype = np.full(clusters, -1, dtype=np.int64)
+        similarity = np.full(clusters, np.nan)
+        if week:
+            matrix = cluster_similarity(
+                memberships[week - 1], membership
+            )
+            rows, cols = linear_sum_assignment(matrix, maximize=True)
+            matched = matrix[rows, cols] >= min_similarity
+            archetype[cols[matched]] = archetypes[-1][rows[matched]]
+            similarity[cols[matched]] = matrix[rows, cols][matched]
+        new = np.flatnonzero(archetype < 0)
+        archetype[new] = next_archetype + np.arange(len(new))
+        next_archetype += len(new)
+        archetypes.append(archetype)
+        similarities.append(similarity)
+    return archetypes, similarities
+
+
+def archetype_names(weeks, archetypes, top=ARCHETYPE_CARDS):
+    """Name each archetype after the most played cards of its cluster in
+    the first week it appears, leaving out cards in every cluster of
+    that week, such as basic lands.
+    Returns:
+    --------
+    names: list of strings, one per archetype.
+    """
+    names = {}
+    for week, archetype in zip(weeks, archetypes):
+        membership = week["membership"]
+        everywhere = membership.all(axis=1)
+        for cluster, number in enumerate(archetype):
+            if number in names:
+                continue
+            cards = np.flatnonzero(membership[:, cluster] & ~everywhere)
+            # Cards are in descending order of Count already.
+            names[number] = ", ".join(
+                week["cards"][card] for card in cards[:top]
+            )
+    return [names[number] for number in range(len(names))]
+
+
+def share_table(files, weeks, archetypes, names):
+    """Tabulate the share of each week's decks in each archetype.
+    Returns:
+    --------
+    table: pandas DataFrame with a row per week, with columns Week,
+    Decks and one per archetype, named "{number}: {name}", holding the
+    percentage of the week's decks in that archetype, or 0 if it did
+    not appear. A deck may be in more than one archetype.
+    """
+    shares = np.zeros((len(weeks), len(names)))
+    for row, (week, archetype) in enumerate(zip(weeks, archetypes)):
+        np.add.at(shares[row], archetype, week["breakdown"])
+        if week["decks"]:
+            shares[row] *= 100 / week["decks"]
+    table = pd.DataFrame(
+        shares,
+        columns=[
+            f"{number}: {name}" for number, name in enumerate(names)
+        ],
+    )
+    table.insert(0, "Week", [splitext(basename(f))[0] for f in files])
+    table.insert(1, "Decks", [week["decks"] for week in weeks])
+    return table
+
+
+def alignment_table(files, weeks, archetypes, similarities):
+    """Tabulate which archetype each week's clusters were given.
+    Returns:
+    --------
+    table: pandas DataFrame with a row per cluster per week, with
+    columns Week, Cluster, Archetype, Similarity (to the cluster of the
+    previous week it was matched to, empty if none) and Decks.
+    """
+    return pd.DataFrame(
+        {
+            "Week": np.repeat(
+                [splitext(basename(f))[0] for f in files],
+                [len(archetype) for archetype in archetypes],
+            ),
+            "Cluster": np.concatenate(
+                [np.arange(len(archetype)) for archetype in archetypes]
+            ),
+            "Archetype": np.concatenate(archetypes),
+            "Similarity": np.concatenate(similarities),
+            "Decks": np.concatenate(
+                [week["breakdown"] for week in weeks]
+            ),
+        }
+    )
+
+
+def main(**kwargs):
+    """Cluster each csv file, align the clusters of consecutive files
+    into archetypes, and report each archetype's share of every week.
+    See also:
+    ---------
+    cluster_weeks
+
+    align_clusters
+
+    share_table
+    """
+    if kwargs.get("output"):
+        check_format(kwargs["output"])
+    files = kwargs["files"]
+    resolution_parameter = kwargs["resolution_parameter"]
+    if resolution_parameter is None:
+        resolution_parameter = 1
+    with trace.stage("cluster_weeks") as counts:
+        weeks = cluster_weeks(
+            files,
+            kwargs["workers"],
+            no_lands=kwargs["no_lands"],
+            resolution_parameter=resolution_parameter,
+            seed=kwargs["seed"] or 0,
+            use_cache=not kwargs["no_cache"],
+        )
+        counts["weeks"] = len(weeks)
+        counts["decks"] = sum(week["decks"] for week in weeks)
+    with trace.stage("align_clusters") as counts:
+        memberships, vocab = shared_membership(weeks)
+        archetypes, similarities = align_clusters(
+            memberships,
+            (
+                kwargs["min_similarity"]
+                if kwargs["min_similarity"] is not None
+                else MIN_SIMILARITY
+            ),
+        )
+        names = archetype_names(weeks, archetypes)
+        counts["cards"] = len(vocab)
+        counts["archetypes"] = len(names)
+    shares = share_table(files, weeks, archetypes, names)
+    if kwargs.get("output"):
+        paths = write_results(
+            kwargs.get("output_dir")
+            or CONFIG.get("results_location", "output/results"),
+            kwargs["output"],
+            {
+                "metagame": shares,
+                "alignment": alignment_table(
+                    files, weeks, archetypes, similarities
+                ),
+            },
+        )
+        for path in paths:
+            logger.info(f"Wrote {path}")
+        return
+    logger.info(
+        f"{len(names)} archetypes across {len(weeks)} weeks and {len(vocab)} cards:"
+    )
+    for number, name in enumerate(names):
+        logger.info(f"    {number}: {name}")
+    with pd.option_context(
+        "display.max_columns", None, "display.width", None
+    ):
+        logger.info(
+            shares.set_index("Week")
+            .drop(columns="Decks")
+            .rename(columns=lambda column: column.split(":")[0])
+            .round(1)
+        )
@@ -0,0 +1,191 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import json
+
+import numpy as np
+
+from .functions import create_set
+
+MODEL_VERSION = 1
+
+
+def select_clusters(hits, deck_percentage):
+    """Pick the dominant clusters of each deck from its hits.
+
+    Clusters are taken in descending order of hits, ties going to the
+    lowest cluster, until they account for deck_percentage of the
+    deck's hits. A deck with no hits is put in cluster 0, as it ties
+    in every cluster.
+    Parameters:
+    -----------
+    hits: float array of shape (decks, clusters) of the number of each
+    deck's cards in each cluster.
+
+    deck_percentage: float from 0 to 1.
+    Returns:
+    --------
+    selected: bool array of the same shape as hits, True for each
+    cluster a deck is in.
+    """
+    hits = np.array(hits, dtype=float)
+    totals = hits.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        hits /= totals
+    hits[totals[:, 0] <= 0] = 0
+
+    order = np.argsort(-hits, axis=1, kind="stable")
+    cumulative = np.cumsum(
+        np.take_along_axis(hits, order, axis=1), axis=1
+    )
+    taken = np.argmax(cumulative >= deck_percentage, axis=1)
+    selected = np.zeros(hits.shape, dtype=bool)
+    np.put_along_axis(
+        selected,
+        order,
+        np.arange(hits.shape[1]) <= taken[:, None],
+        axis=1,
+    )
+    return selected
+
+
+class ArchetypeModel(object):
+    """The clusters found by a run of analysis, kept so that new decks
+    can be classified without building the graph again.
+    Parameters:
+    -----------
+    cards: list of card names.
+
+    membership: bool array of shape (len(cards), clusters), True
+    wherever a card is in a cluster.
+
+    names: None or list of the name of each cluster, defaulting to its
+    number.
+
+    deck_percentage: float share of a deck's hits its clusters must
+    account for, as CONFIG["deck_percentage"].
+
+    no_lands: bool whether lands were excluded when the clusters were
+    found, and so should be ignored in new decks.
+    """
+
+    def __init__(
+        self,
+        cards,
+        membership,
+        names=None,
+        deck_percentage=0.5,
+        no_lands=False,
+    ):
+        """Instantiate the class."""
+        self.cards = list(cards)
+        self.ids = {card: i for i, card in enumerate(self.cards)}
+        self.membership = np.asarray(membership, dtype=bool)
+        self.clusters = self.membership.shape[1]
+        if names is None:
+            names = range(self.clusters)
+        self.names = [str(name) for name in names]
+        self.deck_percentage = deck_percentage
+        self.no_lands = no_lands
+
+    def __len__(self):
+        """Return the number of clusters."""
+        return self.clusters
+
+    def classify(self, cards):
+        """Find the dominant clusters of a deck, in the same way as
+        classify_decklist. Cards the model has not seen are ignored.
+        Parameters:
+        -----------
+        cards: iterable of card names in the deck.
+        Returns:
+        --------
+        clusters: sorted list of the deck's clusters.
+        See also:
+        ---------
+        classify_decklist
+        """
+        ids = [
+            self.ids[card] for card in set(cards) if card in self.ids
+        ]
+        hits = self.membership[ids].sum(axis=0)[None, :]
+        selected = select_clusters(hits, self.deck_percentage)
+        return np.flatnonzero(selected[0]).tolist()
+
+    def classify_text(self, text):
+        """Parse a decklist and find its dominant clusters.
+        Returns:
+        --------
+        result: dict of clusters (sorted list of cluster numbers), names
+        (their names) and unknown (the number of cards the model has
+        not seen).
+        See also:
+        ---------
+        create_set
+        """
+        cards = create_set(text, self.no_lands)
+        clusters = self.classify(cards)
+        return {
+            "clusters": clusters,
+            "names": [self.names[cluster] for cluster in clusters],
+            "unknown": sum(card not in self.ids for card in cards),
+        }
+
+    def save(self, path):
+        """Save the model as JSON to path."""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(
+                {
+                    "version": MODEL_VERSION,
+                    "cards": self.cards,
+                    "clusters": self.clusters,
+                    "membership": [
+                        np.flatnonzero(row).tolist()
+                        for row in self.membership
+                    ],
+                    "names": self.names,
+                    "deck_percentage": self.deck_percentage,
+                    "no_lands": self.no_lands,
+                },
+                f,
+            )
+
+
+def load_model(path):
+    """Load a model saved by ArchetypeModel.save.
+    Raises:
+    -------
+    ValueError: the file was saved by an incompatible version.
+    """
+    with open(path) as f:
+        data = json.load(f)
+    if data.get("version") != MODEL_VERSION:
+        raise ValueError(
+            f"{path} is a version {data.get('version')} model, expected version {MODEL_VERSION}. Run analysis again to rebuild it."
+        )
+    membership = np.zeros(
+        (len(data["cards"]), data["clusters"]), dtype=bool
+    )
+    for card, clusters in enumerate(data["membership"]):
+        membership[card, clusters] = True
+    return ArchetypeModel(
+        data["cards"],
+        membership,
+        data["names"],
+        data["deck_percentage"],
+        data["no_lands"],
+    )
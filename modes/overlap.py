@@ -12,43 +12,80 @@
 #    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
 #    GNU General Public License for more details.
 
+import time
+import logging
 from os import listdir, getcwd
-from os.path import isfile, join
+from os.path import basename, isfile, join
+
+import numpy as np
 
 from config.CONFIG import CONFIG
 from config.lands import BASICS
+from .card_index import CardIndex, FileIndex
+from .deckstore import read_store
 from .functions import create_set_from_file, read_raw_data
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
 
 decklist_directory = getcwd() + CONFIG["decklist_directory"]
 
 
-def check_no_duplicates(*args):
-    """Take any number of sets and return the duplicates, by pair, in
-    all of the sets.
+def check_no_duplicates(*args, exclude=None):
+    """Take any number of decks and return the duplicates, by pair, in
+    all of the decks.
 
-    *args is any number of sets containing any values. The union of each
-    pair of sets is generated and if nonempty appended to a dictionary.
-    These are numbered by the order the sets were provided in and then
-    returned.
+    *args is any number of sorted arrays of unique card ids. The
+    intersection of each pair of arrays is generated and if nonempty
+    added to a dictionary. These are numbered by the order the decks
+    were provided in and then returned.
     Parameters:
     -----------
-    *args: sets to check for duplicates.
+    *args: arrays of card ids to check for duplicates.
+
+    exclude: None or array of card ids that may be shared freely, such
+    as the ids of BASICS.
     Returns:
     --------
     duplicates: dict - keys are string of the form f"{index1}, {index2}"
-    and values are the union of those sets, if nonempty. Empty unions
-    are omitted.
+    and values are arrays of the card ids in both decks, if nonempty.
+    Empty intersections are omitted.
     """
-    duplicates = {
-        f"{index1}, {index2}": (args[index1] - BASICS)
-        & (args[index2] - BASICS)
-        for index1 in range(len(args) - 1)
-        for index2 in range(index1 + 1, len(args))
-        if (args[index1] - BASICS) & (args[index2] - BASICS)
-    }
+    if exclude is not None:
+        args = [
+            np.setdiff1d(deck, exclude, assume_unique=True)
+            for deck in args
+        ]
+    duplicates = {}
+    for index1 in range(len(args) - 1):
+        for index2 in range(index1 + 1, len(args)):
+            shared = np.intersect1d(
+                args[index1], args[index2], assume_unique=True
+            )
+            if len(shared):
+                duplicates[f"{index1}, {index2}"] = shared
     return duplicates
 
 
+def decode_duplicates(vocab, duplicates):
+    """Convert the card ids found by check_no_duplicates back into sets
+    of card names.
+    Parameters:
+    -----------
+    vocab: Vocabulary the card ids were taken from.
+
+    duplicates: dict as returned by check_no_duplicates.
+    Returns:
+    --------
+    duplicates: dict with the same keys, whose values are sets of card
+    names.
+    """
+    return {
+        key: set(vocab.decode(value))
+        for key, value in duplicates.items()
+    }
+
+
 def calculate_file_overlaps():
     """Open all the files in a given directory and then check all of
     them for duplicate cards with each other.
@@ -61,51 +98,183 @@ def calculate_file_overlaps():
     ---------
     check_no_duplicates
     """
-    decklists = [
-        join(decklist_directory, _file)
-        for _file in listdir(decklist_directory)
-        if isfile(join(decklist_directory, _file))
+    decklists = list_decklists()
+    logger.info(f"Found decklists: \n{decklists}")
+    vocab = Vocabulary()
+    id_decklists = [
+        vocab.encode(create_set_from_file(decklist))
+        for decklist in decklists
     ]
-    print(f"Found decklists: \n{decklists}")
-    set_decklists = [
-        create_set_from_file(decklist) for decklist in decklists
+    duplicates = check_no_duplicates(
+        *id_decklists, exclude=vocab.lookup(BASICS)
+    )
+    if duplicates:
+        logger.warning(decode_duplicates(vocab, duplicates))
+    else:
+        logger.info("No cards are shared between decklists.")
+
+
+def list_decklists(directory=None):
+    """Return the path of every file in directory, which defaults to
+    decklist_directory.
+    """
+    if directory is None:
+        directory = decklist_directory
+    return [
+        join(directory, _file)
+        for _file in listdir(directory)
+        if isfile(join(directory, _file))
     ]
-    print(check_no_duplicates(*set_decklists))
 
 
-def calculate_all_overlaps(df):
+def log_file_overlaps(index, path):
+    """Log a warning for the cards a decklist file shares with each
+    other file in a FileIndex.
+    """
+    for other, shared in sorted(index.overlaps_of(path).items()):
+        logger.warning(
+            f"{basename(path)} - {basename(other)}: {shared}"
+        )
+
+
+def watch_file_overlaps(interval=2.0, directory=None, polls=None):
+    """Keep checking the files in a directory for duplicate cards,
+    re-checking a file only when it changes.
+
+    The directory is polled every interval seconds. A file whose size
+    or modification time changed is hashed, and only re-parsed if its
+    contents changed; its overlaps are then recomputed from the postings
+    of its own cards, so one edit costs one parse however many files
+    there are. A file that cannot be read or parsed is logged and
+    tried again on the next poll.
+    Parameters:
+    -----------
+    interval: float seconds to wait between polls.
+
+    directory: None or string or filepath of the directory to watch,
+    defaulting to decklist_directory.
+
+    polls: None or int number of polls to make before returning. If
+    None, poll until interrupted.
+    See also:
+    ---------
+    FileIndex
+
+    calculate_file_overlaps
+    """
+    index = FileIndex(create_set_from_file, exclude=BASICS)
+    poll = 0
+    try:
+        while polls is None or poll < polls:
+            paths = list_decklists(directory)
+            for path in set(index.files) - set(paths):
+                index.remove(path)
+                logger.info(f"Removed {basename(path)}")
+            for path in sorted(paths):
+                try:
+                    changed = index.update(path)
+                except OSError:
+                    # Deleted or still being written; retry next poll.
+                    continue
+                except (UnicodeDecodeError, ValueError) as e:
+                    # Partly written or malformed; retry next poll.
+                    logger.warning(
+                        f"Could not read {basename(path)}: {e}"
+                    )
+                    continue
+                if changed:
+                    logger.info(f"Checked {basename(path)}")
+                    log_file_overlaps(index, path)
+            poll += 1
+            if polls is None or poll < polls:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    return index
+
+
+def calculate_all_overlaps(df, vocab, index=None):
     """Determine which teams have overlap.
 
     Given a dataframe containg all decklists and team names,
-    determine which teams have overlap in their decklists.
+    determine which teams have overlap in their decklists, using an
+    inverted index of the cards rather than comparing every pair of
+    decks of every team.
     Parameters:
     -----------
     df: pandas DataFrame containing the columns "Team Name",
     "Deck 1 List", "Deck 2 List", "Deck 3 List" where Team Name contains
-    the name of the team and Deck [123] List contains sets with the
-    decklists.
+    the name of the team and Deck [123] List contains arrays with the
+    card ids of each decklist.
+
+    vocab: Vocabulary the card ids in df were taken from.
+
+    index: None or CardIndex of df, built if None.
     See also:
     ---------
     read_raw_data
 
-    check_no_duplicates
+    CardIndex.shared_cards
     """
-    for row in df.iterrows():
-        pass
-        decks = row[1][
-            ["Deck 1 List", "Deck 2 List", "Deck 3 List"]
-        ].tolist()
-        overlap = check_no_duplicates(*decks)
-        if overlap:
-            print("{} - {}".format(row[1]["Team Name"], overlap))
+    if index is None:
+        index = CardIndex(df, vocab)
+    overlaps = index.shared_cards(exclude=vocab.lookup(BASICS))
+    for row, overlap in overlaps.items():
+        logger.warning(
+            "{} - {}".format(
+                index.teams[row], decode_duplicates(vocab, overlap)
+            )
+        )
 
 
-def main(**kwargs):
-    """Run the functions provided in order to determine overlaps.
+def query_cards(index, cards=(), more_than=None):
+    """Log the teams and decks playing each of cards and, if
+    more_than is given, every card played in more than that many decks.
+    Parameters:
+    -----------
+    index: CardIndex to query.
+
+    cards: iterable of card names.
+
+    more_than: None or int number of decks.
     """
-    if kwargs["all"]:
-        calculate_all_overlaps(
-            read_raw_data(no_lands=False, names=True)
+    for card in cards:
+        decks = index.decks_with(card)
+        logger.info(f"{card} - {len(decks)} decks")
+        for team, column in decks:
+            logger.info(f"    {team} - {column}")
+    if more_than is not None:
+        played = index.cards_in_more_than(more_than)
+        logger.info(
+            f"{len(played)} cards in more than {more_than} decks"
         )
+        for card, count in played:
+            logger.info(f"    {count:4d} {card}")
+
+
+def main(**kwargs):
+    """Run the functions provided in order to determine overlaps."""
+    query = kwargs["card"] or kwargs["more_than"] is not None
+    if kwargs["all"] or query:
+        if kwargs["store"] is None and kwargs["weeks"] is None:
+            df, vocab = read_raw_data(
+                no_lands=False,
+                names=True,
+                workers=kwargs["workers"],
+                use_cache=not kwargs["no_cache"],
+            )
+        else:
+            df, vocab = read_store(
+                False, True, kwargs["store"], kwargs["weeks"]
+            )
+        index = CardIndex(df, vocab)
+        if kwargs["all"]:
+            calculate_all_overlaps(df, vocab, index)
+        if query:
+            query_cards(
+                index, kwargs["card"] or (), kwargs["more_than"]
+            )
+    elif kwargs["watch"]:
+        watch_file_overlaps(kwargs["interval"])
     else:
         calculate_file_overlaps()
@@ -0,0 +1,250 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import importlib
+from os.path import join
+
+# numpy and pandas are imported where they are used, so main.py can
+# read RESULT_FORMATS without loading them.
+RESULT_FORMATS = ("json", "csv", "parquet")
+GRAPH_FORMATS = ("graphml", "graphml.gz", "npz", "parquet")
+PARQUET_ENGINES = ("pyarrow", "fastparquet")
+TOP_CARDS = 5
+SCORES = {
+    "Count": "Count",
+    "Authority": "Authority Score",
+    "Hubs": "Hub Score",
+}
+
+
+def check_format(output_format):
+    """Check results can be written in output_format before any work
+    is done.
+    Raises:
+    -------
+    ValueError: output_format is not one of RESULT_FORMATS, or is
+    parquet and neither pyarrow nor fastparquet is installed.
+    """
+    if output_format not in RESULT_FORMATS:
+        raise ValueError(
+            f"Unknown output format {output_format}, expected one of {', '.join(RESULT_FORMATS)}."
+        )
+    if output_format == "parquet":
+        for engine in PARQUET_ENGINES:
+            try:
+                importlib.import_module(engine)
+                return
+            except ImportError:
+                pass
+        raise ValueError(
+            f"Writing parquet needs one of {', '.join(PARQUET_ENGINES)} installed."
+        )
+
+
+def deck_table(df, decks):
+    """Tabulate the classification of every deck.
+    Parameters:
+    -----------
+    df: pandas DataFrame of decklists as returned by read_raw_data,
+    with or without its Team Name column.
+
+    decks: list of the set of clusters of each deck, in the order of
+    df[deck_columns].to_numpy().flatten(), as returned by
+    classify_decks.
+    Returns:
+    --------
+    table: pandas DataFrame with one row per deck of Row (index in df),
+    Deck (column in df), Team Name if df has one, and Clusters (sorted
+    list of the deck's clusters).
+    """
+    import numpy as np
+    import pandas as pd
+
+    deck_cols = [col for col in df.columns if col != "Team Name"]
+    table = pd.DataFrame(
+        {
+            "Row": np.repeat(df.index.to_numpy(), len(deck_cols)),
+            "Deck": np.tile(deck_cols, len(df)),
+        }
+    )
+    if "Team Name" in df.columns:
+        table["Team Name"] = np.repeat(
+            df["Team Name"].to_numpy(), len(deck_cols)
+        )
+    table["Clusters"] = [sorted(clusters) for clusters in decks]
+    return table
+
+
+def breakdown_table(breakdown, names=None, stability=None):
+    """Tabulate the number and percentage of decks in each cluster.
+    Parameters:
+    -----------
+    breakdown: list of the number of decks in each cluster, as returned
+    by classify_decks.
+
+    names: None or list of the name of each cluster.
+
+    stability: None or array of the stability of each cluster, as
+    returned by create_ensemble_partition.
+    Returns:
+    --------
+    table: pandas DataFrame with columns Cluster, Name, Decks and
+    Percentage, and Stability if stability is given.
+    """
+    import numpy as np
+    import pandas as pd
+
+    decks = np.asarray(breakdown)
+    total = decks.sum()
+    table = pd.DataFrame(
+        {
+            "Cluster": np.arange(len(decks)),
+            "Name": [
+                str(name)
+                for name in (
+                    names or [str(i) for i in range(len(decks))]
+                )
+            ],
+            "Decks": decks,
+            "Percentage": 100 * decks / total if total else 0.0,
+        }
+    )
+    if stability is not None:
+        table["Stability"] = stability
+    return table
+
+
+def card_table(card_data_df):
+    """Tabulate every card with its clusters and scores.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame with Card, Count, Cluster, Hub Score
+    and Authority Score columns, and optionally Stability.
+    Returns:
+    --------
+    table: pandas DataFrame with one row per card of Card, Count,
+    Clusters (sorted list of the card's clusters), Hub Score, Authority
+    Score and Stability if card_data_df has it.
+    """
+    columns = ["Card", "Count", "Hub Score", "Authority Score"]
+    if "Stability" in card_data_df.columns:
+        columns.append("Stability")
+    table = card_data_df[columns].reset_index(drop=True)
+    table.insert(
+        2,
+        "Clusters",
+        [sorted(clusters) for clusters in card_data_df["Cluster"]],
+    )
+    return table
+
+
+def top_cards_table(card_data_df, top=TOP_CARDS):
+    """Find the top cards of every cluster by count, authority score
+    and hub score at once.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame with Card, Count, Cluster, Hub Score
+    and Authority Score columns.
+
+    top: int number of cards to take from each cluster per score.
+    Returns:
+    --------
+    table: pandas DataFrame with columns Cluster, By (Count, Authority
+    or Hubs), Rank (from 0), Card and Value, sorted by Cluster.
+    """
+    import pandas as pd
+
+    exploded = card_data_df.explode("Cluster").dropna(
+        subset=["Cluster"]
+    )
+    exploded["Cluster"] = exploded["Cluster"].astype(int)
+    tables = []
+    for by, column in SCORES.items():
+        ranked = exploded.sort_values(
+            by=["Cluster", column],
+            ascending=[True, False],
+            kind="mergesort",
+        )
+        ranked = ranked.groupby("Cluster", sort=False).head(top)
+        tables.append(
+            pd.DataFrame(
+                {
+                    "Cluster": ranked["Cluster"].to_numpy(),
+                    "By": by,
+                    "Rank": ranked.groupby("Cluster")
+                    .cumcount()
+                    .to_numpy(),
+                    "Card": ranked["Card"].to_numpy(),
+                    "Value": ranked[column].to_numpy(dtype=float),
+                }
+            )
+        )
+    return (
+        pd.concat(tables, ignore_index=True)
+        .sort_values(by="Cluster", kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+
+def write_table(table, filepath, output_format):
+    """Write a table as json (a list of records), csv or parquet. In
+    csv, list columns are written as ;-separated strings.
+    """
+    if output_format == "json":
+        table.to_json(filepath, orient="records", indent=2)
+    elif output_format == "csv":
+        table = table.copy()
+        for column in table.columns:
+            if table[column].map(lambda x: isinstance(x, list)).any():
+                table[column] = table[column].map(
+                    lambda x: ";".join(str(item) for item in x)
+                )
+        table.to_csv(filepath, index=False)
+    else:
+        table.to_parquet(filepath, index=False)
+
+
+def graph_paths(location, graph_format):
+    """Return the files a graph is written to in graph_format, named
+    after location (such as CONFIG["graphml_location"]) with its
+    extension replaced: one file, or a nodes and an edges file for
+    parquet.
+    """
+    stem = location
+    for extension in (".gz", ".graphml"):
+        if stem.endswith(extension):
+            stem = stem[: -len(extension)]
+    if graph_format == "parquet":
+        return [f"{stem}-nodes.parquet", f"{stem}-edges.parquet"]
+    return [f"{stem}.{graph_format}"]
+
+
+def write_results(directory, output_format, tables):
+    """Write each of a dict of named tables to directory as
+    {name}.{output_format}.
+    Returns:
+    --------
+    paths: list of the files written.
+    See also:
+    ---------
+    write_table
+    """
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for name, table in tables.items():
+        path = join(directory, f"{name}.{output_format}")
+        write_table(table, path, output_format)
+        paths.append(path)
+    return paths
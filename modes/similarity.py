@@ -0,0 +1,437 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import logging
+from os.path import basename
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+
+from config.CONFIG import CONFIG
+from config.lands import BASICS
+from . import trace
+from .cooccurrence import incidence_matrix
+from .functions import deck_columns, read_raw_data
+from .results import check_format, write_results
+from .vocabulary import Vocabulary
+
+logger = logging.getLogger(__name__)
+
+THRESHOLD = 0.8
+NUM_PERM = 128
+# A Mersenne prime above any card id, small enough that a * x + b fits
+# in an int64 for a, b, x below it.
+PRIME = (1 << 31) - 1
+# How much more missing a similar pair counts than checking a
+# dissimilar one when lsh_parameters picks the bands.
+MISSED_WEIGHT = 0.9
+SHOW_GROUPS = 10
+SHOW_DECKS = 5
+# numpy 2.0 renamed trapz to trapezoid and deprecated the old name.
+trapezoid = getattr(np, "trapezoid", None) or np.trapz
+
+
+def load_decks(files, no_lands, workers=None, use_cache=True):
+    """Read the decklists of one or more csv files, with card ids from
+    one Vocabulary.
+    Parameters:
+    -----------
+    files: list of strings or filepaths of csv files.
+
+    no_lands: bool whether to exclude lands.
+
+    workers: None or int number of processes to parse decklists with.
+
+    use_cache: bool whether to use the parse cache.
+    Returns:
+    --------
+    info: pandas DataFrame with one row per deck of File, Row, Team Name
+    and Deck (column name).
+
+    decks: list of sorted arrays of the card ids of each deck, in the
+    order of info, without BASICS.
+
+    vocab: Vocabulary the card ids are taken from.
+    See also:
+    ---------
+    read_raw_data
+    """
+    vocab = Vocabulary()
+    tables = []
+    decks = []
+    for data_loc in files:
+        df, file_vocab = read_raw_data(
+            no_lands,
+            names=True,
+            data_loc=data_loc,
+            workers=workers,
+            use_cache=use_cache,
+        )
+        vocab_map = np.array(
+            [vocab.intern(name) for name in file_vocab.names],
+            dtype=np.int64,
+        )
+        tables.append(
+            pd.DataFrame(
+                {
+                    "File": basename(data_loc),
+                    "Row": np.repeat(
+                        df.index.to_numpy(), len(deck_columns)
+                    ),
+                    "Team Name": np.repeat(
+                        df["Team Name"].to_numpy(), len(deck_columns)
+                    ),
+                    "Deck": np.tile(deck_columns, len(df)),
+                }
+            )
+        )
+        decks += [
+            np.sort(vocab_map[deck])
+            for deck in df[deck_columns].to_numpy().ravel()
+        ]
+    basics = vocab.lookup(BASICS)
+    decks = [deck[~np.isin(deck, basics)] for deck in decks]
+    if tables:
+        info = pd.concat(tables, ignore_index=True)
+    else:
+        info = pd.DataFrame(
+            columns=["File", "Row", "Team Name", "Deck"]
+        )
+    return info, decks, vocab
+
+
+def minhash_signatures(decks, num_perm=NUM_PERM, seed=0):
+    """Build the MinHash signature of each deck's set of cards.
+
+    Each of num_perm random hash functions (a * card + b) mod PRIME is
+    applied to every card at once and reduced to its minimum per deck,
+    so the cost is num_perm passes over the cards of all decks. The
+    share of positions two signatures agree in estimates the Jaccard
+    similarity of the decks.
+    Parameters:
+    -----------
+    decks: list of arrays of card ids, each below PRIME.
+
+    num_perm: int number of hash functions.
+
+    seed: int seed of the hash functions.
+    Returns:
+    --------
+    signatures: int64 array of shape (len(decks), num_perm). Empty decks
+    have PRIME in every position.
+    """
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, PRIME, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, PRIME, size=num_perm, dtype=np.int64)
+    lengths = np.fromiter(
+        (len(deck) for deck in decks), dtype=np.int64, count=len(decks)
+    )
+    signatures = np.full((len(decks), num_perm), PRIME, dtype=np.int64)
+    filled = lengths > 0
+    if not filled.any():
+        return signatures
+    cards = np.concatenate(decks).astype(np.int64)
+    # reduceat needs each start to be inside cards, so it only runs over
+    # the nonempty decks.
+    starts = (np.cumsum(lengths) - lengths)[filled]
+    for i in range(num_perm):
+        hashes = (a[i] * cards + b[i]) % PRIME
+        signatures[filled, i] = np.minimum.reduceat(hashes, starts)
+    return signatures
+
+
+def lsh_parameters(num_perm=NUM_PERM, threshold=THRESHOLD):
+    """Choose how to split signatures into bands for LSH.
+
+    Two decks of Jaccard similarity s share at least one band, and so
+    become a candidate pair, with probability
+    1 - (1 - s ** rows) ** bands. The split is chosen to minimise the
+    expected share of pairs wrongly missed above threshold, weighted by
+    MISSED_WEIGHT, plus those wrongly kept below it. As candidates are
+    checked exactly, keeping a dissimilar pair only costs time, so
+    missing a similar pair is weighted more heavily.
+    Returns:
+    --------
+    bands: int number of bands.
+
+    rows: int number of signature positions in each band.
+    """
+    s = np.linspace(0, 1, 201)
+    best = None
+    for rows in range(1, num_perm + 1):
+        bands = num_perm // rows
+        candidate = 1 - (1 - s**rows) ** bands
+        kept = trapezoid(np.where(s < threshold, candidate, 0), s)
+        missed = trapezoid(
+            np.where(s >= threshold, 1 - candidate, 0), s
+        )
+        cost = MISSED_WEIGHT * missed + (1 - MISSED_WEIGHT) * kept
+        if best is None or cost < best[0]:
+            best = (cost, bands, rows)
+    return best[1], best[2]
+
+
+def candidate_pairs(signatures, bands, rows, skip=None):
+    """Find the pairs of decks whose signatures agree in every position
+    of at least one band.
+    Parameters:
+    -----------
+    signatures: array as returned by minhash_signatures.
+
+    bands: int number of bands.
+
+    rows: int number of positions per band.
+
+    skip: None or bool array of decks to leave out, such as empty ones.
+    Returns:
+    --------
+    pairs: int64 array of shape (n_pairs, 2) of deck indices, each pair
+    once with the lower index first, sorted.
+    """
+    decks = np.arange(len(signatures))
+    if skip is not None:
+        decks = decks[~skip]
+    pairs = []
+    for band in range(bands):
+        keys = signatures[decks, band * rows : (band + 1) * rows]
+        _, bucket = np.unique(keys, axis=0, return_inverse=True)
+        bucket = bucket.ravel()
+        order = np.argsort(bucket, kind="stable")
+        members, bucket = decks[order], bucket[order]
+        # A bucket of m decks gives m - 1 offsets to pair at, so this
+        # loops as many times as the largest bucket, not the decks.
+        offset = 1
+        while offset < len(bucket):
+            same = np.flatnonzero(bucket[offset:] == bucket[:-offset])
+            if not len(same):
+                break
+            pairs.append(
+                np.column_stack((members[same], members[same + offset]))
+            )
+            offset += 1
+    if not pairs:
+        return np.zeros((0, 2), dtype=np.int64)
+    pairs = np.sort(np.concatenate(pairs), axis=1)
+    return np.unique(pairs, axis=0)
+
+
+def jaccard(incidence, pairs):
+    """Compute the exact Jaccard similarity of pairs of decks.
+    Parameters:
+    -----------
+    incidence: scipy.sparse csr_matrix of decks by cards.
+
+    pairs: int array of shape (n_pairs, 2) of deck indices.
+    Returns:
+    --------
+    similarity: float array of length n_pairs.
+    """
+    if not len(pairs):
+        return np.zeros(0)
+    sizes = np.diff(incidence.indptr)
+    shared = np.asarray(
+        incidence[pairs[:, 0]]
+        .multiply(incidence[pairs[:, 1]])
+        .sum(axis=1)
+    ).ravel()
+    union = sizes[pairs[:, 0]] + sizes[pairs[:, 1]] - shared
+    return shared / np.maximum(union, 1)
+
+
+def similar_decks(
+    decks, n_cards, threshold=THRESHOLD, num_perm=NUM_PERM, seed=0
+):
+    """Find the pairs of decks with a Jaccard similarity of at least
+    threshold, and group decks linked by such pairs.
+
+    Candidates come from MinHash signatures split into LSH bands and
+    are then checked exactly, so no reported pair is a false positive,
+    while pairs just above threshold may occasionally be missed. Apart
+    from the pairs themselves, which grow with the square of the size
+    of each group, the cost is close to linear in the number of decks.
+    Parameters:
+    -----------
+    decks: list of arrays of card ids.
+
+    n_cards: int number of card ids.
+
+    threshold: float from 0 to 1, the minimum Jaccard similarity.
+
+    num_perm: int length of the MinHash signatures. Longer signatures
+    miss fewer pairs but take longer to build.
+
+    seed: int seed of the hash functions.
+    Returns:
+    --------
+    pairs: int64 array of shape (n_pairs, 2) of deck indices.
+
+    similarity: float array of the Jaccard similarity of each pair.
+
+    groups: int array of the group of each deck, numbered from 0 by
+    descending size, or -1 for decks similar to no other.
+
+    candidates: int number of candidate pairs checked.
+    See also:
+    ---------
+    minhash_signatures
+
+    candidate_pairs
+    """
+    with trace.stage("minhash") as counts:
+        signatures = minhash_signatures(decks, num_perm, seed)
+        counts["decks"] = len(decks)
+    with trace.stage("lsh") as counts:
+        bands, rows = lsh_parameters(num_perm, threshold)
+        empty = np.array([len(deck) == 0 for deck in decks], dtype=bool)
+        pairs = candidate_pairs(signatures, bands, rows, skip=empty)
+        counts["bands"], counts["rows"] = bands, rows
+        counts["candidates"] = len(pairs)
+    with trace.stage("verify") as counts:
+        incidence = incidence_matrix(decks, n_cards)
+        similarity = jaccard(incidence, pairs)
+        candidates = len(pairs)
+        keep = similarity >= threshold
+        pairs, similarity = pairs[keep], similarity[keep]
+        counts["pairs"] = len(pairs)
+
+    graph = sp.csr_matrix(
+        (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+        shape=(len(decks), len(decks)),
+    )
+    _, labels = connected_components(graph, directed=False)
+    sizes = np.bincount(labels)
+    # Number the groups of more than one deck by descending size, then
+    # by their first deck.
+    first = np.full(len(sizes), len(decks))
+    np.minimum.at(first, labels, np.arange(len(decks)))
+    grouped = np.flatnonzero(sizes > 1)
+    grouped = grouped[np.lexsort((first[grouped], -sizes[grouped]))]
+    numbering = np.full(len(sizes), -1)
+    numbering[grouped] = np.arange(len(grouped))
+    return pairs, similarity, numbering[labels], candidates
+
+
+def pair_table(info, pairs, similarity):
+    """Tabulate similar pairs of decks.
+    Returns:
+    --------
+    table: pandas DataFrame with columns A and B (rows of info), Jaccard,
+    and the File, Team Name and Deck of each, sorted by descending
+    Jaccard.
+    """
+    table = pd.DataFrame(
+        {"A": pairs[:, 0], "B": pairs[:, 1], "Jaccard": similarity}
+    )
+    for side in ("A", "B"):
+        for column in ("File", "Team Name", "Deck"):
+            table[f"{column} {side}"] = info[column].to_numpy()[
+                table[side].to_numpy()
+            ]
+    return table.sort_values(
+        by=["Jaccard", "A", "B"],
+        ascending=[False, True, True],
+        kind="mergesort",
+    ).reset_index(drop=True)
+
+
+def group_table(info, groups):
+    """Tabulate the decks in a similarity group.
+    Returns:
+    --------
+    table: pandas DataFrame of the rows of info in a group, with a Deck
+    Id (row of info) and Group column, sorted by Group.
+    """
+    table = info.assign(**{"Deck Id": np.arange(len(info))})
+    table["Group"] = groups
+    return (
+        table[table["Group"] >= 0]
+        .sort_values(by=["Group", "Deck Id"], kind="mergesort")
+        .reset_index(drop=True)
+    )
+
+
+def log_groups(info, groups, pairs):
+    """Log the number of similar pairs and the largest groups."""
+    n_groups = groups.max(initial=-1) + 1
+    logger.info(
+        f"{len(pairs)} similar pairs of decks in {n_groups} groups."
+    )
+    table = group_table(info, groups)
+    for group, members in table.groupby("Group", sort=True):
+        if group >= SHOW_GROUPS:
+            logger.info(
+                f"... and {n_groups - SHOW_GROUPS} more groups; use --output to save them all."
+            )
+            break
+        logger.info(f"Group {group} - {len(members)} decks")
+        for team, deck, data_loc in (
+            members[["Team Name", "Deck", "File"]]
+            .head(SHOW_DECKS)
+            .itertuples(index=False)
+        ):
+            logger.info(f"    {team} - {deck} ({data_loc})")
+        if len(members) > SHOW_DECKS:
+            logger.info(f"    ... {len(members) - SHOW_DECKS} more")
+
+
+def main(**kwargs):
+    """Find near-duplicate decks in the given csv files, or
+    aggregate_data_loc, and report them.
+    See also:
+    ---------
+    load_decks
+
+    similar_decks
+    """
+    if kwargs.get("output"):
+        check_format(kwargs["output"])
+    files = kwargs["files"] or [CONFIG["aggregate_data_loc"]]
+    with trace.stage("read_raw_data") as counts:
+        info, decks, vocab = load_decks(
+            files,
+            kwargs["no_lands"],
+            workers=kwargs["workers"],
+            use_cache=not kwargs["no_cache"],
+        )
+        counts["decks"] = len(decks)
+        counts["cards"] = len(vocab)
+    threshold = kwargs["threshold"]
+    if threshold is None:
+        threshold = THRESHOLD
+    pairs, similarity, groups, candidates = similar_decks(
+        decks,
+        len(vocab),
+        threshold,
+        kwargs["num_perm"] or NUM_PERM,
+        kwargs["seed"] or 0,
+    )
+    logger.info(
+        f"Checked {candidates} candidate pairs of {len(decks)} decks for a Jaccard similarity of at least {threshold}."
+    )
+    if kwargs.get("output"):
+        paths = write_results(
+            kwargs.get("output_dir")
+            or CONFIG.get("results_location", "output/results"),
+            kwargs["output"],
+            {
+                "similar_pairs": pair_table(info, pairs, similarity),
+                "similar_groups": group_table(info, groups),
+            },
+        )
+        for path in paths:
+            logger.info(f"Wrote {path}")
+        return
+    log_groups(info, groups, pairs)
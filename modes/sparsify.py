@@ -0,0 +1,267 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import numpy as np
+import scipy.sparse as sp
+
+from .cooccurrence import graph_from_cooccurrence, weight_matrix
+
+# The order sparsify applies the modes in: cheap per-edge filters
+# first, so top_k only ranks the edges that survive them.
+MODES = ("min_support", "min_cooccurrence", "min_pmi", "top_k")
+
+
+def _keep(cooccurrence, mask):
+    """Return the entries of a co-occurrence matrix where mask, an
+    array aligned with its stored entries in coo order, is True.
+    """
+    coo = cooccurrence.tocoo()
+    kept = sp.csr_matrix(
+        (coo.data[mask], (coo.row[mask], coo.col[mask])),
+        shape=cooccurrence.shape,
+    )
+    kept.sort_indices()
+    return kept
+
+
+def min_cooccurrence(cooccurrence, n):
+    """Keep only the edges between cards sharing at least n decks."""
+    coo = cooccurrence.tocoo()
+    return _keep(cooccurrence, coo.data >= n)
+
+
+def min_support(cooccurrence, counts, n):
+    """Remove every edge of the cards in fewer than n decks, leaving
+    those cards as isolated vertices.
+    Parameters:
+    -----------
+    cooccurrence: scipy.sparse matrix as created by
+    cooccurrence_matrix.
+
+    counts: array of the number of decks each card is in, in matrix
+    order, such as the Count column of card_data_df.
+
+    n: int minimum number of decks.
+    """
+    coo = cooccurrence.tocoo()
+    supported = np.asarray(counts) >= n
+    return _keep(cooccurrence, supported[coo.row] & supported[coo.col])
+
+
+def min_pmi(cooccurrence, counts, n_decks, threshold):
+    """Keep only the edges whose pointwise mutual information,
+    log(shared * n_decks / (count_i * count_j)), is at least threshold.
+
+    A threshold of 0 keeps the pairs seen together at least as often as
+    they would be if decks picked cards independently (a lift of 1),
+    dropping staples that are in many decks alongside everything.
+    Parameters:
+    -----------
+    cooccurrence: scipy.sparse matrix as created by
+    cooccurrence_matrix.
+
+    counts: array of the number of decks each card is in, in matrix
+    order.
+
+    n_decks: int number of decks the counts were taken from.
+
+    threshold: float minimum PMI.
+    """
+    coo = cooccurrence.tocoo()
+    counts = np.asarray(counts, dtype=float)
+    pmi = np.log(
+        coo.data * float(n_decks) / (counts[coo.row] * counts[coo.col])
+    )
+    return _keep(cooccurrence, pmi >= threshold)
+
+
+def top_k(cooccurrence, k):
+    """Keep, for each card, the edges to the k cards it shares the most
+    decks with. An edge is kept if it is in the top k of either card,
+    so every card keeps at least min(k, degree) edges.
+
+    Ties are broken by card order, so the result does not depend on how
+    the matrix happens to be stored.
+    """
+    n = cooccurrence.shape[0]
+    symmetric = sp.csr_matrix(cooccurrence)
+    symmetric = (symmetric + symmetric.T).tocsr()
+    symmetric.sort_indices()
+    rows = np.repeat(np.arange(n), np.diff(symmetric.indptr))
+    order = np.lexsort((symmetric.indices, -symmetric.data, rows))
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - symmetric.indptr[rows[order]]
+    top = rank < k
+    chosen = sp.csr_matrix(
+        (
+            np.ones(top.sum(), dtype=np.int8),
+            (rows[top], symmetric.indices[top]),
+        ),
+        shape=symmetric.shape,
+    )
+    chosen = chosen + chosen.T
+    coo = cooccurrence.tocoo()
+    return _keep(
+        cooccurrence,
+        np.asarray(chosen[coo.row, coo.col]).ravel() > 0,
+    )
+
+
+def sparsify(cooccurrence, counts, n_decks, **options):
+    """Remove edges from a co-occurrence matrix before clustering, with
+    each mode given in options, in the order of MODES.
+    Parameters:
+    -----------
+    cooccurrence: scipy.sparse matrix as created by
+    cooccurrence_matrix.
+
+    counts: array of the number of decks each card is in, in matrix
+    order.
+
+    n_decks: int number of decks the counts were taken from.
+
+    min_support: None or int minimum number of decks a card must be in
+    to keep its edges.
+
+    min_cooccurrence: None or int minimum number of decks an edge's
+    cards must share.
+
+    min_pmi: None or float minimum pointwise mutual information of an
+    edge.
+
+    top_k: None or int number of strongest edges each card keeps.
+    Returns:
+    --------
+    cooccurrence: scipy.sparse csr_matrix of the edges kept.
+
+    report: list of a dict of mode, value, edges_removed and edges_left
+    for each mode applied.
+    See also:
+    ---------
+    min_support
+
+    min_cooccurrence
+
+    min_pmi
+
+    top_k
+    """
+    cooccurrence = sp.csr_matrix(cooccurrence)
+    report = []
+    for mode in MODES:
+        value = options.get(mode)
+        if value is None:
+            continue
+        before = cooccurrence.nnz
+        if mode == "min_support":
+            cooccurrence = min_support(cooccurrence, counts, value)
+        elif mode == "min_cooccurrence":
+            cooccurrence = min_cooccurrence(cooccurrence, value)
+        elif mode == "min_pmi":
+            cooccurrence = min_pmi(cooccurrence, counts, n_decks, value)
+        else:
+            cooccurrence = top_k(cooccurrence, value)
+        report.append(
+            {
+                "mode": mode,
+                "value": value,
+                "edges_removed": before - cooccurrence.nnz,
+                "edges_left": cooccurrence.nnz,
+            }
+        )
+    return cooccurrence, report
+
+
+def sparsify_graph(card_data_df, G, n_decks, **options):
+    """Sparsify a graph as created by create_graph.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to, in vertex order.
+
+    G: igraph Graph representation of card_data_df.
+
+    n_decks: int number of decks G was built from.
+
+    options: the modes to apply, as taken by sparsify.
+    Returns:
+    --------
+    G: igraph Graph with the same vertices and the edges kept.
+
+    report: list of dicts as returned by sparsify.
+    See also:
+    ---------
+    sparsify
+    """
+    cooccurrence = sp.triu(weight_matrix(G), k=1, format="csr")
+    cooccurrence, report = sparsify(
+        cooccurrence,
+        card_data_df["Count"].to_numpy(),
+        n_decks,
+        **options,
+    )
+    return (
+        graph_from_cooccurrence(
+            cooccurrence, card_data_df["Card"].tolist()
+        ),
+        report,
+    )
+
+
+def compare_partitions(
+    card_data_df, full, sparse, resolution_parameter=1, seed=0
+):
+    """Cluster the full and sparsified graphs with the same settings and
+    random seed, and measure how much the partitions differ.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    full: igraph Graph before sparsification.
+
+    sparse: igraph Graph after sparsification, with the same vertices.
+
+    resolution_parameter: float to pass to the RBERVertexPartition.
+
+    seed: int random seed of both runs.
+    Returns:
+    --------
+    comparison: dict of clusters_full and clusters_sparse (the number
+    of clusters of each), nmi (normalised mutual information) and
+    adjusted_rand (adjusted Rand index). Both indices are 1 when the
+    partitions are the same.
+    """
+    import igraph as ig
+    import louvain as lv
+
+    memberships = [
+        lv.find_partition(
+            G,
+            lv.RBERVertexPartition,
+            weights="weight",
+            resolution_parameter=resolution_parameter,
+            node_sizes=card_data_df["Count"].tolist(),
+            seed=seed,
+        ).membership
+        for G in (full, sparse)
+    ]
+    return {
+        "clusters_full": max(memberships[0], default=-1) + 1,
+        "clusters_sparse": max(memberships[1], default=-1) + 1,
+        "nmi": ig.compare_communities(*memberships, method="nmi"),
+        "adjusted_rand": ig.compare_communities(
+            *memberships, method="adjusted_rand"
+        ),
+    }
@@ -0,0 +1,185 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import os
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+TOP_SIZES = 5
+
+_graph = None
+_node_sizes = None
+
+
+def _init_worker(G, node_sizes):
+    """Keep the graph being profiled in each worker process, so it is
+    sent once per worker rather than once per task.
+    """
+    global _graph, _node_sizes
+    _graph = G
+    _node_sizes = node_sizes
+
+
+def profile_row(partition, top=TOP_SIZES):
+    """Summarise a partition from a resolution profile.
+    Parameters:
+    -----------
+    partition: louvain partition with a resolution_parameter.
+
+    top: int number of the largest cluster sizes to include.
+    Returns:
+    --------
+    row: dict of resolution_parameter, number of clusters, quality and
+    the sizes of the top largest clusters as size_1, size_2, ...,
+    padded with 0.
+    """
+    sizes = sorted(partition.sizes(), reverse=True)
+    row = {
+        "resolution_parameter": partition.resolution_parameter,
+        "clusters": len(partition),
+        "quality": partition.quality(),
+    }
+    for i in range(top):
+        row[f"size_{i + 1}"] = sizes[i] if i < len(sizes) else 0
+    return row
+
+
+def _profile(resolution_range):
+    """Run a resolution profile over resolution_range on the graph
+    given to _init_worker and summarise each partition.
+    """
+    import louvain as lv
+
+    optimiser = lv.Optimiser()
+    profile = optimiser.resolution_profile(
+        _graph,
+        lv.RBERVertexPartition,
+        resolution_range=resolution_range,
+        node_sizes=_node_sizes,
+    )
+    return [profile_row(partition) for partition in profile]
+
+
+def split_range(resolution_range, parts):
+    """Split a resolution range into parts contiguous sub-ranges, evenly
+    spaced on the logarithmic scale the profile bisects on.
+    """
+    bounds = np.geomspace(
+        resolution_range[0], resolution_range[1], parts + 1
+    )
+    return [(bounds[i], bounds[i + 1]) for i in range(parts)]
+
+
+def resolution_sweep(card_data_df, G, resolution_range, workers=None):
+    """Profile the number of clusters and quality of the partition
+    against resolution_parameter, splitting the range across a process
+    pool.
+    Parameters:
+    -----------
+    card_data_df: pandas DataFrame containing as columns card name and
+    the number of decks that each card belongs to.
+
+    G: igraph Graph representation of card_data_df.
+
+    resolution_range: tuple of two positive values to vary
+    resolution_parameter between.
+
+    workers: None or int number of processes to profile with, each
+    taking an equal part of the range. If None, one per CPU is used.
+    Values of 1 or less, or a failure to start the process pool, profile
+    serially.
+    Returns:
+    --------
+    profile: pandas DataFrame with one row per partition found, as
+    created by profile_row, sorted by resolution_parameter.
+    See also:
+    ---------
+    profile_row
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    node_sizes = card_data_df["Count"].tolist()
+
+    pool = None
+    if workers > 1:
+        try:
+            pool = multiprocessing.Pool(
+                workers,
+                initializer=_init_worker,
+                initargs=(G, node_sizes),
+            )
+        except (OSError, ImportError, NotImplementedError):
+            pool = None
+
+    if pool is None:
+        _init_worker(G, node_sizes)
+        rows = _profile(tuple(resolution_range))
+    else:
+        try:
+            results = pool.map(
+                _profile, split_range(resolution_range, workers)
+            )
+        finally:
+            pool.close()
+            pool.join()
+        rows = [row for result in results for row in result]
+
+    return (
+        pd.DataFrame(rows)
+        .sort_values(by="resolution_parameter")
+        .drop_duplicates(subset="resolution_parameter")
+        .reset_index(drop=True)
+    )
+
+
+def write_profile(profile, filepath):
+    """Save a profile from resolution_sweep as JSON if filepath ends in
+    .json, otherwise as csv.
+    """
+    if str(filepath).lower().endswith(".json"):
+        profile.to_json(filepath, orient="records", indent=2)
+    else:
+        profile.to_csv(filepath, index=False)
+
+
+def plot_profile(profile, filepath=None):
+    """Plot the number of clusters against resolution_parameter.
+    Parameters:
+    -----------
+    profile: pandas DataFrame as returned by resolution_sweep.
+
+    filepath: None or string or filepath to save the plot to. If None,
+    the plot is shown in a window instead.
+    """
+    import matplotlib
+
+    if filepath is not None:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.step(
+        profile["resolution_parameter"],
+        profile["clusters"],
+        where="post",
+    )
+    ax.set_xlabel("resolution_parameter")
+    ax.set_ylabel("Number of clusters")
+    if filepath is None:
+        plt.show()
+    else:
+        fig.savefig(filepath)
+        plt.close(fig)
@@ -0,0 +1,163 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+"""Per-stage timing and memory instrumentation.
+
+Pipeline code wraps each stage in
+
+    with trace.stage("create_graph") as counts:
+        ...
+        counts["edges"] = G.ecount()
+
+which costs nothing until start is called. Once started, each stage
+records its wall time, CPU time, peak Python memory (through
+tracemalloc, which numpy reports its arrays to), the process's peak
+resident memory so far, and any counts the stage fills in.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import datetime
+import importlib
+import tracemalloc
+from contextlib import contextmanager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Libraries the modes import lazily. start loads them first, so the
+# first stage to use one is not charged for importing it, which is
+# especially slow while tracemalloc is running.
+PRELOAD = ("numpy", "pandas", "scipy.sparse", "igraph", "louvain")
+
+_stages = None
+_profile_stage = None
+_profile_path = None
+
+
+def start(profile_stage=None, profile_path=None):
+    """Start recording stages, discarding any recorded before.
+    Parameters:
+    -----------
+    profile_stage: None or string name of a stage to also run under
+    cProfile.
+
+    profile_path: None or string or filepath to save the cProfile stats
+    of profile_stage to, for pstats or snakeviz.
+    """
+    global _stages, _profile_stage, _profile_path
+    _stages = []
+    _profile_stage = profile_stage
+    _profile_path = profile_path
+    for module in PRELOAD:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def _max_rss():
+    """Return the peak resident memory of the process in bytes, or None
+    where it cannot be read.
+    """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+@contextmanager
+def stage(name):
+    """Record one stage of the pipeline.
+
+    Yields a dict the stage can fill with counts, such as decks, cards,
+    edges or clusters, to be saved alongside its timings. Stages should
+    not be nested, as each one resets the tracemalloc peak.
+    """
+    counts = {}
+    if _stages is None:
+        yield counts
+        return
+
+    profiler = None
+    if name == _profile_stage:
+        import cProfile
+
+        profiler = cProfile.Profile()
+    tracemalloc.reset_peak()
+    start_memory, _ = tracemalloc.get_traced_memory()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield counts
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        record = {
+            "stage": name,
+            "wall_seconds": time.perf_counter() - wall,
+            "cpu_seconds": time.process_time() - cpu,
+            "peak_python_bytes": tracemalloc.get_traced_memory()[1]
+            - start_memory,
+            "max_rss_bytes": _max_rss(),
+        }
+        record.update(counts)
+        _stages.append(record)
+        if profiler is not None:
+            path = _profile_path or f"{name}.prof"
+            os.makedirs(
+                os.path.dirname(os.path.abspath(path)), exist_ok=True
+            )
+            profiler.dump_stats(path)
+            record["profile"] = os.path.abspath(path)
+
+
+def report():
+    """Return the recorded stages with details of the run.
+    Returns:
+    --------
+    report: dict of environment and a list of stages, each a dict of
+    stage, wall_seconds, cpu_seconds, peak_python_bytes, max_rss_bytes
+    and the stage's counts, in the order the stages finished.
+    """
+    return {
+        "environment": {
+            "date": datetime.datetime.now().isoformat(
+                timespec="seconds"
+            ),
+            "argv": sys.argv,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "stages": list(_stages or []),
+    }
+
+
+def write(path):
+    """Save report() as JSON to path."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    with open(path, "w") as f:
+        # Counts may be numpy scalars, which json cannot write itself.
+        json.dump(report(), f, indent=2, default=lambda o: o.item())
@@ -0,0 +1,79 @@
+#    decklist_analyser - Magic: the Gathering analsyis with graph theory.
+#    Copyright (C) 2019 John Blundell/Jlobblet
+#    Contact: jlobblet-github@gmx.co.uk
+#
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+
+import numpy as np
+
+CARD_ID_DTYPE = np.int32
+
+
+class Vocabulary(object):
+    """Two-way mapping between card names and integer card ids.
+
+    Ids are handed out in order of first appearance, starting at 0, so
+    they can be used directly as column indices of a deck x card
+    matrix.
+    Parameters:
+    -----------
+    names: iterable of strings to intern, in order.
+    """
+
+    def __init__(self, names=()):
+        """Instantiate the class."""
+        self.names = []
+        self.ids = {}
+        for name in names:
+            self.intern(name)
+
+    def __len__(self):
+        """Return the number of interned cards."""
+        return len(self.names)
+
+    def __contains__(self, name):
+        """Return whether a card name has been interned."""
+        return name in self.ids
+
+    def intern(self, name):
+        """Return the id of a card name, adding it if it is new."""
+        try:
+            return self.ids[name]
+        except KeyError:
+            self.ids[name] = len(self.names)
+            self.names.append(name)
+            return self.ids[name]
+
+    def encode(self, names):
+        """Intern an iterable of card names and return their ids as a
+        sorted array.
+        """
+        return np.sort(
+            np.fromiter(
+                (self.intern(name) for name in names),
+                dtype=CARD_ID_DTYPE,
+            )
+        )
+
+    def lookup(self, names):
+        """Return the ids of the card names that have already been
+        interned as a sorted array, ignoring unknown names.
+        """
+        return np.sort(
+            np.fromiter(
+                (self.ids[name] for name in names if name in self.ids),
+                dtype=CARD_ID_DTYPE,
+            )
+        )
+
+    def decode(self, ids):
+        """Return the card names of an iterable of card ids."""
+        return [self.names[i] for i in ids]